@@ -0,0 +1,525 @@
+"""ベンチマーク用の偽Google APIサーバー
+
+main.pyが使用するSheets v4・Drive v3・Docs v1・OAuthトークンのエンドポイントの一部を
+ローカルで再現する。セルの値は保持せず、グリッドサイズ・アップロード内容のMD5・
+リクエスト数と送受信バイト数のみを記録する。応答の遅延・クォータ・429の注入を設定できる。
+
+    python benchmarks/fake_google_api.py --port 8765 --latency 0.05 --quota 60 --error-rate 0.01
+
+main.py側では設定ファイルの "api_endpoint_override" にこのサーバーのURLを指定し、
+認証情報ファイルの "token_uri" を "<URL>/token" にする。
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+DEFAULT_ROW_COUNT = 1000
+DEFAULT_COLUMN_COUNT = 26
+MAX_CELLS = 10000000  # スプレッドシート1つあたりのセル数の上限
+
+
+def column_to_index(letters):
+    """列名（A, B, ..., AA）を1始まりの列番号に変換する"""
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index
+
+
+def parse_a1_range(a1_range):
+    """A1形式の範囲から (シート名, 最終行, 最終列) を返す（行・列が無い場合はNone）"""
+    sheet_title, _, cells = a1_range.rpartition('!')
+    sheet_title = sheet_title.strip("'").replace("''", "'")
+    if not sheet_title:
+        sheet_title, cells = cells.strip("'"), ''
+    last_cell = cells.split(':')[-1]
+    match = re.fullmatch(r'([A-Za-z]*)(\d*)', last_cell)
+    if not match:
+        return sheet_title, None, None
+    letters, digits = match.groups()
+    return sheet_title, int(digits) if digits else None, column_to_index(letters) if letters else None
+
+
+class ApiError(Exception):
+    """Google APIと同じ形式のエラー応答"""
+
+    def __init__(self, code, message, status, retry_after=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+
+class FakeGoogleApi:
+    """偽APIの状態（スプレッドシート・Driveファイル・ドキュメント・統計情報）"""
+
+    def __init__(self, latency=0.0, jitter=0.0, quota=0, error_rate=0.0, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota = quota
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+        self.files = {}
+        self.uploads = {}
+        self.documents = {}
+        self.recent_calls = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        """統計情報をリセットする（スプレッドシートなどの状態は残す）"""
+        with self.lock:
+            self.stats = {
+                'calls': Counter(),
+                'throttled': Counter(),
+                'bytes_received': 0,
+                'bytes_sent': 0,
+                'cells_written': 0
+            }
+
+    def snapshot_stats(self):
+        """統計情報をJSONに変換できる形で返す"""
+        with self.lock:
+            return {
+                'calls': dict(self.stats['calls']),
+                'total_calls': sum(self.stats['calls'].values()),
+                'throttled': dict(self.stats['throttled']),
+                'bytes_received': self.stats['bytes_received'],
+                'bytes_sent': self.stats['bytes_sent'],
+                'cells_written': self.stats['cells_written']
+            }
+
+    def admit(self, api_name):
+        """遅延を加え、クォータ超過または429の注入の場合はApiErrorを送出する"""
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        with self.lock:
+            now = time.monotonic()
+            if self.quota:
+                calls = self.recent_calls.setdefault(api_name, deque())
+                while calls and now - calls[0] >= 60:
+                    calls.popleft()
+                if len(calls) >= self.quota:
+                    self.stats['throttled'][api_name] += 1
+                    raise ApiError(429, "Quota exceeded for quota metric 'Requests' (fake)", 'RESOURCE_EXHAUSTED', self.retry_after)
+                calls.append(now)
+            if self.error_rate and random.random() < self.error_rate:
+                self.stats['throttled'][api_name] += 1
+                raise ApiError(429, "Rate limit injected by fake server", 'RESOURCE_EXHAUSTED', self.retry_after)
+
+    # --- Sheets ---
+
+    def get_spreadsheet(self, spreadsheet_id):
+        """スプレッドシートを返す（存在しない場合は 'sheet1' を持つものを作成する）"""
+        if spreadsheet_id not in self.spreadsheets:
+            self.spreadsheets[spreadsheet_id] = {
+                'title': f"Fake {spreadsheet_id}",
+                'sheets': [self.new_sheet_properties(0, 'sheet1', DEFAULT_ROW_COUNT, DEFAULT_COLUMN_COUNT)]
+            }
+        return self.spreadsheets[spreadsheet_id]
+
+    @staticmethod
+    def new_sheet_properties(sheet_id, title, rows, cols, index=0):
+        return {
+            'sheetId': sheet_id,
+            'title': title,
+            'index': index,
+            'sheetType': 'GRID',
+            'gridProperties': {'rowCount': rows, 'columnCount': cols}
+        }
+
+    def find_sheet(self, spreadsheet, title=None, sheet_id=None):
+        for properties in spreadsheet['sheets']:
+            if (title is not None and properties['title'] == title) or (sheet_id is not None and properties['sheetId'] == sheet_id):
+                return properties
+        raise ApiError(400, f"Unable to parse range: {title if title is not None else sheet_id}", 'INVALID_ARGUMENT')
+
+    def check_cell_limit(self, spreadsheet):
+        cells = sum(p['gridProperties']['rowCount'] * p['gridProperties']['columnCount'] for p in spreadsheet['sheets'])
+        if cells > MAX_CELLS:
+            raise ApiError(400, f"This action would increase the number of cells in the workbook above the limit of {MAX_CELLS} cells.", 'INVALID_ARGUMENT')
+
+    def spreadsheet_metadata(self, spreadsheet_id):
+        with self.lock:
+            spreadsheet = self.get_spreadsheet(spreadsheet_id)
+            return {
+                'spreadsheetId': spreadsheet_id,
+                'properties': {'title': spreadsheet['title'], 'locale': 'ja_JP', 'timeZone': 'Asia/Tokyo'},
+                'sheets': [{'properties': dict(p, gridProperties=dict(p['gridProperties']))} for p in spreadsheet['sheets']]
+            }
+
+    def values_update(self, spreadsheet_id, a1_range, body):
+        values = body.get('values', [])
+        with self.lock:
+            spreadsheet = self.get_spreadsheet(spreadsheet_id)
+            title, last_row, last_col = parse_a1_range(a1_range)
+            grid = self.find_sheet(spreadsheet, title=title)['gridProperties']
+            if (last_row and last_row > grid['rowCount']) or (last_col and last_col > grid['columnCount']):
+                raise ApiError(400, f"Range ('{title}'!{a1_range.rpartition('!')[2]}) exceeds grid limits. "
+                                    f"Max rows: {grid['rowCount']}, max columns: {grid['columnCount']}", 'INVALID_ARGUMENT')
+            cells = sum(len(row) for row in values)
+            self.stats['cells_written'] += cells
+        return {'spreadsheetId': spreadsheet_id, 'updatedRange': a1_range, 'updatedRows': len(values), 'updatedCells': cells}
+
+    def values_append(self, spreadsheet_id, a1_range, body):
+        values = body.get('values', [])
+        with self.lock:
+            spreadsheet = self.get_spreadsheet(spreadsheet_id)
+            title = parse_a1_range(a1_range)[0]
+            properties = self.find_sheet(spreadsheet, title=title)
+            # 追記は表の末尾に行を追加する（グリッドが足りない場合は拡張される）
+            used_rows = properties.setdefault('usedRows', 0) + len(values)
+            properties['usedRows'] = used_rows
+            grid = properties['gridProperties']
+            grid['rowCount'] = max(grid['rowCount'], used_rows)
+            self.check_cell_limit(spreadsheet)
+            cells = sum(len(row) for row in values)
+            self.stats['cells_written'] += cells
+        return {'spreadsheetId': spreadsheet_id, 'updates': {'updatedRows': len(values), 'updatedCells': cells}}
+
+    def values_clear(self, spreadsheet_id, a1_range):
+        with self.lock:
+            spreadsheet = self.get_spreadsheet(spreadsheet_id)
+            self.find_sheet(spreadsheet, title=parse_a1_range(a1_range)[0])['usedRows'] = 0
+        return {'spreadsheetId': spreadsheet_id, 'clearedRange': a1_range}
+
+    def batch_update(self, spreadsheet_id, body):
+        replies = []
+        with self.lock:
+            spreadsheet = self.get_spreadsheet(spreadsheet_id)
+            for request in body.get('requests', []):
+                (kind, params), = request.items()
+                reply = {}
+                if kind == 'addSheet':
+                    properties = params.get('properties', {})
+                    if any(p['title'] == properties.get('title') for p in spreadsheet['sheets']):
+                        raise ApiError(400, f"A sheet with the name \"{properties.get('title')}\" already exists.", 'INVALID_ARGUMENT')
+                    grid = properties.get('gridProperties', {})
+                    sheet_id = max(p['sheetId'] for p in spreadsheet['sheets']) + 1 if spreadsheet['sheets'] else 0
+                    new_properties = self.new_sheet_properties(sheet_id, properties.get('title', f"Sheet{sheet_id}"),
+                                                               grid.get('rowCount', DEFAULT_ROW_COUNT),
+                                                               grid.get('columnCount', DEFAULT_COLUMN_COUNT),
+                                                               len(spreadsheet['sheets']))
+                    spreadsheet['sheets'].append(new_properties)
+                    reply = {'addSheet': {'properties': dict(new_properties)}}
+                elif kind == 'deleteSheet':
+                    target = self.find_sheet(spreadsheet, sheet_id=params.get('sheetId'))
+                    spreadsheet['sheets'].remove(target)
+                elif kind == 'updateSheetProperties':
+                    properties = params.get('properties', {})
+                    target = self.find_sheet(spreadsheet, sheet_id=properties.get('sheetId', 0))
+                    for key in ('title', 'index'):
+                        if key in properties:
+                            target[key] = properties[key]
+                    target['gridProperties'].update(properties.get('gridProperties', {}))
+                elif kind == 'appendDimension' or kind == 'insertDimension':
+                    target = self.find_sheet(spreadsheet, sheet_id=params.get('sheetId', params.get('range', {}).get('sheetId')))
+                    length = params.get('length') or (params['range']['endIndex'] - params['range']['startIndex'])
+                    key = 'rowCount' if (params.get('dimension') or params['range'].get('dimension')) == 'ROWS' else 'columnCount'
+                    target['gridProperties'][key] += length
+                elif kind == 'deleteDimension':
+                    dimension_range = params['range']
+                    target = self.find_sheet(spreadsheet, sheet_id=dimension_range.get('sheetId'))
+                    key = 'rowCount' if dimension_range.get('dimension') == 'ROWS' else 'columnCount'
+                    target['gridProperties'][key] -= dimension_range['endIndex'] - dimension_range['startIndex']
+                elif kind == 'appendCells':
+                    target = self.find_sheet(spreadsheet, sheet_id=params.get('sheetId'))
+                    rows = params.get('rows', [])
+                    target['gridProperties']['rowCount'] += len(rows)
+                    self.stats['cells_written'] += sum(len(row.get('values', [])) for row in rows)
+                elif kind == 'updateCells':
+                    rows = params.get('rows', [])
+                    start = params.get('start') or params.get('range', {})
+                    target = self.find_sheet(spreadsheet, sheet_id=start.get('sheetId'))
+                    grid = target['gridProperties']
+                    last_row = start.get('rowIndex', start.get('startRowIndex', 0)) + len(rows)
+                    if last_row > grid['rowCount']:
+                        raise ApiError(400, f"Invalid requests[{len(replies)}].updateCells: GridCoordinate.rowIndex[{last_row}] is after last row in grid[{grid['rowCount'] - 1}]", 'INVALID_ARGUMENT')
+                    self.stats['cells_written'] += sum(len(row.get('values', [])) for row in rows)
+                elif kind in ('repeatCell', 'updateDimensionProperties', 'autoResizeDimensions'):
+                    pass
+                else:
+                    raise ApiError(400, f"Invalid request: {kind} is not supported by the fake server", 'INVALID_ARGUMENT')
+                replies.append(reply)
+            self.check_cell_limit(spreadsheet)
+        return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    # --- Drive ---
+
+    def files_list(self, query):
+        name_match = re.search(r"name\s*=\s*'((?:[^'\\]|\\.)*)'", query or '')
+        parent_match = re.search(r"'([^']+)'\s+in\s+parents", query or '')
+        name = name_match.group(1) if name_match else None
+        parent = parent_match.group(1) if parent_match else None
+        with self.lock:
+            matches = [f for f in self.files.values()
+                       if (name is None or f['name'] == name) and (parent is None or parent in f.get('parents', []))]
+            if not matches and name and 'application/vnd.google-apps.folder' in (query or ''):
+                # フォルダは存在する前提のため、検索されたフォルダは自動的に作成する
+                folder = {'id': f"folder-{uuid.uuid4().hex[:12]}", 'name': name,
+                          'mimeType': 'application/vnd.google-apps.folder', 'parents': [parent] if parent else []}
+                self.files[folder['id']] = folder
+                matches = [folder]
+        return {'files': [dict(f) for f in matches]}
+
+    def files_create(self, metadata):
+        with self.lock:
+            file = {'id': f"file-{uuid.uuid4().hex[:12]}", 'name': metadata.get('name', 'untitled'),
+                    'mimeType': metadata.get('mimeType', 'application/octet-stream'),
+                    'parents': metadata.get('parents', []), 'trashed': False}
+            self.files[file['id']] = file
+            if file['mimeType'] == 'application/vnd.google-apps.document':
+                self.documents[file['id']] = {'chars': 1}
+        return {'id': file['id'], 'name': file['name']}
+
+    def files_get(self, file_id):
+        with self.lock:
+            if file_id not in self.files:
+                raise ApiError(404, f"File not found: {file_id}.", 'NOT_FOUND')
+            return dict(self.files[file_id])
+
+    def start_upload(self, metadata, total_size):
+        with self.lock:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {'metadata': metadata, 'received': 0, 'total': total_size, 'md5': hashlib.md5()}
+        return upload_id
+
+    def upload_chunk(self, upload_id, content_range, data):
+        """チャンクを受け取り、(完了したファイル, 受信済みバイト数) を返す（途中の場合ファイルはNone）"""
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if upload is None:
+                raise ApiError(404, "Upload session not found or expired.", 'NOT_FOUND')
+            match = re.fullmatch(r'bytes (\*|(\d+)-(\d+))/(\*|\d+)', content_range or '')
+            if match and match.group(4) != '*':
+                upload['total'] = int(match.group(4))
+            if match and match.group(2) is not None:
+                start = int(match.group(2))
+                if start != upload['received']:
+                    raise ApiError(400, f"Invalid chunk offset {start}, expected {upload['received']}", 'INVALID_ARGUMENT')
+                upload['md5'].update(data)
+                upload['received'] += len(data)
+            if upload['total'] is None or upload['received'] < upload['total']:
+                return None, upload['received']
+            del self.uploads[upload_id]
+            metadata = upload['metadata']
+            file = {'id': f"file-{uuid.uuid4().hex[:12]}", 'name': metadata.get('name', 'untitled'),
+                    'mimeType': metadata.get('mimeType', 'application/octet-stream'),
+                    'parents': metadata.get('parents', []), 'trashed': False,
+                    'md5Checksum': upload['md5'].hexdigest(), 'size': str(upload['received'])}
+            self.files[file['id']] = file
+        return file, file['size']
+
+    # --- Docs ---
+
+    def document_batch_update(self, document_id, body):
+        with self.lock:
+            document = self.documents.setdefault(document_id, {'chars': 1})
+            for request in body.get('requests', []):
+                if 'insertText' in request:
+                    document['chars'] += len(request['insertText'].get('text', ''))
+        return {'documentId': document_id, 'replies': [{} for _ in body.get('requests', [])]}
+
+    def document_get(self, document_id):
+        with self.lock:
+            document = self.documents.setdefault(document_id, {'chars': 1})
+            return {'documentId': document_id, 'title': f"Fake {document_id}",
+                    'body': {'content': [{'endIndex': document['chars']}]}}
+
+
+class FakeGoogleApiHandler(BaseHTTPRequestHandler):
+    """偽APIのHTTPハンドラー（ルーティングのみを行い、処理はFakeGoogleApiに委ねる）"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeGoogleApi/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.handle_api('GET')
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def do_PUT(self):
+        self.handle_api('PUT')
+
+    def do_PATCH(self):
+        self.handle_api('PATCH')
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.api.lock:
+            self.server.api.stats['bytes_sent'] += len(body)
+
+    def handle_api(self, method):
+        api = self.server.api
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        raw_body = self.read_body()
+        try:
+            if path == '/_stats':
+                return self.send_json(200, api.snapshot_stats())
+            if path == '/_reset':
+                api.reset_stats()
+                return self.send_json(200, {})
+            if path == '/token':
+                return self.send_json(200, {'access_token': f"fake-{uuid.uuid4().hex}", 'expires_in': 3600, 'token_type': 'Bearer'})
+            if path.endswith('/allowedLocations'):
+                # google-authが行うサービスアカウントの利用可能リージョンの問い合わせ
+                return self.send_json(200, {'locations': ['global'], 'encodedLocations': '0x0'})
+
+            api_name, endpoint = self.classify(method, path)
+            with api.lock:
+                api.stats['calls'][endpoint] += 1
+                api.stats['bytes_received'] += len(raw_body)
+            api.admit(api_name)
+
+            if path.startswith('/upload/drive/v3/files'):
+                return self.handle_upload(method, params, raw_body)
+            body = json.loads(raw_body) if raw_body else {}
+            status, payload = 200, self.route(method, path, params, body)
+            return self.send_json(status, payload)
+        except ApiError as e:
+            headers = {'Retry-After': str(e.retry_after)} if e.retry_after else None
+            return self.send_json(e.code, {'error': {'code': e.code, 'message': e.message, 'status': e.status}}, headers)
+        except Exception as e:
+            return self.send_json(500, {'error': {'code': 500, 'message': f"Fake server error: {e}", 'status': 'INTERNAL'}})
+
+    @staticmethod
+    def classify(method, path):
+        """リクエストを (クォータの種別, 統計用のエンドポイント名) に分類する"""
+        if path.startswith('/v4/spreadsheets'):
+            if ':batchUpdate' in path:
+                return 'sheets', 'sheets.batchUpdate'
+            for suffix in (':append', ':clear'):
+                if path.endswith(suffix):
+                    return 'sheets', f"sheets.values{suffix.replace(':', '.')}"
+            if '/values/' in path:
+                return 'sheets', f"sheets.values.{'get' if method == 'GET' else 'update'}"
+            return 'sheets', 'sheets.get'
+        if path.startswith('/upload/drive/v3/files'):
+            return 'drive', 'drive.upload'
+        if path.startswith('/drive/v3/files'):
+            if method == 'GET':
+                return 'drive', 'drive.files.list' if path.rstrip('/') == '/drive/v3/files' else 'drive.files.get'
+            return 'drive', 'drive.files.create'
+        if path.startswith('/v1/documents'):
+            return 'docs', 'docs.batchUpdate' if ':batchUpdate' in path else 'docs.get'
+        raise ApiError(404, f"Unknown endpoint: {method} {path}", 'NOT_FOUND')
+
+    def route(self, method, path, params, body):
+        api = self.server.api
+        match = re.fullmatch(r'/v4/spreadsheets/([^/:]+)(?::batchUpdate)?', path)
+        if match:
+            if path.endswith(':batchUpdate'):
+                return api.batch_update(match.group(1), body)
+            return api.spreadsheet_metadata(match.group(1))
+        match = re.fullmatch(r'/v4/spreadsheets/([^/]+)/values/(.+?)(:append|:clear)?', path)
+        if match:
+            spreadsheet_id, a1_range, action = match.groups()
+            if action == ':append':
+                return api.values_append(spreadsheet_id, a1_range, body)
+            if action == ':clear':
+                return api.values_clear(spreadsheet_id, a1_range)
+            if method == 'GET':
+                return {'range': a1_range, 'majorDimension': 'ROWS', 'values': []}
+            return api.values_update(spreadsheet_id, a1_range, body)
+        match = re.fullmatch(r'/drive/v3/files(?:/([^/]+))?', path)
+        if match:
+            if match.group(1):
+                return api.files_get(match.group(1))
+            if method == 'GET':
+                return api.files_list(params.get('q'))
+            return api.files_create(body)
+        match = re.fullmatch(r'/v1/documents/([^/:]+)(:batchUpdate)?', path)
+        if match:
+            if match.group(2):
+                return api.document_batch_update(match.group(1), body)
+            return api.document_get(match.group(1))
+        raise ApiError(404, f"Unknown endpoint: {method} {path}", 'NOT_FOUND')
+
+    def handle_upload(self, method, params, raw_body):
+        """Driveの再開可能アップロード（セッション開始・チャンク送信・受信位置の問い合わせ）"""
+        api = self.server.api
+        upload_id = params.get('upload_id')
+        if upload_id is None:
+            if params.get('uploadType') != 'resumable':
+                raise ApiError(400, "Only resumable uploads are supported by the fake server", 'INVALID_ARGUMENT')
+            metadata = json.loads(raw_body) if raw_body else {}
+            total = self.headers.get('X-Upload-Content-Length')
+            upload_id = api.start_upload(metadata, int(total) if total else None)
+            host = self.headers.get('Host', f"127.0.0.1:{self.server.server_port}")
+            location = f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            return self.send_json(200, {}, {'Location': location})
+
+        file, received = api.upload_chunk(upload_id, self.headers.get('Content-Range'), raw_body)
+        if file is None:
+            # 308はJSON本文なしで受信済みの範囲を返す
+            self.send_response(308)
+            if int(received):
+                self.send_header('Range', f"bytes=0-{int(received) - 1}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        return self.send_json(200, {'id': file['id'], 'name': file['name']})
+
+
+def start_server(host='127.0.0.1', port=0, verbose=False, **options):
+    """偽APIサーバーをバックグラウンドのスレッドで起動し、サーバーを返す（server.api で状態を参照）"""
+    server = ThreadingHTTPServer((host, port), FakeGoogleApiHandler)
+    server.daemon_threads = True
+    server.api = FakeGoogleApi(**options)
+    server.verbose = verbose
+    thread = threading.Thread(target=server.serve_forever, name='fake-google-api', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の偽Google APIサーバー")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help="待ち受けるポート（0の場合は空きポート）")
+    parser.add_argument('--latency', type=float, default=0.0, help="各リクエストに加える遅延（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="遅延に加えるランダムな揺らぎの最大値（秒）")
+    parser.add_argument('--quota', type=int, default=0, help="API（sheets/drive/docs）ごとの1分あたりの上限。超えると429（0で無制限）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="ランダムに429を返す確率")
+    parser.add_argument('--retry-after', type=int, default=1, help="429応答のRetry-Afterヘッダー（秒）")
+    parser.add_argument('--verbose', action='store_true', help="リクエストごとのアクセスログを出力する")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.verbose, latency=args.latency, jitter=args.jitter,
+                          quota=args.quota, error_rate=args.error_rate, retry_after=args.retry_after)
+    print(f"http://{args.host}:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""偽Google APIサーバーを相手にmain.pyのパイプラインを実行するベンチマーク
+
+生成したCSV（デフォルトは1,000・100,000・1,000,000行）ごとに run_pipeline を実行し、
+実行時間・API呼び出し回数・送信バイト数・ピークメモリ（tracemalloc）を表示する。
+本物のGoogleサービスには接続しない。
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --rows 1000 100000 --latency 0.05 --json result.json
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import main  # noqa: E402
+
+DEFAULT_ROWS = [1000, 100000, 1000000]
+# ベンチマークでは既定のレート制限で待たされないよう、クライアント側の上限を十分大きくする
+UNLIMITED_RATE_LIMITS = {'sheets_read': 1000000, 'sheets_write': 1000000, 'drive': 1000000, 'docs': 1000000}
+
+
+def generate_csv(path, row_count, seed=0):
+    """test.csvと同じ列構成のCSVをrow_count行生成する（同じ引数なら同じ内容）"""
+    with open(os.path.join(REPO_DIR, 'test.csv'), 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        templates = list(reader)
+    rng = random.Random(seed)
+    customers = [f"株式会社ベンチマーク{i:03d}" for i in range(200)]
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i in range(row_count):
+            row = list(templates[i % len(templates)])
+            row[1] = f"B-{i:07d}"
+            row[2] = f"SL-{i // 3:07d}"
+            row[3] = str(i % 3 + 1)
+            row[4] = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            row[5] = row[8] = rng.choice(customers)
+            row[17] = str(rng.randint(1, 500))
+            row[18] = f"{rng.uniform(1, 1000):.1f}"
+            row[25] = str(rng.randint(1, 50))
+            if i % 50 == 0:
+                row[10] = "複数行の\n請求備考"
+            writer.writerow(row)
+
+
+def write_fake_credentials(path, base_url):
+    """偽サーバーのトークンエンドポイントを使うサービスアカウントの認証情報を作成する"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption()).decode('ascii')
+    creds = {
+        'type': 'service_account',
+        'project_id': 'fake-project',
+        'private_key_id': 'fake-key',
+        'private_key': private_key,
+        'client_email': 'benchmark@fake-project.iam.gserviceaccount.com',
+        'client_id': '0',
+        'token_uri': f"{base_url}/token"
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(creds, f)
+
+
+def start_fake_server(args):
+    """偽APIサーバーを別プロセスで起動し、(プロセス, URL) を返す（サーバーのメモリを計測に含めないため）"""
+    command = [sys.executable, os.path.join(BENCHMARK_DIR, 'fake_google_api.py'), '--port', '0',
+               '--latency', str(args.latency), '--jitter', str(args.jitter), '--quota', str(args.quota),
+               '--error-rate', str(args.error_rate), '--retry-after', str(args.retry_after)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.kill()
+        raise RuntimeError("偽APIサーバーを起動できませんでした")
+    return process, base_url
+
+
+def fetch_json(url, method='GET'):
+    request = urllib.request.Request(url, method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def run_case(row_count, csv_path, base_url, creds_path, workdir, args):
+    """1つのCSVでパイプラインを実行し、計測結果を返す"""
+    config = {
+        'spreadsheet_id': f"bench-{row_count}",
+        'sheet_name': 'sheet1',
+        'log_sheet_name': '実行履歴',
+        'log_doc_id': 'bench-doc',
+        'drive_folder_id': 'bench-folder',
+        'csv_file_path': csv_path,
+        'creds_file': creds_path,
+        'csv_backup_folder_name': 'csv',
+        'sheet_write_mode': args.mode,
+        'csv_streaming': args.streaming,
+        'state_dir': os.path.join(workdir, 'state'),
+        'api_endpoint_override': base_url,
+        'api_backoff_base': 0.1,
+        'api_backoff_max': 2.0
+    }
+    if not args.client_rate_limits:
+        config['api_rate_limits'] = UNLIMITED_RATE_LIMITS
+    config.update(args.config_overrides)
+
+    if not args.keep_state:
+        # 前回のケースのバックアップ記録・フォルダのキャッシュ・スナップショットを使わないよう毎回作り直す
+        shutil.rmtree(config['state_dir'], ignore_errors=True)
+    main.configure_log_sampling(config)
+    api = main.create_api_context(config)
+    if api is None:
+        raise RuntimeError("APIコンテキストを作成できませんでした")
+    fetch_json(f"{base_url}/_reset", method='POST')
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    success = main.run_pipeline(config, api, f"bench{row_count}")
+    wall_time = time.perf_counter() - start_time
+    peak_memory = None
+    if args.tracemalloc:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    # 実行ログはバックグラウンドで送信されるため、送信が終わってからサーバーの統計を取得する
+    main.wait_for_log_outboxes()
+
+    server_stats = fetch_json(f"{base_url}/_stats")
+    return {
+        'rows': row_count,
+        'success': success,
+        'wall_time': wall_time,
+        'rows_per_sec': row_count / wall_time if wall_time > 0 else 0.0,
+        'api_calls': server_stats['total_calls'],
+        'api_calls_by_endpoint': server_stats['calls'],
+        'throttled': sum(server_stats['throttled'].values()),
+        'client_retries': api.limiter.stats.get('retries', 0),
+        'bytes_sent': server_stats['bytes_received'],
+        'bytes_received': server_stats['bytes_sent'],
+        'peak_memory': peak_memory
+    }
+
+
+def format_results(results):
+    lines = [f"{'行数':>10} {'結果':>4} {'時間(秒)':>10} {'行/秒':>10} {'API呼び出し':>12} {'429':>6} {'送信(MB)':>10} {'ピーク(MB)':>11}"]
+    for r in results:
+        peak = f"{r['peak_memory'] / 1024 / 1024:.1f}" if r['peak_memory'] is not None else '-'
+        lines.append(f"{r['rows']:>10} {'OK' if r['success'] else 'NG':>4} {r['wall_time']:>10.2f} {r['rows_per_sec']:>10.0f} "
+                     f"{r['api_calls']:>12} {r['throttled']:>6} {r['bytes_sent'] / 1024 / 1024:>10.2f} {peak:>11}")
+    return "\n".join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="偽Google APIサーバーを使ったパイプラインのベンチマーク")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="生成するCSVの行数（複数指定可）")
+    parser.add_argument('--mode', default=main.DEFAULT_SHEET_WRITE_MODE, help="sheet_write_mode（batch/diff/row）")
+    parser.add_argument('--streaming', action='store_true', help="csv_streamingを有効にする")
+    parser.add_argument('--latency', type=float, default=0.0, help="偽サーバーの応答遅延（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="偽サーバーの遅延の揺らぎ（秒）")
+    parser.add_argument('--quota', type=int, default=0, help="偽サーバーのAPIごとの1分あたりの上限（0で無制限）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="偽サーバーがランダムに429を返す確率")
+    parser.add_argument('--retry-after', type=int, default=1, help="429応答のRetry-After（秒）")
+    parser.add_argument('--client-rate-limits', action='store_true', help="main.pyの既定のレート制限を適用する")
+    parser.add_argument('--no-tracemalloc', dest='tracemalloc', action='store_false', help="ピークメモリを計測しない（計測による速度低下を避ける）")
+    parser.add_argument('--set', dest='config_overrides', action='append', default=[], metavar='KEY=JSON',
+                        help="設定を上書きする（例: --set sheet_write_chunk_size=5000）")
+    parser.add_argument('--keep-state', action='store_true', help="状態ファイル（state_dir）をケース間・実行間で引き継ぐ（diffモードの2回目以降の計測など）")
+    parser.add_argument('--workdir', help="CSV・ログ・状態ファイルの作業ディレクトリ（デフォルトは一時ディレクトリ）")
+    parser.add_argument('--json', help="結果をJSONで保存するファイル")
+    args = parser.parse_args()
+    overrides = {}
+    for item in args.config_overrides:
+        key, _, value = item.partition('=')
+        try:
+            overrides[key] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key] = value
+    args.config_overrides = overrides
+    return args
+
+
+def run():
+    args = parse_args()
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='pepal_bench_'))
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)  # logディレクトリは作業ディレクトリに作成される
+
+    process, base_url = start_fake_server(args)
+    try:
+        creds_path = os.path.join(workdir, 'fake_creds.json')
+        write_fake_credentials(creds_path, base_url)
+        main.setup_logging()
+
+        results = []
+        for row_count in args.rows:
+            csv_path = os.path.join(workdir, f"bench_{row_count}.csv")
+            if not os.path.exists(csv_path):
+                generate_csv(csv_path, row_count)
+            results.append(run_case(row_count, csv_path, base_url, creds_path, workdir, args))
+    finally:
+        process.terminate()
+        process.wait()
+        main.shutdown_logging()
+
+    print(format_results(results))
+    print(f"作業ディレクトリ: {workdir}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    run()
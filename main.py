@@ -1,13 +1,32 @@
+import argparse
+import atexit
+import codecs
+import contextlib
+import contextvars
 import csv
+import gzip
 import logging
-from datetime import datetime
+import logging.handlers
+import math
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
 import os
 import json
+import hashlib
+import io
+import itertools
+import threading
+import time
 import uuid
-import gspread
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from array import array
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+# gspread・google-auth・googleapiclientは読み込みに時間がかかるため、使う処理の中でインポートする
+# （設定エラーで終了する場合などにGoogle APIのライブラリを読み込まないようにする）
 
 # Google Sheets APIの設定
 SCOPES = [
@@ -15,8 +34,680 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive'
 ]
 
-# ログメッセージをキャプチャするためのリスト
-captured_logs = []
+# スプレッドシート書き込みのデフォルト設定
+DEFAULT_SHEET_WRITE_MODE = 'batch'  # 'batch': 範囲をまとめて書き込み / 'diff': 差分同期 / 'row': 1行ずつappend_row
+DEFAULT_SHEET_WRITE_CHUNK_SIZE = 2000  # 1リクエストあたりの最大行数
+DEFAULT_SHEET_WRITE_MAX_CHUNK_BYTES = 2 * 1024 * 1024  # 1リクエストあたりの最大ペイロード（概算）
+CELL_DATA_OVERHEAD_BYTES = 40  # batchUpdateのCellData形式で1セルあたりに加わるおおよそのバイト数
+WRITE_JOURNAL_FILE_NAME = 'write_journal.json'  # 書き込みの途中経過（再開用）を記録する状態ファイル
+
+# シャード分割（sheet_sharding）の設定
+DEFAULT_SHEET_SHARDING = 'none'  # 'none': sheet_nameに書き込む / 'rows': shard_max_rows行ごと / 'column': shard_columnの値ごと
+DEFAULT_SHARD_MAX_ROWS = 100000  # 'rows'で1シャードに書き込む最大行数
+DEFAULT_SHARD_DATE_FORMAT = '%Y-%m'  # 日付の列で分割する場合のキーの書式（デフォルトは月ごと）
+DEFAULT_SHARD_MAX_COUNT = 200  # シャード数の上限（値の種類が多い列を誤って指定した場合に大量のシートを作らない）
+DEFAULT_SHARD_PARALLEL_WRITERS = 4  # シャードを並列に書き込むスレッド数
+DEFAULT_SHARD_MANIFEST_SHEET_NAME = 'shards'  # シャードの一覧を記録するシート（spreadsheet_id内）
+SHARD_MANIFEST_HEADER = ["パーティション値", "スプレッドシートID", "シート名", "行数", "CSV開始行", "CSV終了行", "URL", "更新日時"]
+SHARD_TITLE_INVALID_CHARS = "[]*?/\\:'"
+
+# ストリーミング読み取り（csv_streaming=true）の設定
+DEFAULT_CSV_BATCH_SIZE = 5000  # 読み取り時に1バッチとして保持する最大行数
+CSV_SAMPLE_ROWS = 3  # 詳細ログに残す先頭行のサンプル数
+DEFAULT_CSV_ENCODING = 'auto'  # 'auto'の場合はUTF-8（BOM付きを含む）として読めなければCP932として扱う
+CSV_FALLBACK_ENCODING = 'cp932'
+DEFAULT_PARALLEL_PARSE_MIN_BYTES = 32 * 1024 * 1024  # これ以上のサイズのCSVはプロセスプールで並列に解析する
+DEFAULT_PARSE_WORKERS = 0  # 並列解析のプロセス数（0の場合はCPU数）
+PARALLEL_PARSE_RANGE_BYTES = 8 * 1024 * 1024  # 並列解析で1タスクが担当するおおよそのバイト数
+
+# 列の型（typed_columns）の設定
+DEFAULT_COLUMN_TYPES = {  # 型を指定しない列は文字列として扱う
+    '納入年月日': 'date',
+    '売上数量': 'int',
+    '売上重量': 'float',
+    '請求KG連量（or請求表示連量）': 'float',
+    '請求数量(単位ごとに再計算)': 'int',
+    '請求包数': 'int'
+}
+COLUMN_TYPE_CODES = {'int': 'q', 'float': 'd', 'date': 'l'}  # 型ごとのarrayの型コード（日付はシリアル値）
+DEFAULT_DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%Y%m%d']  # 日付列の解釈に使う書式
+DEFAULT_DATE_NUMBER_FORMAT = 'yyyy/mm/dd'  # シートでの日付列の表示形式
+SHEETS_EPOCH = datetime(1899, 12, 30)  # スプレッドシートの日付シリアル値の基準日
+
+# 差分同期（sheet_write_mode='diff'）の設定
+DEFAULT_STATE_DIR = 'state'  # 前回実行の状態を保存するローカルディレクトリ
+DEFAULT_DIFF_KEY_COLUMNS = ['受付No', '伝票No', '枝番']  # 行を一意に識別するキー列
+
+# Drive/Docs APIのHTTPタイムアウト（秒）
+DEFAULT_HTTP_TIMEOUT = 120
+
+# 起動時間の計測（--profile-startup）で読み込み時間を計るモジュール（使う処理の中で遅延インポートするもの）
+STARTUP_PROFILE_MODULES = [
+    'requests',
+    'httplib2',
+    'google.oauth2.service_account',
+    'google.auth.transport.requests',
+    'google_auth_httplib2',
+    'gspread',
+    'googleapiclient.discovery',
+    'googleapiclient.http'
+]
+
+# api_endpoint_override（ベンチマーク用の偽APIサーバーなど）で送信先を置き換えるGoogle APIのURL
+GOOGLE_API_BASE_URLS = (
+    'https://sheets.googleapis.com/',
+    'https://www.googleapis.com/',
+    'https://docs.googleapis.com/',
+    'https://oauth2.googleapis.com/',
+    'https://iamcredentials.googleapis.com/'
+)
+
+# Google APIのレート制限（1分あたりの呼び出し回数、サービスアカウント1つあたりのクォータに合わせる）
+DEFAULT_API_RATE_LIMITS = {
+    'sheets_read': 60,
+    'sheets_write': 60,
+    'drive': 600,
+    'docs': 60
+}
+DEFAULT_API_MAX_RETRIES = 5  # 429/5xxなどで再試行する最大回数
+DEFAULT_API_BACKOFF_BASE = 1.0  # 指数バックオフの初期待ち時間（秒）
+DEFAULT_API_BACKOFF_MAX = 64.0  # 指数バックオフの最大待ち時間（秒）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# DriveフォルダIDのローカルキャッシュの有効期間（秒）
+DEFAULT_DRIVE_FOLDER_CACHE_TTL = 7 * 24 * 60 * 60
+
+# CSVバックアップの設定
+BACKUP_READ_CHUNK_SIZE = 1024 * 1024  # ハッシュ計算・圧縮時の読み取り単位（バイト）
+DEFAULT_DRIVE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 再開可能アップロードの1チャンクのサイズ（256KBの倍数）
+DRIVE_UPLOAD_CHUNK_ALIGNMENT = 256 * 1024  # Drive APIが要求するチャンクサイズの単位
+DRIVE_UPLOAD_SESSION_TTL = 6 * 24 * 60 * 60  # 再開用セッションURIを使用する期間（Drive側の有効期間は約1週間）
+
+# 複数ジョブ（jobs）の設定
+DEFAULT_MAX_PARALLEL_JOBS = 4  # 同時に実行するジョブの最大数
+DEFAULT_API_CONCURRENCY = {  # API種別ごとの同時呼び出し数の上限（全ジョブ合計）
+    'sheets_read': 4,
+    'sheets_write': 4,
+    'drive': 4,
+    'docs': 2
+}
+
+# 実行ごとの計測値（metrics_dir）の設定
+DEFAULT_METRICS_DIR = 'metrics'  # JSONとPrometheusのtextfileを出力するディレクトリ（空にすると出力しない）
+PROMETHEUS_METRIC_PREFIX = 'pepal_app'
+
+# 実行履歴シートの列（列を追加した場合、既存のシートのヘッダーは次回記録時に更新する）
+HISTORY_HEADER = ["実行ID", "実行日時", "ステータス", "メッセージ", "CSVファイルパス", "処理行数", "Google Docsリンク", "警告",
+                  "所要時間(秒)", "API呼び出し数", "再開"]
+
+# 監視モード（--watch）の設定
+DEFAULT_WATCH_INTERVAL = 10  # CSVファイルの更新を確認する間隔（秒）
+DEFAULT_WATCH_DEBOUNCE = 5  # 更新後、サイズと更新日時がこの秒数変化しなくなってから同期する
+DEFAULT_WATCH_RETRY_INTERVAL = 300  # 同期に失敗した場合に同じ内容で再試行するまでの間隔（秒）
+
+# 独立したステージ（シート書き込み・Driveバックアップなど）を並列実行する最大スレッド数
+DEFAULT_MAX_PARALLEL_STAGES = 4
+
+# Google Docs実行ログのローテーション設定
+DEFAULT_LOG_DOC_ROTATION = 'none'  # 'none': 常にlog_doc_id / 'monthly': 月ごと / 'size': サイズ上限ごと
+DEFAULT_LOG_DOC_MAX_CHARS = 1000000  # 'size'ローテーションで1ドキュメントに書き込む最大文字数
+DEFAULT_LOG_DOC_INDEX_SHEET_NAME = 'log_docs'  # ローテーションしたドキュメントの一覧を記録するシート
+
+# 実行ログの送信待ちキュー（log_outbox）の設定
+LOG_OUTBOX_FILE_NAME = 'log_outbox.sqlite3'
+DEFAULT_LOG_OUTBOX_MAX_ATTEMPTS = 10  # 送信に失敗したエントリを再試行する最大回数（超えたものは送信しない）
+DEFAULT_LOG_OUTBOX_FLUSH_TIMEOUT = 60  # 終了時に送信の完了を待つ最大秒数
+LOG_OUTBOX_BATCH_SIZE = 50  # 1回のappend_rows・batchUpdateで送る最大エントリ数
+LOG_OUTBOX_RETENTION_DAYS = 7  # 送信済みのエントリを残す日数
+LOG_OUTBOX_CONFIG_KEYS = [  # 送信時に使う設定（エントリと一緒に保存する）
+    'spreadsheet_id', 'log_sheet_name', 'log_doc_id', 'log_doc_rotation', 'log_doc_max_chars',
+    'log_doc_folder_id', 'drive_folder_id', 'log_doc_index_sheet_name', 'state_dir', 'run_history'
+]
+
+# ローカルの実行履歴（run_history）の設定
+RUN_HISTORY_FILE_NAME = 'run_history.sqlite3'
+DEFAULT_HISTORY_LIMIT = 20  # historyコマンドで表示する件数
+
+# ログ出力の設定
+DEFAULT_ROW_LOG_INTERVAL = 1000  # 行ごとのログを何行おきに出力するか（1で全行）
+DEFAULT_LOG_DOC_MAX_ISSUES = 10  # Google Docsの実行ログに記録するエラー・警告の最大件数（それぞれ）
+LOG_DOC_MESSAGE_MAX_CHARS = 300  # Google Docsの実行ログに記録するエラー・警告1件あたりの最大文字数
+LOG_ISSUES_MAX_RECORDED = 50  # 実行ごとに保持するエラー・警告の最大件数（それぞれ）
+RUN_LOG_CLOSE_TIMEOUT = 10.0  # 実行ごとのログファイルのアップロード前に、キューに残っている分の出力を待つ最大秒数
+
+# 行ごとのログの出力間隔
+row_log_interval = DEFAULT_ROW_LOG_INTERVAL
+
+# ファイル・コンソールへの出力を別スレッドで行うリスナーとそのキュー
+log_listener = None
+log_queue = None
+
+# 実行中のジョブ（ジョブ名）。ジョブ外ではNone
+current_job = contextvars.ContextVar('current_job', default=None)
+
+# 実行中の同期処理の計測値（RunMetrics）。同期処理の外ではNone
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+def get_api_error_status(error):
+    """Google APIの例外からHTTPステータスコードを取り出す（取り出せない場合はNone）"""
+    # googleapiclient.errors.HttpError
+    resp = getattr(error, 'resp', None)
+    if resp is not None and getattr(resp, 'status', None) is not None:
+        return int(resp.status)
+    # gspread.exceptions.APIError など requests.Response を持つ例外
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) is not None:
+        return int(response.status_code)
+    return None
+
+def get_retry_after(error):
+    """Google APIの例外のRetry-Afterヘッダーから待ち時間（秒）を取り出す（無い場合はNone）"""
+    value = None
+    resp = getattr(error, 'resp', None)
+    if resp is not None and hasattr(resp, 'get'):
+        value = resp.get('retry-after')
+    response = getattr(error, 'response', None)
+    if value is None and response is not None and getattr(response, 'headers', None) is not None:
+        value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        # HTTP日付形式
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(tz=retry_at.tzinfo)).total_seconds())
+    except Exception:
+        return None
+
+def is_connection_error(error):
+    """通信エラー（タイムアウト・接続断）かどうかを判定する"""
+    import requests
+    return isinstance(error, (ConnectionError, TimeoutError,
+                              requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+class TokenBucket:
+    """1分あたりの呼び出し回数を制限するトークンバケット"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)  # 10秒分までのバーストを許可
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得する。不足している場合は補充されるまで待ち、待った秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait_seconds = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+def describe_api_call(kind, func):
+    """計測用のエンドポイント名を返す（googleapiclientはメソッドID、gspreadはメソッド名）"""
+    method_id = getattr(getattr(func, '__self__', None), 'methodId', None)
+    if method_id:
+        return method_id
+    return f"{kind}.{getattr(func, '__qualname__', getattr(func, '__name__', 'call'))}"
+
+class RunMetrics:
+    """1回の同期処理のステージ・API呼び出しの計測値"""
+
+    def __init__(self, execution_id, job_name=None):
+        self.execution_id = execution_id
+        self.job_name = job_name
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        self.total_seconds = None
+        self.success = None
+        self.stages = {}
+        self.api_calls = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.values = {}
+        self.log_counts = {}
+        self.log_issues = {'WARNING': [], 'ERROR': []}
+        self.log_path = None  # この実行のログだけを書き込むログファイル（Driveへのアップロード用）
+        self.log_open = False  # log_pathへの書き込み中か
+        self._lock = threading.Lock()
+
+    def record_api_call(self, endpoint, seconds, retries, failed):
+        with self._lock:
+            entry = self.api_calls.setdefault(endpoint, {'calls': 0, 'retries': 0, 'errors': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['retries'] += retries
+            entry['errors'] += int(failed)
+            entry['seconds'] += seconds
+
+    def record_bytes(self, sent, received):
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def set_value(self, name, value):
+        """処理行数などの値を記録する"""
+        with self._lock:
+            self.values[name] = value
+
+    def record_log(self, levelname, message):
+        """ログの件数をレベル別に数え、エラー・警告は先頭から一定数のメッセージを保持する"""
+        with self._lock:
+            self.log_counts[levelname] = self.log_counts.get(levelname, 0) + 1
+            issues = self.log_issues.get('ERROR' if levelname == 'CRITICAL' else levelname)
+            if issues is not None and len(issues) < LOG_ISSUES_MAX_RECORDED:
+                issues.append(message)
+
+    def record_stage(self, name, seconds):
+        """完了したステージの所要時間を記録する"""
+        with self._lock:
+            self.stages[name] = seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def total_api_calls(self):
+        with self._lock:
+            return sum(entry['calls'] for entry in self.api_calls.values())
+
+    def finish(self, stage_timings, success):
+        self.total_seconds = self.elapsed()
+        self.stages = dict(stage_timings)
+        self.success = success
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'execution_id': self.execution_id,
+                'job': self.job_name,
+                'started_at': datetime.fromtimestamp(self.started_at).strftime("%Y-%m-%d %H:%M:%S"),
+                'success': self.success,
+                'total_seconds': self.total_seconds,
+                'stages': dict(self.stages),
+                'api': {
+                    'calls': sum(entry['calls'] for entry in self.api_calls.values()),
+                    'retries': sum(entry['retries'] for entry in self.api_calls.values()),
+                    'errors': sum(entry['errors'] for entry in self.api_calls.values()),
+                    'bytes_sent': self.bytes_sent,
+                    'bytes_received': self.bytes_received,
+                    'endpoints': {name: dict(entry) for name, entry in self.api_calls.items()}
+                },
+                'logs': dict(self.log_counts),
+                'values': dict(self.values)
+            }
+
+    def to_prometheus(self):
+        """Prometheusのtextfile collector形式に変換する"""
+        data = self.to_dict()
+        base_labels = {'job_name': self.job_name or 'default'}
+        
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        
+        def sample(metric_name, value, **labels):
+            all_labels = dict(base_labels, **labels)
+            label_text = ",".join(f'{key}="{escape(val)}"' for key, val in all_labels.items())
+            return f"{PROMETHEUS_METRIC_PREFIX}_{metric_name}{{{label_text}}} {float(value)!r}"
+        
+        lines = []
+        
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_METRIC_PREFIX}_{name} {metric_type}")
+            lines.extend(samples)
+        
+        metric('last_run_timestamp_seconds', 'gauge', "Start time of the last run.", [sample('last_run_timestamp_seconds', self.started_at)])
+        metric('last_run_success', 'gauge', "Whether the last run wrote the sheet successfully.", [sample('last_run_success', bool(self.success))])
+        metric('last_run_duration_seconds', 'gauge', "Wall time of the last run.", [sample('last_run_duration_seconds', self.total_seconds or 0.0)])
+        metric('stage_duration_seconds', 'gauge', "Wall time per stage of the last run.",
+               [sample('stage_duration_seconds', seconds, stage=stage) for stage, seconds in data['stages'].items()])
+        endpoints = data['api']['endpoints']
+        for key, help_text in (('calls', "Google API calls in the last run."), ('retries', "Google API retries in the last run."),
+                               ('errors', "Google API calls that failed after retries in the last run."),
+                               ('seconds', "Time spent in Google API calls in the last run.")):
+            name = f"api_{key}" if key != 'seconds' else 'api_duration_seconds'
+            metric(name, 'gauge', help_text, [sample(name, entry[key], endpoint=endpoint) for endpoint, entry in endpoints.items()])
+        metric('api_sent_bytes', 'gauge', "Bytes sent to Google APIs in the last run.", [sample('api_sent_bytes', data['api']['bytes_sent'])])
+        metric('api_received_bytes', 'gauge', "Bytes received from Google APIs in the last run.", [sample('api_received_bytes', data['api']['bytes_received'])])
+        numeric_values = {name: value for name, value in data['values'].items() if isinstance(value, (int, float))}
+        metric('last_run_value', 'gauge', "Values recorded by the last run (rows processed, CSV bytes, ...).",
+               [sample('last_run_value', value, key=name) for name, value in numeric_values.items()])
+        return "\n".join(lines) + "\n"
+
+def write_run_metrics(config, metrics):
+    """計測値をJSONファイルとPrometheusのtextfileに書き込み、JSONファイルのパスを返す"""
+    metrics_dir = config.get('metrics_dir', DEFAULT_METRICS_DIR)
+    if not metrics_dir:
+        return None
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        timestamp = datetime.fromtimestamp(metrics.started_at).strftime("%Y%m%d_%H%M%S")
+        json_path = os.path.join(metrics_dir, f"metrics_{timestamp}_{metrics.execution_id}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(metrics.to_dict(), f, ensure_ascii=False, indent=2)
+        
+        # textfile collectorが書きかけのファイルを読まないよう一時ファイル経由で置き換える
+        prometheus_dir = config.get('metrics_prometheus_dir', metrics_dir)
+        os.makedirs(prometheus_dir, exist_ok=True)
+        suffix = f"_{metrics.job_name}" if metrics.job_name else ""
+        prometheus_path = os.path.join(prometheus_dir, f"{PROMETHEUS_METRIC_PREFIX}{suffix}.prom")
+        with open(prometheus_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(metrics.to_prometheus())
+        os.replace(prometheus_path + '.tmp', prometheus_path)
+        logging.info(f"計測値を出力しました: {json_path}, {prometheus_path}")
+        return json_path
+    except Exception as e:
+        logging.warning(f"計測値の出力中にエラーが発生しました: {str(e)}")
+        return None
+
+class ApiRateLimiter:
+    """API種別ごとのトークンバケットと、指数バックオフによる再試行でGoogle API呼び出しを制御する"""
+
+    def __init__(self, rate_limits=None, max_retries=DEFAULT_API_MAX_RETRIES,
+                 backoff_base=DEFAULT_API_BACKOFF_BASE, backoff_max=DEFAULT_API_BACKOFF_MAX, concurrency=None):
+        limits = dict(DEFAULT_API_RATE_LIMITS)
+        limits.update(rate_limits or {})
+        self.buckets = {kind: TokenBucket(per_minute) for kind, per_minute in limits.items()}
+        max_concurrency = dict(DEFAULT_API_CONCURRENCY)
+        max_concurrency.update(concurrency or {})
+        self.semaphores = {kind: threading.BoundedSemaphore(max(1, int(n))) for kind, n in max_concurrency.items()}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'throttle_wait_seconds': 0.0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def call(self, kind, func, *args, idempotent=True, **kwargs):
+        """レート制限をかけてAPIを呼び出し、429/5xx・通信エラーの場合は再試行する
+
+        idempotent=Falseの呼び出し（行の追加・ファイル作成など）は、サーバーで処理されていない
+        ことが確実な429の場合のみ再試行する。
+        """
+        metrics = current_metrics.get()
+        state = {'retries': 0}
+        start_time = time.perf_counter()
+        failed = True
+        try:
+            result = self._call_with_retry(kind, func, args, kwargs, idempotent, state)
+            failed = False
+            return result
+        finally:
+            # 実行中の同期処理があれば、エンドポイントごとの所要時間・再試行回数を記録する
+            if metrics is not None:
+                metrics.record_api_call(describe_api_call(kind, func), time.perf_counter() - start_time,
+                                        state['retries'], failed)
+
+    def _call_with_retry(self, kind, func, args, kwargs, idempotent, state):
+        """callの本体（レート制限・再試行）。この呼び出しでの再試行回数をstate['retries']に記録する"""
+        bucket = self.buckets.get(kind)
+        semaphore = self.semaphores.get(kind)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                waited = bucket.acquire()
+                if waited > 0:
+                    self._count('throttle_wait_seconds', waited)
+            self._count('calls')
+            try:
+                if semaphore is None:
+                    return func(*args, **kwargs)
+                with semaphore:
+                    return func(*args, **kwargs)
+            except Exception as e:
+                status = get_api_error_status(e)
+                if status == 429:
+                    self._count('throttled')
+                retryable = status == 429 or (idempotent and (status in RETRYABLE_STATUS_CODES or is_connection_error(e)))
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                
+                # Retry-Afterがあればそれに従い、無ければジッター付きの指数バックオフ
+                delay = get_retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                attempt += 1
+                state['retries'] = attempt
+                self._count('retries')
+                logging.warning(f"Google API ({kind}) の呼び出しに失敗したため {delay:.1f}秒後に再試行します "
+                                f"({attempt}/{self.max_retries}, ステータス: {status}): {str(e)}")
+                time.sleep(delay)
+
+    def summary(self):
+        """呼び出し回数・再試行回数・スロットリング回数の要約を返す"""
+        with self._lock:
+            return (f"API呼び出し: {self.stats['calls']}回, 再試行: {self.stats['retries']}回, "
+                    f"スロットリング(429): {self.stats['throttled']}回, "
+                    f"レート制限による待機: {self.stats['throttle_wait_seconds']:.1f}秒")
+
+def override_api_url(url, endpoint_override):
+    """Google APIのURLの送信先をendpoint_overrideに置き換える（パス・クエリはそのまま）"""
+    for base_url in GOOGLE_API_BASE_URLS:
+        if url.startswith(base_url):
+            return endpoint_override.rstrip('/') + '/' + url[len(base_url):]
+    return url
+
+def payload_size(body, headers=None):
+    """リクエスト本文のバイト数を返す（ストリームの場合はContent-Lengthヘッダーから求める）"""
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    try:
+        return len(body)
+    except TypeError:
+        content_length = (headers or {}).get('Content-Length') or (headers or {}).get('content-length')
+        return int(content_length) if content_length else 0
+
+class ApiHttp:
+    """googleapiclient（httplib2）の送受信バイト数を計測し、必要に応じて送信先を置き換える
+
+    httplib2.Httpを包み、request以外の属性は包んだHttpに委譲する。
+    """
+
+    def __init__(self, endpoint_override=None, **kwargs):
+        import httplib2
+        self.http = httplib2.Http(**kwargs)
+        # 再開可能アップロードの途中のチャンクへの応答（308）をリダイレクトとして扱わない（googleapiclientのbuild_httpと同じ）
+        self.http.redirect_codes = self.http.redirect_codes - {308}
+        self.endpoint_override = endpoint_override
+
+    def __getattr__(self, name):
+        if name == 'http':
+            # コピー時など初期化前の参照で再帰しないようにする
+            raise AttributeError(name)
+        return getattr(self.http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        if self.endpoint_override:
+            uri = override_api_url(uri, self.endpoint_override)
+        response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.record_bytes(payload_size(body, headers), len(content or b''))
+        return response, content
+
+class ApiHttpAdapter:
+    """gspread（requests）の送受信バイト数を計測し、必要に応じて送信先を置き換える
+
+    requestsのHTTPAdapterを包み、send以外の属性は包んだアダプターに委譲する。
+    """
+
+    def __init__(self, endpoint_override=None, **kwargs):
+        from requests.adapters import HTTPAdapter
+        self.adapter = HTTPAdapter(**kwargs)
+        self.endpoint_override = endpoint_override
+
+    def __getattr__(self, name):
+        if name == 'adapter':
+            # コピー時など初期化前の参照で再帰しないようにする
+            raise AttributeError(name)
+        return getattr(self.adapter, name)
+
+    def send(self, request, **kwargs):
+        if self.endpoint_override:
+            request.url = override_api_url(request.url, self.endpoint_override)
+        response = self.adapter.send(request, **kwargs)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.record_bytes(payload_size(request.body, request.headers), len(response.content or b''))
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+# ディスカバリードキュメントの内容（(API名, バージョン) -> JSON文字列）。1プロセスで1回だけ読み込む
+discovery_documents = {}
+discovery_lock = threading.Lock()
+
+def load_discovery_document(api_name, api_version, discovery_dir=None):
+    """ディスカバリードキュメントを返す
+
+    discovery_dirに '<API名>.<バージョン>.json' があればそれを、無ければgoogleapiclientに同梱の
+    静的ドキュメントを読み込む。ネットワークからは取得しない。
+    """
+    key = (api_name, api_version)
+    with discovery_lock:
+        if key not in discovery_documents:
+            local_path = os.path.join(discovery_dir, f"{api_name}.{api_version}.json") if discovery_dir else None
+            if local_path and os.path.exists(local_path):
+                with open(local_path, 'r', encoding='utf-8') as f:
+                    discovery_documents[key] = f.read()
+                logging.debug(f"ディスカバリードキュメントを読み込みました: {local_path}")
+            else:
+                from googleapiclient.discovery_cache import get_static_doc
+                content = get_static_doc(api_name, api_version)
+                if content is None:
+                    raise ValueError(f"{api_name} {api_version} のディスカバリードキュメントが見つかりません")
+                discovery_documents[key] = content
+        return discovery_documents[key]
+
+class GoogleApiContext:
+    """認証情報とGoogle APIクライアントを1プロセス内で共有するコンテキスト
+
+    認証情報の読み込み・アクセストークンの取得・HTTP接続・ディスカバリードキュメントの読み込みを
+    1回だけ行い、gspreadクライアント・スプレッドシート・Drive/Docsサービスを使い回す。
+    """
+
+    def __init__(self, creds_file, http_timeout=DEFAULT_HTTP_TIMEOUT, limiter=None, endpoint_override=None,
+                 discovery_dir=None):
+        from google.oauth2.service_account import Credentials
+        self.creds_file = creds_file
+        self.http_timeout = http_timeout
+        self.endpoint_override = endpoint_override
+        self.discovery_dir = discovery_dir
+        self.limiter = limiter if limiter is not None else ApiRateLimiter()
+        self.creds = Credentials.from_service_account_file(creds_file, scopes=SCOPES)
+        self._lock = threading.RLock()
+        self._auth_request = None
+        self._gspread_client = None
+        self._spreadsheets = {}
+        self._thread_local = threading.local()
+
+    def call(self, kind, func, *args, idempotent=True, **kwargs):
+        """共有のレート制限・再試行を通してAPIを呼び出す（kind: sheets_read/sheets_write/drive/docs）"""
+        return self.limiter.call(kind, func, *args, idempotent=idempotent, **kwargs)
+
+    def auth_request(self):
+        """トークンの取得など認証情報の処理に使うHTTPリクエストを返す（送信先の置き換えと計測を適用）"""
+        with self._lock:
+            if self._auth_request is None:
+                import requests
+                from google.auth.transport.requests import Request
+                session = requests.Session()
+                session.mount('https://', ApiHttpAdapter(self.endpoint_override))
+                self._auth_request = Request(session)
+            return self._auth_request
+
+    def ensure_token(self):
+        """アクセストークンが無いか期限切れの場合のみ取得し直す"""
+        with self._lock:
+            if not self.creds.valid:
+                self.creds.refresh(self.auth_request())
+        return self.creds.token
+
+    def gspread_client(self):
+        """gspreadクライアントを返す（HTTPセッションは接続プールとして再利用される）"""
+        with self._lock:
+            if self._gspread_client is None:
+                import gspread
+                from google.auth.transport.requests import AuthorizedSession
+                # 認証情報の処理（トークンの更新など）もAPI呼び出しと同じ送信先の置き換えを通す
+                session = AuthorizedSession(self.creds, auth_request=self.auth_request())
+                session.mount('https://', ApiHttpAdapter(self.endpoint_override))
+                self._gspread_client = gspread.authorize(self.creds, session=session)
+            return self._gspread_client
+
+    def open_spreadsheet(self, spreadsheet_id):
+        """スプレッドシートを開く（同じIDは2回目以降キャッシュを返す）"""
+        with self._lock:
+            if spreadsheet_id not in self._spreadsheets:
+                self._spreadsheets[spreadsheet_id] = self.call('sheets_read', self.gspread_client().open_by_key, spreadsheet_id)
+            return self._spreadsheets[spreadsheet_id]
+
+    def service(self, api_name, api_version):
+        """googleapiclientのサービスを返す（ローカルのディスカバリードキュメントを使用）
+
+        httplib2の接続はスレッドセーフではないため、サービスはスレッドごとに作成して使い回す。
+        """
+        services = getattr(self._thread_local, 'services', None)
+        if services is None:
+            services = self._thread_local.services = {}
+        key = (api_name, api_version)
+        if key not in services:
+            from google_auth_httplib2 import AuthorizedHttp
+            from googleapiclient.discovery import build_from_document
+            document = load_discovery_document(api_name, api_version, self.discovery_dir)
+            http = AuthorizedHttp(self.creds, http=ApiHttp(self.endpoint_override, timeout=self.http_timeout))
+            services[key] = build_from_document(document, http=http)
+        return services[key]
+
+    def drive_service(self):
+        """Google Drive APIサービスを返す"""
+        return self.service('drive', 'v3')
+
+    def docs_service(self):
+        """Google Docs APIサービスを返す"""
+        return self.service('docs', 'v1')
+
+def create_api_context(config):
+    """設定から共有のGoogle APIコンテキストを作成する。作成できない場合はNone"""
+    try:
+        creds_file = config.get('creds_file', 'creds.json')
+        
+        # 認証情報ファイルの確認
+        if not os.path.exists(creds_file):
+            logging.error(f"認証情報ファイル '{creds_file}' が見つかりません")
+            return None
+        
+        limiter = ApiRateLimiter(
+            config.get('api_rate_limits'),
+            int(config.get('api_max_retries', DEFAULT_API_MAX_RETRIES)),
+            float(config.get('api_backoff_base', DEFAULT_API_BACKOFF_BASE)),
+            float(config.get('api_backoff_max', DEFAULT_API_BACKOFF_MAX)),
+            config.get('api_concurrency')
+        )
+        endpoint_override = config.get('api_endpoint_override')
+        if endpoint_override:
+            logging.warning(f"Google APIの送信先を {endpoint_override} に置き換えます")
+        api = GoogleApiContext(creds_file, config.get('http_timeout', DEFAULT_HTTP_TIMEOUT), limiter, endpoint_override,
+                               config.get('discovery_dir'))
+        api.ensure_token()
+        logging.info("Google APIの認証が完了しました")
+        return api
+        
+    except Exception as e:
+        logging.error(f"Google APIの認証中にエラーが発生しました: {str(e)}")
+        return None
 
 def load_config(config_file='config.json'):
     """設定ファイルを読み込む"""
@@ -40,9 +731,12 @@ def load_config(config_file='config.json'):
 
 # ログの設定
 def setup_logging():
-    """ログの設定を行う"""
-    global captured_logs
-    captured_logs = []  # ログメッセージをリセット
+    """ログの設定を行う
+
+    ファイル・コンソールへの出力はQueueHandler/QueueListener経由で別スレッドから行い、
+    ログ出力の呼び出し元がディスクI/Oで待たされないようにする。
+    """
+    global log_listener, log_queue
     
     # logディレクトリの作成（存在しない場合）
     log_dir = "log"
@@ -53,25 +747,135 @@ def setup_logging():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_filename = os.path.join(log_dir, f"csv_log_{timestamp}.log")
     
-    # カスタムハンドラーを作成
+    # 同期処理中のログはレベル別の件数と先頭のエラー・警告を計測値に記録する（Google Docsの要約に使用）
     class LogCaptureHandler(logging.Handler):
         def emit(self, record):
-            log_message = self.format(record)
-            captured_logs.append(log_message)
+            metrics = current_metrics.get()
+            if metrics is not None:
+                metrics.record_log(record.levelname, self.format(record))
+    
+    # ジョブ実行中のログにはジョブ名を付ける
+    class JobLabelFilter(logging.Filter):
+        def filter(self, record):
+            job = current_job.get()
+            record.job_label = f"[{job['name']}] " if job else ""
+            return True
+    
+    # 同期処理中のログには、その実行のログファイル（RunLogHandlerの書き込み先）を付ける
+    class RunLogFilter(logging.Filter):
+        def filter(self, record):
+            metrics = current_metrics.get()
+            record.run_log_path = metrics.log_path if metrics is not None and metrics.log_open else None
+            return True
+    
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(job_label)s%(message)s')
+    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()  # コンソールにも出力
+    stream_handler.setFormatter(formatter)
+    capture_handler = LogCaptureHandler()  # ログの件数とエラー・警告を記録
+    capture_handler.setFormatter(logging.Formatter('%(job_label)s%(message)s'))
+    run_log_handler = RunLogHandler()  # 実行ごとのログファイルに出力
+    run_log_handler.setFormatter(formatter)
+    # 実行ごとのログファイルの区切りはファイル・コンソールには出力しない
+    file_handler.addFilter(is_log_record)
+    stream_handler.addFilter(is_log_record)
+    
+    # ファイル・コンソールへの出力はキューを介してリスナースレッドで行う
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, run_log_handler)
+    log_listener.start()
+    atexit.register(shutdown_logging)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # 整形は出力側のハンドラーで行う
+    queue_handler.addFilter(JobLabelFilter())
+    queue_handler.addFilter(RunLogFilter())
+    capture_handler.addFilter(JobLabelFilter())
     
     # ログの設定
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.FileHandler(log_filename, encoding='utf-8'),
-            logging.StreamHandler(),  # コンソールにも出力
-            LogCaptureHandler()  # ログメッセージをキャプチャ
+            queue_handler,
+            capture_handler
         ]
     )
     return log_filename
 
-def find_existing_folder(service, parent_folder_id, folder_name):
+def shutdown_logging():
+    """キューに残っているログを出力してリスナーを停止する"""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+def is_log_record(record):
+    """実行ごとのログファイルの区切り（close_run_logのマーカー）ではないレコードか"""
+    return not hasattr(record, 'run_log_marker')
+
+class RunLogHandler(logging.Handler):
+    """同期処理ごとのログファイルに、その実行中に出力されたログだけを書き込む（リスナースレッドで実行）
+
+    並列に実行されるジョブのログは、それぞれの実行のファイルに分かれる。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.streams = {}
+
+    def emit(self, record):
+        path = getattr(record, 'run_log_path', None)
+        marker = getattr(record, 'run_log_marker', None)
+        if marker is not None:
+            # この実行のログはすべて出力済み
+            stream = self.streams.pop(path, None)
+            if stream is not None:
+                stream.close()
+            marker.set()
+            return
+        if path is None:
+            return
+        try:
+            stream = self.streams.get(path)
+            if stream is None:
+                stream = self.streams[path] = open(path, 'a', encoding='utf-8')
+            stream.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+def open_run_log(config, metrics):
+    """この実行のログだけを書き込むログファイルを用意する（ログファイルのアップロードが有効な場合のみ）"""
+    if log_listener is None or not config.get('log_file_upload', True) or not config.get('drive_folder_id'):
+        return
+    metrics.log_path = get_state_path(config, f"run_log_{metrics.execution_id}.log")
+    metrics.log_open = True
+
+def close_run_log(metrics, timeout=RUN_LOG_CLOSE_TIMEOUT):
+    """この実行のログファイルへの書き込みを終え、キューに残っている分が出力されるまで待つ
+
+    他のジョブのログの出力を待たないよう、キューに区切りのレコードを入れ、それが処理されるまでだけ待つ。
+    """
+    if not metrics.log_open:
+        return
+    metrics.log_open = False
+    done = threading.Event()
+    marker = logging.LogRecord('pepal', logging.INFO, __file__, 0, "", None, None)
+    marker.run_log_path = metrics.log_path
+    marker.run_log_marker = done
+    log_queue.put(marker)
+    if not done.wait(timeout):
+        logging.warning("実行ごとのログファイルの出力が完了しませんでした")
+
+def configure_log_sampling(config):
+    """設定に従って行ごとのログの出力間隔を変更する"""
+    global row_log_interval
+    row_log_interval = max(1, int(config.get('row_log_interval', DEFAULT_ROW_LOG_INTERVAL)))
+
+def should_log_row(index):
+    """行ごとのログを出力するか判定する（1件目と、以降row_log_interval件ごと）"""
+    return (index - 1) % row_log_interval == 0
+
+def find_existing_folder(api, parent_folder_id, folder_name):
     """指定された親フォルダ内の既存フォルダを検索する（フォルダは存在する前提）"""
     try:
         logging.info(f"=== 既存フォルダ検索デバッグ ===")
@@ -83,12 +887,13 @@ def find_existing_folder(service, parent_folder_id, folder_name):
         logging.info(f"検索クエリ: {query}")
         
         # 共有ドライブ対応のため、includeItemsFromAllDrivesとsupportsAllDrivesを追加
-        results = service.files().list(
+        request = api.drive_service().files().list(
             q=query, 
             fields='files(id,name,mimeType,parents)',
             includeItemsFromAllDrives=True,
             supportsAllDrives=True
-        ).execute()
+        )
+        results = api.call('drive', request.execute)
         files = results.get('files', [])
         logging.info(f"検索結果: {len(files)} 個のフォルダが見つかりました")
         
@@ -111,8 +916,194 @@ def find_existing_folder(service, parent_folder_id, folder_name):
         logging.error(f"詳細なエラー情報: {traceback.format_exc()}")
         return None
 
-def upload_file_to_drive(service, file_path, folder_id, file_name=None):
-    """ファイルをGoogle Driveにアップロードする"""
+def resolve_drive_folder(config, api, parent_folder_id, folder_name, refresh=False):
+    """フォルダIDをローカルキャッシュから解決し、無ければDriveを検索してキャッシュする
+
+    (フォルダID, キャッシュから取得したか) を返す。キャッシュは有効期間内であれば検証せずに使用し、
+    アップロード時にフォルダが見つからなかった場合にrefresh=Trueで再検索する。
+    """
+    cache_path = get_state_path(config, "drive_folder_cache.json")
+    cache_key = f"{parent_folder_id}/{folder_name}"
+    ttl = float(config.get('drive_folder_cache_ttl', DEFAULT_DRIVE_FOLDER_CACHE_TTL))
+    
+    with state_lock:
+        cache = load_json_state(cache_path) or {}
+        entry = cache.get(cache_key)
+        if not refresh and entry and time.time() - entry.get('cached_at', 0) < ttl:
+            logging.info(f"キャッシュ済みのフォルダ '{folder_name}' を使用します (ID: {entry['id']})")
+            return entry['id'], True
+    
+    folder_id = find_existing_folder(api, parent_folder_id, folder_name)
+    
+    with state_lock:
+        cache = load_json_state(cache_path) or {}
+        if folder_id:
+            cache[cache_key] = {'id': folder_id, 'cached_at': time.time()}
+        else:
+            cache.pop(cache_key, None)
+        save_json_state(cache_path, cache)
+    return folder_id, False
+
+class HashingWriter:
+    """書き込んだバイト列のMD5を計算しながらファイルに書き込むラッパー"""
+
+    def __init__(self, file):
+        self.file = file
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def write(self, data):
+        self.md5.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+def prepare_backup_payload(file_path, compress=False, known_md5=None):
+    """バックアップするファイルを1回読み取り、MD5の計算と（必要に応じて）gzip圧縮を同時に行う
+
+    アップロードするファイルのパス・MD5（Driveのmd5Checksumと同じ値）・サイズを辞書で返す。
+    圧縮した場合の一時ファイルは呼び出し元で削除する（'temp_path'）。
+    取り込み時に計算済みのMD5（known_md5）があり、圧縮しない場合はファイルを読み直さない。
+    """
+    if known_md5 and not compress:
+        size = os.path.getsize(file_path)
+        return {'path': file_path, 'temp_path': None, 'compressed': False, 'md5': known_md5,
+                'upload_size': size, 'source_md5': known_md5, 'source_size': size}
+    
+    source_md5 = hashlib.md5()
+    source_size = 0
+    payload = {'path': file_path, 'temp_path': None, 'compressed': compress}
+    
+    with open(file_path, 'rb') as source:
+        if compress:
+            # mtime=0で圧縮結果を入力内容だけで決まるようにする（同じ内容なら同じMD5）
+            temp = tempfile.NamedTemporaryFile(prefix='backup_', suffix='.gz', delete=False)
+            payload['path'] = payload['temp_path'] = temp.name
+            try:
+                with temp:
+                    writer = HashingWriter(temp)
+                    with gzip.GzipFile(filename='', mode='wb', fileobj=writer, mtime=0) as gz:
+                        for chunk in iter(lambda: source.read(BACKUP_READ_CHUNK_SIZE), b''):
+                            source_md5.update(chunk)
+                            source_size += len(chunk)
+                            gz.write(chunk)
+            except Exception:
+                # 圧縮に失敗した場合は一時ファイルを残さない
+                os.remove(temp.name)
+                raise
+            payload['md5'] = writer.md5.hexdigest()
+            payload['upload_size'] = writer.size
+        else:
+            for chunk in iter(lambda: source.read(BACKUP_READ_CHUNK_SIZE), b''):
+                source_md5.update(chunk)
+                source_size += len(chunk)
+            payload['md5'] = source_md5.hexdigest()
+            payload['upload_size'] = source_size
+    
+    payload['source_md5'] = source_md5.hexdigest()
+    payload['source_size'] = source_size
+    return payload
+
+def is_duplicate_backup(config, api, state_path, csv_file_path, payload):
+    """前回のバックアップと内容が同じか判定する
+
+    ローカルに記録した前回のMD5と比較し、drive_backup_verify_remoteが有効な場合は
+    前回のバックアップファイルのmd5ChecksumをDriveから1回取得して存在と内容も確認する。
+    """
+    with state_lock:
+        entry = (load_json_state(state_path) or {}).get(csv_file_path)
+    if not entry or entry.get('md5') != payload['md5']:
+        return False
+    
+    if config.get('drive_backup_verify_remote', False) and entry.get('file_id'):
+        try:
+            request = api.drive_service().files().get(
+                fileId=entry['file_id'],
+                fields='id,md5Checksum,trashed',
+                supportsAllDrives=True
+            )
+            remote = api.call('drive', request.execute)
+            if remote.get('trashed') or remote.get('md5Checksum') != payload['md5']:
+                return False
+        except Exception as e:
+            logging.warning(f"前回のバックアップファイルを確認できなかったため再アップロードします: {str(e)}")
+            return False
+    return True
+
+def record_backup_state(state_path, csv_file_path, payload, file_id, file_name):
+    """アップロードしたバックアップのMD5とファイルIDを記録する"""
+    with state_lock:
+        state = load_json_state(state_path) or {}
+        state[csv_file_path] = {
+            'md5': payload['md5'],
+            'source_md5': payload['source_md5'],
+            'compressed': payload['compressed'],
+            'file_id': file_id,
+            'name': file_name,
+            'uploaded_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        save_json_state(state_path, state)
+
+def log_upload_progress(file_name, bytes_sent, total_bytes, elapsed):
+    """アップロードの進捗とスループットをログに出力する（デフォルトの進捗コールバック）"""
+    throughput = bytes_sent / elapsed if elapsed > 0 else 0.0
+    percent = bytes_sent / total_bytes if total_bytes else 1.0
+    logging.info(f"'{file_name}' をアップロード中: {bytes_sent}/{total_bytes} バイト ({percent:.0%}, {throughput / 1024:.1f} KB/秒)")
+
+def load_upload_session(session_path, session_key):
+    """保存済みの再開可能アップロードのセッションを返す（無い・期限切れの場合はNone）"""
+    with state_lock:
+        session = (load_json_state(session_path) or {}).get(session_key)
+    if session and time.time() - session.get('created_at', 0) < DRIVE_UPLOAD_SESSION_TTL:
+        return session
+    return None
+
+def save_upload_session(session_path, session_key, session):
+    """再開可能アップロードのセッションを保存する（Noneの場合は削除）"""
+    with state_lock:
+        sessions = load_json_state(session_path) or {}
+        if session is None:
+            sessions.pop(session_key, None)
+        else:
+            sessions[session_key] = session
+        # 期限切れのセッションは削除
+        now = time.time()
+        sessions = {key: value for key, value in sessions.items() if now - value.get('created_at', 0) < DRIVE_UPLOAD_SESSION_TTL}
+        save_json_state(session_path, sessions)
+
+def query_upload_status(api, http, session_uri, total_bytes):
+    """再開可能アップロードのセッションにサーバー側の受信済みバイト数を問い合わせる
+
+    (受信済みバイト数, 完了している場合はアップロードしたファイルのメタデータ、未完了の場合はNone) を返す。
+    セッションが期限切れ・破棄されている場合はHttpError（404・410）を送出する。
+    """
+    from googleapiclient.errors import HttpError
+    
+    def request_status():
+        # 空のPUTに「Content-Range: bytes */合計」を付けると受信状況だけを返す（未完了は308）
+        response, content = http.request(session_uri, method='PUT',
+                                         headers={'Content-Length': '0', 'Content-Range': f"bytes */{total_bytes}"})
+        if response.status not in (200, 201, 308):
+            raise HttpError(response, content, uri=session_uri)
+        return response, content
+    
+    response, content = api.call('drive', request_status)
+    if response.status in (200, 201):
+        return total_bytes, json.loads(content)
+    received = response.get('range')
+    return (int(received.rsplit('-', 1)[1]) + 1 if received else 0), None
+
+def upload_file_to_drive(api, file_path, folder_id, file_name=None, raise_not_found=False, mime_type=None,
+                         chunk_size=DEFAULT_DRIVE_UPLOAD_CHUNK_SIZE, session_path=None, session_key=None,
+                         progress_callback=log_upload_progress):
+    """ファイルをGoogle Driveにチャンク単位の再開可能アップロードでアップロードする
+
+    raise_not_found=Trueの場合、アップロード先が見つからない（404）エラーは呼び出し元に送出する。
+    session_pathとsession_keyを指定した場合はセッションURIを保存し、前回中断したアップロードを
+    途中から再開する。progress_callbackはチャンクごとに (ファイル名, 送信済みバイト数, 合計バイト数, 経過秒数) で呼ばれる。
+    """
     try:
         if not os.path.exists(file_path):
             logging.error(f"アップロードするファイル '{file_path}' が見つかりません")
@@ -123,12 +1114,15 @@ def upload_file_to_drive(service, file_path, folder_id, file_name=None):
             file_name = os.path.basename(file_path)
         
         # ファイルのメディアタイプを決定
-        file_extension = os.path.splitext(file_path)[1].lower()
-        mime_type = 'text/plain'  # デフォルト
-        if file_extension == '.csv':
-            mime_type = 'text/csv'
-        elif file_extension == '.log':
-            mime_type = 'text/plain'
+        if mime_type is None:
+            file_extension = os.path.splitext(file_path)[1].lower()
+            mime_type = 'text/plain'  # デフォルト
+            if file_extension == '.csv':
+                mime_type = 'text/csv'
+            elif file_extension == '.log':
+                mime_type = 'text/plain'
+            elif file_extension == '.gz':
+                mime_type = 'application/gzip'
         
         # ファイルのメタデータ
         file_metadata = {
@@ -136,14 +1130,56 @@ def upload_file_to_drive(service, file_path, folder_id, file_name=None):
             'parents': [folder_id]
         }
         
-        # ファイルのアップロード（共有ドライブ対応）
-        media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id,name',
-            supportsAllDrives=True
-        ).execute()
+        # チャンクサイズはDrive APIの要求により256KBの倍数に切り上げる
+        chunk_size = max(1, -(-int(chunk_size) // DRIVE_UPLOAD_CHUNK_ALIGNMENT)) * DRIVE_UPLOAD_CHUNK_ALIGNMENT
+        total_bytes = os.path.getsize(file_path)
+        
+        # 前回中断したアップロードがあれば同じセッションで再開
+        session = None
+        if session_path and session_key:
+            session = load_upload_session(session_path, session_key)
+        
+        from googleapiclient.http import MediaFileUpload
+        while True:
+            # ファイルのアップロード（共有ドライブ対応）
+            media = MediaFileUpload(file_path, mimetype=mime_type, chunksize=chunk_size, resumable=True)
+            request = api.drive_service().files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id,name',
+                supportsAllDrives=True
+            )
+            resuming = session is not None
+            start_time = time.perf_counter()
+            file = None
+            try:
+                if resuming:
+                    # サーバー側の受信済み位置を問い合わせ、その位置から同じセッションで送信する
+                    logging.info(f"中断したアップロードを再開します: {session.get('file_name', file_name)}")
+                    request.resumable_uri = session['uri']
+                    request.resumable_progress, file = query_upload_status(api, request.http, session['uri'], total_bytes)
+                while file is None:
+                    # 各チャンクは受信済み位置から再送されるため、失敗時も再試行して問題ない
+                    status, file = api.call('drive', request.next_chunk)
+                    if session is None and session_path and session_key and request.resumable_uri:
+                        session = {'uri': request.resumable_uri, 'file_name': file_name, 'created_at': time.time()}
+                        save_upload_session(session_path, session_key, session)
+                    if status is not None and progress_callback:
+                        progress_callback(file_name, status.resumable_progress, total_bytes, time.perf_counter() - start_time)
+            except Exception as e:
+                if resuming and get_api_error_status(e) in (404, 410):
+                    # セッションの期限切れ・破棄の場合は最初からアップロードし直す
+                    logging.warning(f"再開用のセッションが無効になっているため最初からアップロードします: {str(e)}")
+                    save_upload_session(session_path, session_key, None)
+                    session = None
+                    continue
+                raise
+            break
+        
+        if progress_callback:
+            progress_callback(file_name, total_bytes, total_bytes, time.perf_counter() - start_time)
+        if session_path and session_key:
+            save_upload_session(session_path, session_key, None)
         
         file_id = file.get('id')
         file_name = file.get('name')
@@ -151,19 +1187,22 @@ def upload_file_to_drive(service, file_path, folder_id, file_name=None):
         return file_id
         
     except Exception as e:
+        if raise_not_found and get_api_error_status(e) == 404:
+            raise
         logging.error(f"ファイルのアップロード中にエラーが発生しました: {str(e)}")
         return None
 
-def upload_files_to_drive(creds, config):
-    """ログファイルとCSVファイルをGoogle Driveにアップロードする"""
+def upload_files_to_drive(api, config, snapshot=None):
+    """CSVファイルをGoogle Driveにアップロードする
+
+    snapshotを指定した場合は共有フォルダのCSVではなく、取り込み時のローカルコピーをアップロードする。
+    ログファイルはシートへの書き込みの完了後にupload_run_log_to_driveでアップロードする。
+    """
     drive_details = ""
     try:
         logging.info("Google Driveへのファイルアップロードを開始します")
         drive_details += "Google Driveへのファイルアップロードを開始\n"
         
-        # Google Drive APIサービスを構築
-        service = build('drive', 'v3', credentials=creds)
-        
         # 設定から値を取得
         drive_folder_id = config.get('drive_folder_id')
         csv_folder_name = config.get('csv_backup_folder_name', 'backup')
@@ -177,8 +1216,8 @@ def upload_files_to_drive(creds, config):
         drive_details += f"CSVフォルダ名: {csv_folder_name}\n"
         drive_details += f"CSVファイルパス: {csv_file_path}\n"
         
-        # csvフォルダを検索（既存フォルダが存在する前提）
-        csv_folder_id = find_existing_folder(service, drive_folder_id, csv_folder_name)
+        # csvフォルダを検索（既存フォルダが存在する前提、IDはローカルにキャッシュ）
+        csv_folder_id, folder_from_cache = resolve_drive_folder(config, api, drive_folder_id, csv_folder_name)
         if not csv_folder_id:
             error_msg = f"指定されたフォルダ '{csv_folder_name}' が見つかりません"
             logging.warning(error_msg)
@@ -191,20 +1230,71 @@ def upload_files_to_drive(creds, config):
         upload_success = True
         
         # CSVファイルをアップロード
-        if csv_file_path and os.path.exists(csv_file_path):
-            # タイムスタンプ付きのファイル名でアップロード
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            csv_file_name = f"test_{timestamp}.csv"
-            drive_details += f"アップロードファイル名: {csv_file_name}\n"
-            
-            csv_upload_result = upload_file_to_drive(service, csv_file_path, csv_folder_id, csv_file_name)
-            if not csv_upload_result:
-                upload_success = False
-                error_msg = "CSVファイルのアップロードに失敗しました"
-                logging.warning(error_msg)
-                drive_details += error_msg + "\n"
+        if snapshot or (csv_file_path and os.path.exists(csv_file_path)):
+            # 1回の読み取りでMD5の計算と（設定により）gzip圧縮を行う
+            compress = config.get('drive_backup_gzip', False)
+            if snapshot:
+                payload = prepare_backup_payload(snapshot['path'], compress, snapshot['md5'])
             else:
-                drive_details += "CSVファイルのアップロードが成功\n"
+                payload = prepare_backup_payload(csv_file_path, compress)
+            try:
+                drive_details += f"MD5: {payload['md5']}\n"
+                if compress:
+                    ratio = payload['upload_size'] / payload['source_size'] if payload['source_size'] else 0.0
+                    compress_msg = f"gzip圧縮: {payload['source_size']} → {payload['upload_size']} バイト (圧縮率 {ratio:.1%})"
+                    logging.info(compress_msg)
+                    drive_details += compress_msg + "\n"
+                
+                backup_state_path = get_state_path(config, "drive_backup_state.json")
+                if config.get('drive_backup_dedupe', True) and is_duplicate_backup(config, api, backup_state_path, csv_file_path, payload):
+                    logging.info("前回のバックアップと同一内容のため、CSVファイルのアップロードをスキップします")
+                    drive_details += "前回のバックアップと同一内容のため、アップロードをスキップ\n"
+                else:
+                    # タイムスタンプ付きのファイル名でアップロード
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    csv_file_name = f"test_{timestamp}.csv"
+                    mime_type = 'text/csv'
+                    if compress:
+                        csv_file_name += ".gz"
+                        mime_type = 'application/gzip'
+                    
+                    upload_options = {
+                        'mime_type': mime_type,
+                        'chunk_size': int(config.get('drive_upload_chunk_size', DEFAULT_DRIVE_UPLOAD_CHUNK_SIZE)),
+                        'session_path': get_state_path(config, "drive_upload_sessions.json")
+                    }
+                    # 中断したアップロードを再開する場合、ファイル名はセッション作成時の名前になる
+                    session = load_upload_session(upload_options['session_path'], f"{payload['md5']}/{csv_folder_id}")
+                    if session:
+                        csv_file_name = session.get('file_name', csv_file_name)
+                    drive_details += f"アップロードファイル名: {csv_file_name}\n"
+                    try:
+                        csv_upload_result = upload_file_to_drive(api, payload['path'], csv_folder_id, csv_file_name,
+                                                                 raise_not_found=folder_from_cache,
+                                                                 session_key=f"{payload['md5']}/{csv_folder_id}",
+                                                                 **upload_options)
+                    except Exception as e:
+                        # キャッシュしたフォルダが削除・移動された場合は1回だけ検索し直す
+                        logging.warning(f"キャッシュ済みのフォルダが見つからないため再検索します: {str(e)}")
+                        drive_details += "キャッシュ済みのフォルダが見つからないため再検索\n"
+                        csv_folder_id, _ = resolve_drive_folder(config, api, drive_folder_id, csv_folder_name, refresh=True)
+                        csv_upload_result = None
+                        if csv_folder_id:
+                            drive_details += f"CSVフォルダID: {csv_folder_id}\n"
+                            csv_upload_result = upload_file_to_drive(api, payload['path'], csv_folder_id, csv_file_name,
+                                                                     session_key=f"{payload['md5']}/{csv_folder_id}",
+                                                                     **upload_options)
+                    if not csv_upload_result:
+                        upload_success = False
+                        error_msg = "CSVファイルのアップロードに失敗しました"
+                        logging.warning(error_msg)
+                        drive_details += error_msg + "\n"
+                    else:
+                        record_backup_state(backup_state_path, csv_file_path, payload, csv_upload_result, csv_file_name)
+                        drive_details += "CSVファイルのアップロードが成功\n"
+            finally:
+                if payload['temp_path']:
+                    os.remove(payload['temp_path'])
         else:
             drive_details += "CSVファイルが存在しないため、アップロードをスキップ\n"
         
@@ -226,9 +1316,133 @@ def upload_files_to_drive(creds, config):
         drive_details += f"詳細なエラー情報: {traceback.format_exc()}\n"
         return False, drive_details
 
-def read_csv_data(csv_filename):
+def upload_run_log_to_drive(config, api, execution_id, sections=()):
+    """この実行のログをgzip圧縮してDriveのバックアップフォルダにアップロードし、(成功したか, ファイルのURL) を返す
+
+    アップロードするのはこの実行のログだけを書き込んだファイル（open_run_log）で、
+    sectionsの (見出し, 本文) はログの後に追記する。
+    """
+    if not config.get('log_file_upload', True) or api is None or not config.get('drive_folder_id'):
+        return False, ""
+    temp_path = None
+    try:
+        folder_name = config.get('log_backup_folder_name', config.get('csv_backup_folder_name', 'backup'))
+        folder_id, _ = resolve_drive_folder(config, api, config.get('drive_folder_id'), folder_name)
+        if not folder_id:
+            logging.warning(f"ログファイルのアップロード先フォルダ '{folder_name}' が見つかりません")
+            return False, ""
+        
+        metrics = current_metrics.get()
+        log_path = metrics.log_path if metrics is not None else None
+        if metrics is not None:
+            close_run_log(metrics)
+        with tempfile.NamedTemporaryFile(prefix='log_', suffix='.log.gz', delete=False) as temp:
+            temp_path = temp.name
+            with gzip.GzipFile(filename='', mode='wb', fileobj=temp) as gz:
+                if log_path and os.path.exists(log_path):
+                    with open(log_path, 'rb') as source:
+                        for chunk in iter(lambda: source.read(BACKUP_READ_CHUNK_SIZE), b''):
+                            gz.write(chunk)
+                for title, text in sections:
+                    if text:
+                        gz.write(f"\n{title}:\n{text}\n".encode('utf-8'))
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_id = upload_file_to_drive(api, temp_path, folder_id, f"log_{timestamp}_{execution_id}.log.gz",
+                                       mime_type='application/gzip', progress_callback=None)
+        if not file_id:
+            logging.warning("ログファイルのアップロードに失敗しました")
+            return False, ""
+        return True, f"https://drive.google.com/file/d/{file_id}/view"
+    except Exception as e:
+        logging.warning(f"ログファイルのアップロード中にエラーが発生しました: {str(e)}")
+        return False, ""
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def get_spool_path(config, csv_filename):
+    """取り込んだCSVのローカルコピーのパスを返す
+
+    同じCSVを読む複数のジョブが互いのコピーを置き換えないよう、ジョブごとに別のファイルにする。
+    """
+    job = current_job.get()
+    source_key = os.path.abspath(csv_filename) + (f"\x1f{job['name']}" if job else "")
+    source_hash = hashlib.blake2b(source_key.encode('utf-8'), digest_size=8).hexdigest()
+    return get_state_path(config, f"spool_{source_hash}.csv")
+
+def ingest_csv(config, csv_filename):
+    """共有フォルダのCSVを1回だけ読み取り、ローカルにコピーする
+
+    同じ読み取りの中でMD5・行数（改行数）の計算とエンコーディングの判定を行い、
+    シートへの書き込みとDriveへのバックアップはこのコピーを使用する（両者が同じ内容になる）。
+    取り込んだ内容の情報を辞書で返す。ファイルが無い場合・読み取りに失敗した場合はNone。
+    """
+    if not csv_filename or not os.path.exists(csv_filename):
+        logging.error(f"CSVファイル '{csv_filename}' が見つかりません")
+        return None
+    
+    encoding = config.get('csv_encoding', DEFAULT_CSV_ENCODING)
+    spool_path = get_spool_path(config, csv_filename)
+    # 書き込み途中のコピーは一意な一時ファイルに作成し、完了後に置き換える
+    tmp_fd, tmp_path = tempfile.mkstemp(prefix='spool_', suffix='.tmp', dir=os.path.dirname(spool_path))
+    md5 = hashlib.md5()
+    size = 0
+    line_count = 0
+    last_byte = b''
+    # 'auto'の場合はUTF-8として逐次デコードできるかを確認し、失敗した時点で確認をやめる
+    decoder = codecs.getincrementaldecoder('utf-8')() if encoding == 'auto' else None
+    is_utf8 = True
+    try:
+        start_time = time.perf_counter()
+        with os.fdopen(tmp_fd, 'wb') as spool, open(csv_filename, 'rb') as source:
+            for chunk in iter(lambda: source.read(BACKUP_READ_CHUNK_SIZE), b''):
+                spool.write(chunk)
+                md5.update(chunk)
+                if size == 0 and decoder and chunk.startswith(codecs.BOM_UTF8):
+                    encoding = 'utf-8-sig'
+                size += len(chunk)
+                line_count += chunk.count(b'\n')
+                last_byte = chunk[-1:]
+                if decoder and is_utf8:
+                    try:
+                        decoder.decode(chunk)
+                    except UnicodeDecodeError:
+                        is_utf8 = False
+        if decoder and is_utf8:
+            try:
+                decoder.decode(b'', final=True)
+            except UnicodeDecodeError:
+                is_utf8 = False
+        os.replace(tmp_path, spool_path)
+    except Exception as e:
+        logging.error(f"CSVファイルの取り込み中にエラーが発生しました: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    
+    if encoding == 'auto':
+        encoding = 'utf-8' if is_utf8 else CSV_FALLBACK_ENCODING
+    elif encoding == 'utf-8-sig' and not is_utf8:
+        encoding = CSV_FALLBACK_ENCODING
+    if last_byte and last_byte != b'\n':
+        line_count += 1  # 最終行に改行が無い場合
+    
+    elapsed = time.perf_counter() - start_time
+    logging.info(f"CSVファイル '{csv_filename}' を取り込みました: {size} バイト, {line_count} 行, "
+                 f"エンコーディング {encoding}, MD5 {md5.hexdigest()} ({elapsed:.2f}秒)")
+    return {
+        'source_path': csv_filename,
+        'path': spool_path,
+        'md5': md5.hexdigest(),
+        'size': size,
+        'line_count': line_count,
+        'encoding': encoding
+    }
+
+def read_csv_data(csv_filename, encoding='utf-8'):
     """CSVファイルを読み取ってデータを返す"""
-    csv_details = ""
+    csv_details = []
     try:
         # CSVファイルの存在確認
         if not os.path.exists(csv_filename):
@@ -236,9 +1450,9 @@ def read_csv_data(csv_filename):
             return None, None, "CSVファイルが見つかりません"
         
         logging.info(f"CSVファイル '{csv_filename}' の読み取りを開始します")
-        csv_details += f"ファイルパス: {csv_filename}\n"
+        csv_details.append(f"ファイルパス: {csv_filename}\n")
         
-        with open(csv_filename, 'r', encoding='utf-8') as file:
+        with open(csv_filename, 'r', encoding=encoding, newline='') as file:
             csv_reader = csv.reader(file)
             
             # ヘッダー行を読み取り
@@ -247,8 +1461,8 @@ def read_csv_data(csv_filename):
             logging.info(f"ヘッダー: {header}")
             logging.info(f"カラム数: {len(header)}")
             
-            csv_details += f"ヘッダー: {header[:5]}...\n"  # 最初の5列のみ表示
-            csv_details += f"カラム数: {len(header)}\n"
+            csv_details.append(f"ヘッダー: {header[:5]}...\n")  # 最初の5列のみ表示
+            csv_details.append(f"カラム数: {len(header)}\n")
             
             # データ行を読み取り
             logging.info("=== CSVデータ ===")
@@ -257,21 +1471,21 @@ def read_csv_data(csv_filename):
             for row_num, row in enumerate(csv_reader, start=2):  # 2行目から開始
                 row_count += 1
                 data_rows.append(row)
-                logging.info(f"行 {row_num}: {row[:3]}...")  # 最初の3列のみ表示
-                
-                csv_details += f"行 {row_num}: {row[:3]}...\n"
+                if should_log_row(row_count):
+                    logging.info(f"行 {row_num}: {row[:3]}...")  # 最初の3列のみ表示
+                    csv_details.append(f"行 {row_num}: {row[:3]}...\n")
             
             logging.info(f"=== 読み取り完了 ===")
             logging.info(f"総行数: {row_count + 1} (ヘッダー含む)")
             logging.info(f"データ行数: {row_count}")
             
-            csv_details += f"総行数: {row_count + 1} (ヘッダー含む)\n"
-            csv_details += f"データ行数: {row_count}\n"
+            csv_details.append(f"総行数: {row_count + 1} (ヘッダー含む)\n")
+            csv_details.append(f"データ行数: {row_count}\n")
             
-            return header, data_rows, csv_details
+            return header, data_rows, "".join(csv_details)
             
     except UnicodeDecodeError:
-        error_msg = "ファイルのエンコーディングエラーが発生しました。UTF-8でエンコードされているか確認してください。"
+        error_msg = f"ファイルのエンコーディングエラーが発生しました。{encoding}でエンコードされているか確認してください。"
         logging.error(error_msg)
         return None, None, error_msg
     except Exception as e:
@@ -279,293 +1493,1397 @@ def read_csv_data(csv_filename):
         logging.error(error_msg)
         return None, None, error_msg
 
-def write_to_google_sheets(header, data_rows, config):
-    """CSVデータをGoogleスプレッドシートに書き込む"""
+def open_csv_stream(csv_filename, batch_size=DEFAULT_CSV_BATCH_SIZE, encoding='utf-8'):
+    """CSVファイルをヘッダーと行バッチのジェネレーターとして開く
+
+    (ヘッダー, 行バッチのイテレーター, 統計情報) を返す。行は読み進めた分だけメモリに保持され、
+    統計情報（行数・先頭行のサンプル・エラー）はイテレーターの消費に合わせて更新される。
+    データ行が1行もない場合、または読み取りに失敗した場合、行バッチのイテレーターはNoneになる。
+    """
+    stats = {
+        'file_path': csv_filename,
+        'header': None,
+        'row_count': 0,
+        'sample_rows': [],
+        'error': None
+    }
     try:
-        logging.info("Googleスプレッドシートへの書き込みを開始します")
-        sheet_details = "Googleスプレッドシートへの書き込みを開始\n"
-        
-        # 設定から値を取得
-        creds_file = config.get('creds_file', 'creds.json')
-        spreadsheet_id = config.get('spreadsheet_id')
-        sheet_name = config.get('sheet_name', 'sheet1')
-        
-        sheet_details += f"スプレッドシートID: {spreadsheet_id}\n"
-        sheet_details += f"シート名: {sheet_name}\n"
-        
-        # 認証情報ファイルの確認
-        if not os.path.exists(creds_file):
-            error_msg = f"認証情報ファイル '{creds_file}' が見つかりません"
-            logging.error(error_msg)
-            return False, sheet_details
-        
-        # 認証情報の読み込み
-        creds = Credentials.from_service_account_file(creds_file, scopes=SCOPES)
-        client = gspread.authorize(creds)
-        
-        # スプレッドシートを開く
-        spreadsheet = client.open_by_key(spreadsheet_id)
-        worksheet = spreadsheet.worksheet(sheet_name)
-        
-        logging.info(f"スプレッドシート '{spreadsheet.title}' のシート '{sheet_name}' にアクセスしました")
-        sheet_details += f"スプレッドシート名: {spreadsheet.title}\n"
-        sheet_details += f"アクセスしたシート: {sheet_name}\n"
-        
-        # 既存のデータをクリア
-        worksheet.clear()
-        logging.info("既存のデータをクリアしました")
-        sheet_details += "既存のデータをクリア\n"
-        
-        # ヘッダー行を書き込み
-        worksheet.append_row(header)
-        logging.info("ヘッダー行を書き込みました")
-        sheet_details += f"ヘッダー行を書き込み: {header}\n"
-        
-        # データ行を書き込み
-        for i, row in enumerate(data_rows, start=2):
-            worksheet.append_row(row)
-            logging.info(f"データ行 {i} を書き込みました: {row[:3]}...")  # 最初の3列のみ表示
-            sheet_details += f"データ行 {i}: {row[:3]}...\n"
-        
-        logging.info(f"合計 {len(data_rows)} 行のデータを書き込みました")
-        logging.info("Googleスプレッドシートへの書き込みが完了しました")
-        sheet_details += f"合計 {len(data_rows)} 行のデータを書き込み完了\n"
-        
-        return True, sheet_details
+        # CSVファイルの存在確認
+        if not os.path.exists(csv_filename):
+            logging.error(f"CSVファイル '{csv_filename}' が見つかりません")
+            stats['error'] = "CSVファイルが見つかりません"
+            return None, None, stats
         
-    except FileNotFoundError:
-        error_msg = "認証情報ファイルが見つかりません"
-        logging.error(error_msg)
-        return False, sheet_details
+        logging.info(f"CSVファイル '{csv_filename}' のストリーミング読み取りを開始します")
+        file = open(csv_filename, 'r', encoding=encoding, newline='')
     except Exception as e:
-        error_msg = f"Googleスプレッドシートへの書き込み中にエラーが発生しました: {str(e)}"
-        logging.error(error_msg)
-        import traceback
-        logging.error(f"詳細なエラー情報: {traceback.format_exc()}")
-        return False, sheet_details
-
-def upload_to_google_drive(config):
-    """Google Driveにファイルをアップロードする"""
+        stats['error'] = f"CSVファイルの読み取り中にエラーが発生しました: {str(e)}"
+        logging.error(stats['error'])
+        return None, None, stats
+    
+    def generate_batches():
+        try:
+            batch = []
+            for row in csv_reader:
+                stats['row_count'] += 1
+                if len(stats['sample_rows']) < CSV_SAMPLE_ROWS:
+                    stats['sample_rows'].append(row[:3])  # 最初の3列のみ保持
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            logging.info(f"CSVファイルの読み取りが完了しました（データ行数: {stats['row_count']}）")
+        except UnicodeDecodeError:
+            stats['error'] = f"ファイルのエンコーディングエラーが発生しました。{encoding}でエンコードされているか確認してください。"
+            logging.error(stats['error'])
+            raise
+        except Exception as e:
+            stats['error'] = f"CSVファイルの読み取り中にエラーが発生しました: {str(e)}"
+            logging.error(stats['error'])
+            raise
+        finally:
+            file.close()
+    
     try:
-        # 設定から値を取得
-        creds_file = config.get('creds_file', 'creds.json')
-        
-        # 認証情報ファイルの確認
-        if not os.path.exists(creds_file):
-            logging.warning(f"認証情報ファイル '{creds_file}' が見つかりません")
-            return False, ""
-        
-        # 認証情報の読み込み
-        creds = Credentials.from_service_account_file(creds_file, scopes=SCOPES)
-        
-        # Google Driveにファイルをアップロード
-        drive_success, drive_details = upload_files_to_drive(creds, config)
-        if drive_success:
-            logging.info("Google Driveへのファイルアップロードが完了しました")
-            drive_details += "Google Driveへのファイルアップロードが完了\n"
-        else:
-            logging.warning("Google Driveへのファイルアップロードに失敗しました")
-            drive_details += "Google Driveへのファイルアップロードに失敗\n"
-        
-        return drive_success, drive_details
+        csv_reader = csv.reader(file)
+        header = next(csv_reader)
+        stats['header'] = header
+        logging.info(f"ヘッダー: {header}")
+        logging.info(f"カラム数: {len(header)}")
+        
+        # 最初のバッチだけ先読みして、データ行の有無を確認する
+        batches = generate_batches()
+        first_batch = next(batches, None)
+        if first_batch is None:
+            return header, None, stats
+        return header, itertools.chain([first_batch], batches), stats
         
     except Exception as e:
-        error_msg = f"Google Driveへのファイルアップロード中にエラーが発生しました: {str(e)}"
-        logging.warning(error_msg)
-        import traceback
-        logging.warning(f"詳細なエラー情報: {traceback.format_exc()}")
-        drive_details = error_msg + "\n" + f"詳細なエラー情報: {traceback.format_exc()}\n"
-        return False, drive_details
+        file.close()
+        if not stats['error']:
+            if isinstance(e, UnicodeDecodeError):
+                stats['error'] = f"ファイルのエンコーディングエラーが発生しました。{encoding}でエンコードされているか確認してください。"
+            else:
+                stats['error'] = f"CSVファイルの読み取り中にエラーが発生しました: {str(e)}"
+            logging.error(stats['error'])
+        return None, None, stats
 
-def log_to_spreadsheet(config, execution_id, status, message="", row_count="", heading_link="", warning=""):
-    """実行ログをスプレッドシートに記録する"""
+def scan_to_record_end(file, pos, quotes):
+    """posから読み進め、引用符の外にある最初の改行の直後の位置を返す
+
+    (位置, 引用符の累計数) を返す。ファイル末尾まで見つからない場合、位置はNone。
+    UTF-8・CP932とも2バイト目以降に '"' や改行のバイトは現れないため、バイト単位で判定できる。
+    """
+    file.seek(pos)
+    while True:
+        data = file.read(BACKUP_READ_CHUNK_SIZE)
+        if not data:
+            return None, quotes
+        offset = 0
+        while True:
+            newline = data.find(b'\n', offset)
+            if newline == -1:
+                quotes += data.count(b'"', offset)
+                break
+            quotes += data.count(b'"', offset, newline)
+            offset = newline + 1
+            if quotes % 2 == 0:
+                return pos + offset, quotes
+        pos += len(data)
+
+def find_record_boundaries(csv_filename, start, end, parts):
+    """ファイルの[start, end)を、引用符内の改行で分断しないレコード境界でおおよそparts等分する"""
+    boundaries = [start]
+    with open(csv_filename, 'rb') as file:
+        pos, quotes = start, 0
+        for i in range(1, parts):
+            target = start + (end - start) * i // parts
+            if target <= boundaries[-1]:
+                continue
+            # 目標位置までの引用符を数えて、引用符の内側かどうかを判定できるようにする
+            file.seek(pos)
+            while pos < target:
+                data = file.read(min(BACKUP_READ_CHUNK_SIZE, target - pos))
+                if not data:
+                    break
+                quotes += data.count(b'"')
+                pos += len(data)
+            boundary, quotes = scan_to_record_end(file, pos, quotes)
+            if boundary is None or boundary >= end:
+                break
+            boundaries.append(boundary)
+            pos = boundary
+    boundaries.append(end)
+    return boundaries
+
+def parse_csv_range(csv_filename, start, end, encoding, header, config):
+    """ファイルの[start, end)のレコードを解析して行バッチを返す（プロセスプールのワーカーで実行）"""
+    with open(csv_filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    rows = list(csv.reader(io.StringIO(data.decode(encoding), newline='')))
+    return to_columnar_batch(header, rows, config)
+
+def open_csv_parallel(csv_filename, config, encoding='utf-8'):
+    """CSVファイルをレコード境界で分割し、プロセスプールで並列に解析する
+
+    open_csv_streamと同じく (ヘッダー, 行バッチのイテレーター, 統計情報) を返す。
+    行バッチは分割した範囲ごとに元の順序で返される（型付きの列形式への変換もワーカーで行う）。
+    """
+    stats = {
+        'file_path': csv_filename,
+        'header': None,
+        'row_count': 0,
+        'sample_rows': [],
+        'error': None
+    }
+    try:
+        size = os.path.getsize(csv_filename)
+        with open(csv_filename, 'rb') as file:
+            header_end, _ = scan_to_record_end(file, 0, 0)
+            file.seek(0)
+            header_bytes = file.read(header_end if header_end is not None else size)
+        header = next(csv.reader(io.StringIO(header_bytes.decode(encoding), newline='')))
+        stats['header'] = header
+        logging.info(f"ヘッダー: {header}")
+        logging.info(f"カラム数: {len(header)}")
+        if header_end is None or header_end >= size:
+            return header, None, stats
+        
+        workers = int(config.get('parse_workers', DEFAULT_PARSE_WORKERS)) or os.cpu_count() or 1
+        parts = max(workers * 2, -(-(size - header_end) // PARALLEL_PARSE_RANGE_BYTES))
+        boundaries = find_record_boundaries(csv_filename, header_end, size, parts)
+        # BOMはヘッダーの前にしか無いため、データ部分はBOMなしとしてデコードする
+        range_encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding
+        logging.info(f"CSVファイル '{csv_filename}' を {len(boundaries) - 1} 個の範囲に分割し、{workers} プロセスで並列に解析します")
+    except Exception as e:
+        stats['error'] = f"CSVファイルの読み取り中にエラーが発生しました: {str(e)}"
+        logging.error(stats['error'])
+        return None, None, stats
+    
+    def generate_batches():
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                ranges = list(zip(boundaries, boundaries[1:]))
+                count = len(ranges)
+                # mapは結果を元の順序で返す
+                for batch in executor.map(parse_csv_range, [csv_filename] * count, [s for s, _ in ranges],
+                                          [e for _, e in ranges], [range_encoding] * count,
+                                          [header] * count, [config] * count):
+                    if not len(batch):
+                        continue
+                    stats['row_count'] += len(batch)
+                    for row in itertools.islice(batch, CSV_SAMPLE_ROWS - len(stats['sample_rows'])):
+                        stats['sample_rows'].append(row[:3])  # 最初の3列のみ保持
+                    yield batch
+            logging.info(f"CSVファイルの並列解析が完了しました（データ行数: {stats['row_count']}）")
+        except UnicodeDecodeError:
+            stats['error'] = f"ファイルのエンコーディングエラーが発生しました。{encoding}でエンコードされているか確認してください。"
+            logging.error(stats['error'])
+            raise
+        except Exception as e:
+            stats['error'] = f"CSVファイルの読み取り中にエラーが発生しました: {str(e)}"
+            logging.error(stats['error'])
+            raise
+    
+    return header, generate_batches(), stats
+
+def should_parse_in_parallel(config, csv_filename):
+    """CSVファイルのサイズと設定から並列解析を行うかを判定する"""
+    if int(config.get('parse_workers', DEFAULT_PARSE_WORKERS)) == 1:
+        return False
+    min_bytes = int(config.get('parallel_parse_min_bytes', DEFAULT_PARALLEL_PARSE_MIN_BYTES))
     try:
+        return os.path.getsize(csv_filename) >= min_bytes
+    except OSError:
+        return False
+
+def format_csv_stream_summary(stats):
+    """ストリーミング読み取りの統計情報を固定サイズの詳細テキストにする"""
+    details = [f"ファイルパス: {stats['file_path']}\n"]
+    header = stats.get('header')
+    if header:
+        details.append(f"ヘッダー: {header[:5]}...\n")  # 最初の5列のみ表示
+        details.append(f"カラム数: {len(header)}\n")
+    for i, row in enumerate(stats['sample_rows'], start=2):
+        details.append(f"行 {i}: {row}...\n")
+    details.append(f"総行数: {stats['row_count'] + 1} (ヘッダー含む)\n")
+    details.append(f"データ行数: {stats['row_count']}\n")
+    if stats.get('error'):
+        details.append(f"エラー: {stats['error']}\n")
+    return "".join(details)
+
+def build_column_schema(header, config):
+    """ヘッダーと設定から列ごとの型（int/float/date/str）のリストを作成する"""
+    column_types = dict(DEFAULT_COLUMN_TYPES)
+    column_types.update(config.get('column_types') or {})
+    return [column_types.get(name, 'str') for name in header]
+
+def parse_date_serial(value, date_formats):
+    """日付の文字列をスプレッドシートのシリアル値に変換する（解釈できない場合はValueError）"""
+    for date_format in date_formats:
+        try:
+            return (datetime.strptime(value, date_format) - SHEETS_EPOCH).days
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+def parse_int_value(value):
+    """整数の文字列を変換する（int()が受け付ける桁区切りの_はValueError）"""
+    if '_' in value:
+        raise ValueError(value)
+    return int(value)
+
+def parse_float_value(value):
+    """小数の文字列を変換する（_を含む値・nan・infなどJSONで送れない値はValueError）"""
+    if '_' in value:
+        raise ValueError(value)
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+class ColumnarBatch:
+    """行バッチを列ごとの型付き配列として保持する
+
+    数値・日付の列はarrayに、文字列の列は重複する値を共有する（intern）リストに格納する。
+    変換できなかった値（空欄を含む）は元の文字列を例外として列ごとに保持し、
+    列数がヘッダーと異なる行は変換せずにそのまま保持する。
+    行として読み出すと数値・日付（シリアル値）はint/floatとして返るため、シートに型付きで書き込まれる。
+    """
+
+    def __init__(self, header, rows, schema, date_formats=DEFAULT_DATE_FORMATS):
+        width = len(header)
+        self.length = len(rows)
+        self.ragged = {index: row for index, row in enumerate(rows) if len(row) != width}
+        self.columns = []
+        self.exceptions = []
+        for col, column_type in enumerate(schema):
+            values = [row[col] if len(row) == width else '' for row in rows]
+            column, exceptions = self._convert_column(values, column_type, date_formats)
+            self.columns.append(column)
+            self.exceptions.append(exceptions)
+
+    @staticmethod
+    def _convert_column(values, column_type, date_formats):
+        """1列分の値をまとめて変換し、(列の配列, 変換できなかった値の辞書) を返す"""
+        if column_type not in COLUMN_TYPE_CODES:
+            return [sys.intern(value) for value in values], {}
+        type_code = COLUMN_TYPE_CODES[column_type]
+        if column_type != 'date':
+            try:
+                # 全値が変換できる場合は列単位で一括変換する（区切りの_・nan・infを含む場合は1件ずつ判定する）
+                if '_' not in "".join(values):
+                    column = array(type_code, map(int if column_type == 'int' else float, values))
+                    if column_type == 'int' or all(map(math.isfinite, column)):
+                        return column, {}
+            except (ValueError, OverflowError):
+                pass
+        
+        converter = parse_int_value if column_type == 'int' else parse_float_value
+        serial_cache = {}  # 日付は同じ値が繰り返し現れるため解釈結果を再利用する
+        column = array(type_code)
+        exceptions = {}
+        for index, value in enumerate(values):
+            try:
+                if column_type == 'date':
+                    if value not in serial_cache:
+                        serial_cache[value] = parse_date_serial(value, date_formats)
+                    column.append(serial_cache[value])
+                else:
+                    column.append(converter(value))
+            except (ValueError, OverflowError):
+                column.append(0)
+                exceptions[index] = value
+        return column, exceptions
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        columns = []
+        for column, exceptions in zip(self.columns, self.exceptions):
+            values = column.tolist() if isinstance(column, array) else column
+            for index, value in exceptions.items():
+                values[index] = value
+            columns.append(values)
+        for index, row in enumerate(zip(*columns)):
+            yield self.ragged.get(index, list(row))
+
+def to_columnar_batch(header, rows, config):
+    """設定に従って行バッチを型付きの列形式に変換する（typed_columnsが無効な場合はそのまま返す）"""
+    if not config.get('typed_columns', True):
+        return rows
+    date_formats = config.get('date_formats', DEFAULT_DATE_FORMATS)
+    return ColumnarBatch(header, rows, build_column_schema(header, config), date_formats)
+
+def apply_column_formats(api, spreadsheet, worksheet, header, config):
+    """日付列にシリアル値を日付として表示する書式を設定する"""
+    if not config.get('typed_columns', True):
+        return ""
+    pattern = config.get('date_number_format', DEFAULT_DATE_NUMBER_FORMAT)
+    requests = [{
+        'repeatCell': {
+            'range': {'sheetId': worksheet.id, 'startRowIndex': 1, 'startColumnIndex': col, 'endColumnIndex': col + 1},
+            'cell': {'userEnteredFormat': {'numberFormat': {'type': 'DATE', 'pattern': pattern}}},
+            'fields': 'userEnteredFormat.numberFormat'
+        }
+    } for col, column_type in enumerate(build_column_schema(header, config)) if column_type == 'date']
+    if not requests:
+        return ""
+    try:
+        api.call('sheets_write', spreadsheet.batch_update, {'requests': requests})
+        logging.info(f"日付列 {len(requests)} 列に表示形式 '{pattern}' を設定しました")
+        return f"日付列の表示形式を設定: {len(requests)} 列\n"
+    except Exception as e:
+        logging.warning(f"日付列の表示形式の設定中にエラーが発生しました: {str(e)}")
+        return f"日付列の表示形式の設定に失敗: {str(e)}\n"
+
+def iter_row_chunks(rows, chunk_size, max_chunk_bytes, cell_overhead=3):
+    """行を行数とペイロードサイズの上限で区切ったチャンクに分割する
+
+    cell_overheadは1セルあたりのJSONの引用符・区切り文字などの概算バイト数。
+    """
+    chunk = []
+    chunk_bytes = 0
+    for row in rows:
+        # JSONの引用符・区切り文字分を含めたおおよそのサイズ
+        row_bytes = sum(len(str(value).encode('utf-8')) + cell_overhead for value in row) + 2
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + row_bytes > max_chunk_bytes):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+    if chunk:
+        yield chunk
+
+def ensure_grid_size(api, worksheet, rows, cols):
+    """書き込み先の範囲がシートのグリッドに収まるようにサイズを拡張する"""
+    new_rows = max(worksheet.row_count, rows)
+    new_cols = max(worksheet.col_count, cols)
+    if new_rows != worksheet.row_count or new_cols != worksheet.col_count:
+        api.call('sheets_write', worksheet.resize, rows=new_rows, cols=new_cols)
+        logging.info(f"シートのサイズを拡張しました: {new_rows}行 x {new_cols}列")
+
+def write_rows_batched(api, worksheet, header, data_rows, chunk_size, max_chunk_bytes,
+                       journal_path=None, journal_key=None, journal=None):
+    """シートの内容をヘッダーとデータ行で置き換える
+
+    最初のspreadsheets.batchUpdateでグリッドを書き込む行数ちょうどに変更（列数は足りない場合のみ増やし、
+    データより右の列はそのまま残す）して先頭のチャンクを書き込み、以降のチャンクはデータの列数まで埋めた行を
+    values.updateで上書きする。事前のクリアが不要なため書き込み中にシートが空になることはない。
+    全行が先頭のチャンクに収まる場合は1回のリクエストで置き換わるが、複数のチャンクに分かれる場合は
+    書き込みが終わるまで新しい行と前回の行が混在して見える。
+    ジャーナルを指定した場合はチャンクごとに書き込み済みの行数を記録し、記録済みの行の続きから書き込む。
+    """
+    from gspread.utils import rowcol_to_a1
+    details = []
+    rows = [header] + list(data_rows)
+    col_count = max(len(row) for row in rows)
+
+    start_row = 0
+    if journal and journal['written_rows'] > 0:
+        # ヘッダーと書き込み済みの行を飛ばす（グリッドのサイズ変更は冪等なので再度送る）
+        start_row = min(journal['written_rows'] + 1, len(rows))
+        details.append(f"前回中断した書き込みを {start_row + 1} 行目から再開\n")
+    remaining = rows[start_row:]
+
+    def chunk_written(chunk):
+        nonlocal start_row
+        end_row = start_row + len(chunk)
+        range_name = f"A{start_row + 1}:{rowcol_to_a1(end_row, col_count)}"
+        logging.info(f"範囲 {range_name} に {len(chunk)} 行を書き込みました")
+        details.append(f"範囲 {range_name}: {len(chunk)} 行\n")
+        start_row = end_row
+        if journal is not None:
+            journal['written_rows'] = end_row - 1
+            save_write_journal(journal_path, journal_key, journal)
+
+    # グリッドのサイズ変更と先頭のチャンク（CellData形式のため1セルあたりの見積もりを大きくする）を1回で送る
+    first_chunk = next(iter_row_chunks(remaining, chunk_size, max_chunk_bytes, CELL_DATA_OVERHEAD_BYTES), [])
+    # 列は減らさない（利用者がデータの右に追加した列を削除しない）
+    grid_col_count = max(worksheet.col_count, col_count)
+    requests = [{
+        'updateSheetProperties': {
+            'properties': {'sheetId': worksheet.id, 'gridProperties': {'rowCount': len(rows), 'columnCount': grid_col_count}},
+            'fields': 'gridProperties(rowCount,columnCount)'
+        }
+    }]
+    if first_chunk:
+        # 範囲内で値の無いセル（短い行の残りの列）はクリアされる
+        requests.append({
+            'updateCells': {
+                'range': {'sheetId': worksheet.id, 'startRowIndex': start_row, 'endRowIndex': start_row + len(first_chunk),
+                          'startColumnIndex': 0, 'endColumnIndex': col_count},
+                'rows': [to_row_data(row) for row in first_chunk],
+                'fields': 'userEnteredValue'
+            }
+        })
+    api.call('sheets_write', worksheet.spreadsheet.batch_update, {'requests': requests})
+    request_count = 1
+    logging.info(f"シートのサイズを {len(rows)}行 x {grid_col_count}列 に変更しました")
+    details.append(f"シートのサイズ: {len(rows)}行 x {grid_col_count}列\n")
+    if first_chunk:
+        chunk_written(first_chunk)
+
+    # 残りのチャンクはvalues.updateで書き込む。短い行は空文字で埋め、前の内容が残らないようにする
+    for chunk in iter_row_chunks(remaining[len(first_chunk):], chunk_size, max_chunk_bytes):
+        values = [list(row) + [''] * (col_count - len(row)) for row in chunk]
+        range_name = f"A{start_row + 1}:{rowcol_to_a1(start_row + len(chunk), col_count)}"
+        api.call('sheets_write', worksheet.update, values, range_name, value_input_option='RAW')
+        request_count += 1
+        chunk_written(chunk)
+
+    if journal is not None:
+        # すべて書き込んだためジャーナルは不要
+        save_write_journal(journal_path, journal_key, None)
+    details.append(f"書き込みリクエスト数: {request_count}\n")
+    return "".join(details)
+
+def write_rows_streaming(api, worksheet, header, row_batches, chunk_size, max_chunk_bytes,
+                         journal_path=None, journal_key=None, journal=None):
+    """行バッチのイテレーターを読み進めながらA1範囲単位のチャンクで書き込む
+
+    行全体をメモリに載せないため、グリッドは書き込み位置に合わせて先行して拡張する。
+    ジャーナルを指定した場合はチャンクごとに書き込み済みの行数を記録し、記録済みの行は読み飛ばして続きから書き込む。
+    (詳細テキスト, 書き込んだデータ行数) を返す。
+    """
+    from gspread.utils import rowcol_to_a1
+    col_count = len(header)
+    resume_rows = journal['written_rows'] if journal else 0
+    if journal is not None:
+        # 再開時も最初の書き込み前のグリッドの行数を基準に余分な行を削除する
+        journal.setdefault('original_row_count', worksheet.row_count)
+    original_row_count = journal['original_row_count'] if journal else worksheet.row_count
+    rows = itertools.chain.from_iterable(row_batches)
+    request_count = 0
+    if resume_rows:
+        rows = itertools.islice(rows, resume_rows, None)
+    else:
+        ensure_grid_size(api, worksheet, 1, col_count)
+        api.call('sheets_write', worksheet.update, [header], f"A1:{rowcol_to_a1(1, col_count)}", value_input_option='RAW')
+        request_count += 1
+
+    start_row = resume_rows + 2
+    for chunk in iter_row_chunks(rows, chunk_size, max_chunk_bytes):
+        end_row = start_row + len(chunk) - 1
+        chunk_cols = max(len(row) for row in chunk)
+        if end_row > worksheet.row_count or chunk_cols > worksheet.col_count:
+            # 拡張リクエストの回数を抑えるため、数チャンク分を先に確保する
+            ensure_grid_size(api, worksheet, end_row + chunk_size * 4, chunk_cols)
+        range_name = f"A{start_row}:{rowcol_to_a1(end_row, chunk_cols)}"
+        api.call('sheets_write', worksheet.update, chunk, range_name, value_input_option='RAW')
+        request_count += 1
+        logging.info(f"範囲 {range_name} に {len(chunk)} 行を書き込みました")
+        start_row = end_row + 1
+        if journal is not None:
+            journal['written_rows'] = end_row - 1
+            save_write_journal(journal_path, journal_key, journal)
+
+    # 先行して確保した余分な行を削除
+    trimmed_row_count = max(original_row_count, start_row - 1)
+    if worksheet.row_count > trimmed_row_count:
+        api.call('sheets_write', worksheet.resize, rows=trimmed_row_count)
+        request_count += 1
+
+    if journal is not None:
+        save_write_journal(journal_path, journal_key, None)
+    written_rows = start_row - 2
+    details = f"書き込みリクエスト数: {request_count}\n"
+    if resume_rows:
+        details = f"前回中断した書き込みを {resume_rows + 2} 行目から再開\n" + details
+    return details, written_rows
+
+def write_rows_per_row(api, worksheet, header, data_rows):
+    """ヘッダーとデータ行を1行ずつappend_rowで書き込む（フォールバック用）"""
+    details = []
+
+    # ヘッダー行を書き込み
+    api.call('sheets_write', worksheet.append_row, header, idempotent=False)
+    logging.info("ヘッダー行を書き込みました")
+    details.append(f"ヘッダー行を書き込み: {header}\n")
+
+    # データ行を書き込み
+    for i, row in enumerate(data_rows, start=2):
+        api.call('sheets_write', worksheet.append_row, row, idempotent=False)
+        if should_log_row(i - 1):
+            logging.info(f"データ行 {i} を書き込みました: {row[:3]}...")  # 最初の3列のみ表示
+            details.append(f"データ行 {i}: {row[:3]}...\n")
+
+    return "".join(details)
+
+# 複数スレッドから読み書きされるローカル状態ファイルの排他制御
+state_lock = threading.RLock()
+
+def get_state_path(config, file_name):
+    """ローカル状態ファイルのパスを返す（ディレクトリが無ければ作成）"""
+    state_dir = config.get('state_dir', DEFAULT_STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, file_name)
+
+def load_json_state(path):
+    """ローカル状態ファイル（JSON）を読み込む。存在しない・壊れている場合はNone"""
+    try:
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.warning(f"状態ファイル '{path}' の読み込みに失敗しました: {str(e)}")
+        return None
+
+def save_json_state(path, state):
+    """ローカル状態ファイル（JSON）を一時ファイル経由で書き込む"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def prepare_write_journal(config, header, source_md5, mode):
+    """シートへの書き込みの途中経過を記録するジャーナルを準備する
+
+    前回の書き込みが同じCSV（MD5）・同じ列の設定・同じ書き込み方法で途中まで成功していれば、
+    その続きから書き込むためのジャーナルを返す。(状態ファイルのパス, キー, ジャーナル) を返し、
+    無効な場合はすべてNone。ジャーナルのwritten_rowsは書き込みが確認できたデータ行数。
+    """
+    if not config.get('sheet_write_journal', True) or not source_md5:
+        return None, None, None
+    journal_path = get_state_path(config, WRITE_JOURNAL_FILE_NAME)
+    journal_key = f"{config.get('spreadsheet_id')}/{config.get('sheet_name', 'sheet1')}"
+    fingerprint = hashlib.md5(json.dumps({
+        'header': header,
+        'schema': build_column_schema(header, config),
+        'typed_columns': config.get('typed_columns', True),
+        'date_formats': config.get('date_formats', DEFAULT_DATE_FORMATS)
+    }, ensure_ascii=False).encode('utf-8')).hexdigest()
+    with state_lock:
+        previous = (load_json_state(journal_path) or {}).get(journal_key)
+    if (previous and previous.get('source_md5') == source_md5 and previous.get('fingerprint') == fingerprint
+            and previous.get('mode') == mode and previous.get('written_rows', 0) > 0):
+        logging.info(f"前回中断した書き込みを {previous['written_rows'] + 2} 行目から再開します")
+        return journal_path, journal_key, previous
+    if previous:
+        logging.info("前回中断した書き込みとCSVまたは設定が異なるため最初から書き込みます")
+    return journal_path, journal_key, {'source_md5': source_md5, 'fingerprint': fingerprint, 'mode': mode, 'written_rows': 0}
+
+def save_write_journal(journal_path, journal_key, journal):
+    """書き込みのジャーナルを保存する（Noneの場合は削除）"""
+    with state_lock:
+        journals = load_json_state(journal_path) or {}
+        if journal is None:
+            journals.pop(journal_key, None)
+        else:
+            journal['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            journals[journal_key] = journal
+        save_json_state(journal_path, journals)
+
+def row_hash(row):
+    """行の内容からハッシュ値を計算する"""
+    return hashlib.blake2b('\x1f'.join(map(str, row)).encode('utf-8'), digest_size=8).hexdigest()
+
+def get_snapshot_path(config):
+    """差分同期用スナップショットのパスを返す"""
+    spreadsheet_id = config.get('spreadsheet_id')
+    sheet_name = config.get('sheet_name', 'sheet1')
+    target_hash = hashlib.blake2b(f"{spreadsheet_id}/{sheet_name}".encode('utf-8'), digest_size=8).hexdigest()
+    return get_state_path(config, f"sheet_snapshot_{target_hash}.json")
+
+def build_sheet_snapshot(config, header, key_rows):
+    """差分同期用スナップショットを作成する（key_rowsはシートの行順の[キー, ハッシュ]）"""
+    return {
+        'spreadsheet_id': config.get('spreadsheet_id'),
+        'sheet_name': config.get('sheet_name', 'sheet1'),
+        'header': header,
+        'rows': key_rows
+    }
+
+def snapshot_rows_from_data(data_rows, key_indexes):
+    """データ行からスナップショット用の[キー, ハッシュ]リストを作成する"""
+    return [['\x1f'.join(str(row[i]) if i < len(row) else '' for i in key_indexes), row_hash(row)] for row in data_rows]
+
+def to_cell_data(value):
+    """値をbatchUpdateのCellData形式に変換する（数値は数値として書き込む）"""
+    if value == '':
+        return {}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': value}}
+
+def to_row_data(row):
+    """行をbatchUpdateのRowData形式に変換する"""
+    return {'values': [to_cell_data(value) for value in row]}
+
+def group_contiguous(indexes):
+    """昇順のインデックス列を連続区間 (開始, 終了+1) のリストにまとめる"""
+    ranges = []
+    for index in indexes:
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return ranges
+
+def plan_sheet_diff(sheet_id, header, data_rows, snapshot, key_columns):
+    """前回のスナップショットとの差分から1回分のbatchUpdateリクエストを作成する
+
+    差分同期できない場合（スナップショットなし・ヘッダー変更・キー重複など）はNoneを返す。
+    """
+    if not snapshot or snapshot.get('header') != header:
+        return None
+    missing_keys = [column for column in key_columns if column not in header]
+    if missing_keys:
+        logging.warning(f"キー列 {missing_keys} がヘッダーに存在しないため差分同期できません")
+        return None
+    key_indexes = [header.index(column) for column in key_columns]
+
+    old_rows = snapshot.get('rows', [])
+    old_positions = {key: index for index, (key, _) in enumerate(old_rows)}
+    if len(old_positions) != len(old_rows):
+        return None
+
+    new_key_rows = snapshot_rows_from_data(data_rows, key_indexes)
+    new_entries = {}
+    for (key, hash_value), row in zip(new_key_rows, data_rows):
+        if key in new_entries:
+            logging.warning(f"キーが重複している行があるため差分同期できません: {key.split(chr(0x1f))}")
+            return None
+        new_entries[key] = (hash_value, row)
+
+    changed = []
+    deleted = []
+    for index, (key, hash_value) in enumerate(old_rows):
+        if key not in new_entries:
+            deleted.append(index)
+        elif new_entries[key][0] != hash_value:
+            changed.append(index)
+    appended = [key for key, _ in new_key_rows if key not in old_positions]
+
+    col_count = max([len(header)] + [len(row) for row in data_rows])
+    requests = []
+
+    # 変更行を元の位置で上書き（ヘッダー行の分だけ1行ずらす）
+    for start, end in group_contiguous(changed):
+        requests.append({
+            'updateCells': {
+                'range': {
+                    'sheetId': sheet_id,
+                    'startRowIndex': start + 1,
+                    'endRowIndex': end + 1,
+                    'startColumnIndex': 0,
+                    'endColumnIndex': col_count
+                },
+                'rows': [to_row_data(new_entries[old_rows[i][0]][1]) for i in range(start, end)],
+                'fields': 'userEnteredValue'
+            }
+        })
+
+    # 削除行は位置がずれないように下から削除
+    for start, end in reversed(group_contiguous(deleted)):
+        requests.append({
+            'deleteDimension': {
+                'range': {
+                    'sheetId': sheet_id,
+                    'dimension': 'ROWS',
+                    'startIndex': start + 1,
+                    'endIndex': end + 1
+                }
+            }
+        })
+
+    # 新規行は末尾に追加
+    if appended:
+        requests.append({
+            'appendCells': {
+                'sheetId': sheet_id,
+                'rows': [to_row_data(new_entries[key][1]) for key in appended],
+                'fields': 'userEnteredValue'
+            }
+        })
+
+    deleted_keys = {old_rows[i][0] for i in deleted}
+    snapshot_rows = [[key, new_entries[key][0]] for key, _ in old_rows if key not in deleted_keys]
+    snapshot_rows += [[key, new_entries[key][0]] for key in appended]
+
+    return {
+        'requests': requests,
+        'snapshot_rows': snapshot_rows,
+        'changed': len(changed),
+        'deleted': len(deleted),
+        'appended': len(appended)
+    }
+
+def sync_rows_diff(config, api, spreadsheet, worksheet, header, data_rows, chunk_size, max_chunk_bytes):
+    """前回のスナップショットとの差分のみをシートに反映する"""
+    details = []
+    key_columns = config.get('diff_key_columns', DEFAULT_DIFF_KEY_COLUMNS)
+    snapshot_path = get_snapshot_path(config)
+    snapshot = load_json_state(snapshot_path)
+    if snapshot and (snapshot.get('spreadsheet_id') != config.get('spreadsheet_id')
+                     or snapshot.get('sheet_name') != config.get('sheet_name', 'sheet1')):
+        snapshot = None
+
+    plan = plan_sheet_diff(worksheet.id, header, data_rows, snapshot, key_columns)
+    if plan is None:
+        # 差分の基準がないため全件を書き直す
+        logging.info("差分同期の基準となるスナップショットが使用できないため全件を書き込みます")
+        details.append("スナップショットなし: 全件書き込み\n")
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        details.append(write_rows_batched(api, worksheet, header, data_rows, chunk_size, max_chunk_bytes))
+        if all(column in header for column in key_columns):
+            key_indexes = [header.index(column) for column in key_columns]
+            snapshot_rows = snapshot_rows_from_data(data_rows, key_indexes)
+            save_json_state(snapshot_path, build_sheet_snapshot(config, header, snapshot_rows))
+        return "".join(details)
+
+    summary = f"変更 {plan['changed']} 行 / 追加 {plan['appended']} 行 / 削除 {plan['deleted']} 行"
+    if plan['requests']:
+        # appendCellsを含むため再試行は429の場合のみ
+        api.call('sheets_write', spreadsheet.batch_update, {'requests': plan['requests']}, idempotent=False)
+        logging.info(f"差分同期を反映しました: {summary}")
+    else:
+        logging.info("前回の同期から変更がないため書き込みをスキップしました")
+    details.append(f"差分同期: {summary}\n")
+    details.append(f"batchUpdateリクエスト数: {len(plan['requests'])}\n")
+
+    save_json_state(snapshot_path, build_sheet_snapshot(config, header, plan['snapshot_rows']))
+    return "".join(details)
+
+def shard_partition_key(value, column_type, date_format, date_formats=DEFAULT_DATE_FORMATS):
+    """パーティション列の値からシャードのキーを求める（日付列はdate_formatで書式化する）
+
+    日付列の値はシリアル値（typed_columns）でも文字列でもよく、文字列はdate_formatsで解釈する。
+    解釈できない値はそのままキーにする。
+    """
+    if column_type == 'date':
+        if isinstance(value, str):
+            try:
+                value = parse_date_serial(value.strip(), date_formats)
+            except ValueError:
+                return value.strip()
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return (SHEETS_EPOCH + timedelta(days=value)).strftime(date_format)
+    return str(value).strip()
+
+def shard_sheet_title(sheet_name, suffix):
+    """シャードのシート名を返す（シート名に使えない文字は置き換え、100文字以内にする）"""
+    suffix = "".join('_' if char in SHARD_TITLE_INVALID_CHARS else char for char in suffix) or '未設定'
+    return f"{sheet_name}_{suffix}"[:100]
+
+def plan_shards(header, data_rows, config):
+    """データ行をシャードに分割し、シートの割り当てを含むシャードのリストを返す
+
+    sheet_sharding='rows'はshard_max_rows行ごと、'column'はshard_columnの値ごとに分割する。
+    シャードはshard_spreadsheet_ids（省略時はspreadsheet_id）に順番に割り当てる。
+    """
+    sharding = config.get('sheet_sharding', DEFAULT_SHEET_SHARDING)
+    sheet_name = config.get('sheet_name', 'sheet1')
+    shards = []
+    if sharding == 'rows':
+        max_rows = max(1, int(config.get('shard_max_rows', DEFAULT_SHARD_MAX_ROWS)))
+        rows = list(data_rows)
+        for number, start in enumerate(range(0, len(rows), max_rows), start=1):
+            shards.append({'key': "", 'title': shard_sheet_title(sheet_name, f"{number:03d}"),
+                           'rows': rows[start:start + max_rows], 'first_row': start + 2})
+    elif sharding == 'column':
+        column = config.get('shard_column')
+        if column not in header:
+            raise ValueError(f"シャードの分割に使う列 '{column}' がCSVのヘッダーにありません")
+        col = header.index(column)
+        column_type = build_column_schema(header, config)[col]
+        date_format = config.get('shard_date_format', DEFAULT_SHARD_DATE_FORMAT)
+        date_formats = config.get('date_formats', DEFAULT_DATE_FORMATS)
+        partitions = {}
+        for row in data_rows:
+            key = shard_partition_key(row[col] if col < len(row) else "", column_type, date_format, date_formats)
+            partitions.setdefault(key, []).append(row)
+        for key in sorted(partitions):
+            shards.append({'key': key, 'title': shard_sheet_title(sheet_name, key), 'rows': partitions[key], 'first_row': ""})
+    else:
+        raise ValueError(f"不明なシャード分割方法 '{sharding}' です（rows / column）")
+    
+    max_count = int(config.get('shard_max_count', DEFAULT_SHARD_MAX_COUNT))
+    if len(shards) > max_count:
+        raise ValueError(f"シャード数 {len(shards)} が上限 {max_count} を超えています（shard_max_rows・shard_column・shard_date_formatを見直してください）")
+    titles = [shard['title'] for shard in shards]
+    if len(set(titles)) != len(titles):
+        raise ValueError("シート名が重複するシャードがあります（パーティション列の値がシート名の長さの上限を超えています）")
+    
+    spreadsheet_ids = config.get('shard_spreadsheet_ids') or [config.get('spreadsheet_id')]
+    for index, shard in enumerate(shards):
+        shard['spreadsheet_id'] = spreadsheet_ids[index % len(spreadsheet_ids)]
+    return shards
+
+def write_shard(config, api, header, shard, chunk_size, max_chunk_bytes):
+    """1つのシャードをシートに書き込む（シートが無い場合は作成する）"""
+    import gspread
+    spreadsheet = api.open_spreadsheet(shard['spreadsheet_id'])
+    try:
+        worksheet = api.call('sheets_read', spreadsheet.worksheet, shard['title'])
+    except gspread.WorksheetNotFound:
+        worksheet = api.call('sheets_write', spreadsheet.add_worksheet, title=shard['title'], rows=len(shard['rows']) + 1,
+                             cols=len(header), idempotent=False)
+        logging.info(f"シャードのシート '{shard['title']}' を作成しました")
+    details = write_rows_batched(api, worksheet, header, shard['rows'], chunk_size, max_chunk_bytes)
+    details += apply_column_formats(api, spreadsheet, worksheet, header, config)
+    shard['sheet_id'] = worksheet.id
+    logging.info(f"シャード '{shard['title']}' に {len(shard['rows'])} 行を書き込みました")
+    return details
+
+def write_shard_manifest(config, api, shards):
+    """シャードの一覧をマニフェストのシートに書き込み、前回のマニフェストにだけあるシャードのシートを削除する"""
+    import gspread
+    spreadsheet = api.open_spreadsheet(config.get('spreadsheet_id'))
+    manifest_name = config.get('shard_manifest_sheet_name', DEFAULT_SHARD_MANIFEST_SHEET_NAME)
+    try:
+        manifest = api.call('sheets_read', spreadsheet.worksheet, manifest_name)
+        previous = api.call('sheets_read', manifest.get_all_values)[1:]
+    except gspread.WorksheetNotFound:
+        manifest = api.call('sheets_write', spreadsheet.add_worksheet, title=manifest_name, rows=len(shards) + 1,
+                            cols=len(SHARD_MANIFEST_HEADER), idempotent=False)
+        previous = []
+        logging.info(f"シャードのマニフェスト '{manifest_name}' を作成しました")
+    
+    updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [SHARD_MANIFEST_HEADER]
+    for shard in shards:
+        url = f"https://docs.google.com/spreadsheets/d/{shard['spreadsheet_id']}/edit#gid={shard['sheet_id']}"
+        last_row = shard['first_row'] + len(shard['rows']) - 1 if shard['first_row'] else ""
+        rows.append([shard['key'], shard['spreadsheet_id'], shard['title'], len(shard['rows']),
+                     shard['first_row'], last_row, url, updated_at])
+    write_rows_batched(api, manifest, rows[0], rows[1:], DEFAULT_SHEET_WRITE_CHUNK_SIZE, DEFAULT_SHEET_WRITE_MAX_CHUNK_BYTES)
+    
+    # 今回のシャードに含まれないシートは古いデータが残らないよう削除する
+    current = {(shard['spreadsheet_id'], shard['title']) for shard in shards}
+    for row in previous:
+        if len(row) < 3 or (row[1], row[2]) in current:
+            continue
+        try:
+            stale_spreadsheet = api.open_spreadsheet(row[1])
+            stale = api.call('sheets_read', stale_spreadsheet.worksheet, row[2])
+            api.call('sheets_write', stale_spreadsheet.del_worksheet, stale, idempotent=False)
+            logging.info(f"使われなくなったシャードのシート '{row[2]}' を削除しました")
+        except gspread.WorksheetNotFound:
+            pass
+        except Exception as e:
+            logging.warning(f"使われなくなったシャードのシート '{row[2]}' の削除中にエラーが発生しました: {str(e)}")
+
+def write_sharded_sheets(config, api, header, data_rows, chunk_size, max_chunk_bytes):
+    """データ行をシャードに分割して複数のシートに並列に書き込み、(詳細テキスト, 書き込んだデータ行数) を返す"""
+    shards = plan_shards(header, data_rows, config)
+    spreadsheet_count = len({shard['spreadsheet_id'] for shard in shards})
+    logging.info(f"{len(shards)}個のシャード（スプレッドシート {spreadsheet_count} 件）に分割して書き込みます")
+    details = [f"シャード分割: {config.get('sheet_sharding')} / シャード数: {len(shards)} / スプレッドシート数: {spreadsheet_count}\n"]
+    
+    max_workers = max(1, int(config.get('shard_parallel_writers', DEFAULT_SHARD_PARALLEL_WRITERS)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # ジョブ名と計測値のコンテキストを書き込みスレッドに引き継ぐ
+        futures = [executor.submit(contextvars.copy_context().run, write_shard, config, api, header, shard,
+                                   chunk_size, max_chunk_bytes)
+                   for shard in shards]
+        errors = []
+        for shard, future in zip(shards, futures):
+            try:
+                future.result()
+                details.append(f"シャード {shard['title']} ({shard['spreadsheet_id']}): {len(shard['rows'])} 行\n")
+            except Exception as e:
+                errors.append(f"{shard['title']}: {str(e)}")
+                details.append(f"シャード {shard['title']} ({shard['spreadsheet_id']}): 失敗 {str(e)}\n")
+    if errors:
+        # マニフェストは書き込みがすべて成功した場合のみ更新する（読み手が途中の状態を参照しないように）
+        raise RuntimeError(f"{len(errors)}個のシャードの書き込みに失敗しました: {'; '.join(errors)}")
+    
+    write_shard_manifest(config, api, shards)
+    details.append(f"マニフェスト: {config.get('shard_manifest_sheet_name', DEFAULT_SHARD_MANIFEST_SHEET_NAME)}\n")
+    return "".join(details), sum(len(shard['rows']) for shard in shards)
+
+def write_to_google_sheets(header, data_rows, config, api, row_batches=None, source_md5=None):
+    """CSVデータをGoogleスプレッドシートに書き込む
+
+    row_batchesを指定した場合はdata_rowsの代わりに行バッチのイテレーターから読み進めながら書き込む。
+    source_md5（CSVのMD5）を指定した場合は書き込みの途中経過を記録し、同じCSVの再実行では続きから書き込む。
+    """
+    try:
+        logging.info("Googleスプレッドシートへの書き込みを開始します")
+        sheet_details = "Googleスプレッドシートへの書き込みを開始\n"
+        
         # 設定から値を取得
-        creds_file = config.get('creds_file', 'creds.json')
         spreadsheet_id = config.get('spreadsheet_id')
-        log_sheet_name = config.get('log_sheet_name', '実行履歴')
+        sheet_name = config.get('sheet_name', 'sheet1')
+        write_mode = config.get('sheet_write_mode', DEFAULT_SHEET_WRITE_MODE)
+        chunk_size = int(config.get('sheet_write_chunk_size', DEFAULT_SHEET_WRITE_CHUNK_SIZE))
+        max_chunk_bytes = int(config.get('sheet_write_max_chunk_bytes', DEFAULT_SHEET_WRITE_MAX_CHUNK_BYTES))
         
-        # 認証情報ファイルの確認
-        if not os.path.exists(creds_file):
-            logging.warning(f"認証情報ファイル '{creds_file}' が見つかりません")
-            return False
+        sheet_details += f"スプレッドシートID: {spreadsheet_id}\n"
+        sheet_details += f"シート名: {sheet_name}\n"
+        sheet_details += f"書き込みモード: {write_mode}\n"
+        
+        # 認証済みコンテキストの確認
+        if api is None:
+            logging.error("Google APIの認証情報が利用できません")
+            return False, sheet_details
         
-        # 認証情報の読み込み
-        creds = Credentials.from_service_account_file(creds_file, scopes=SCOPES)
-        client = gspread.authorize(creds)
+        sharding = config.get('sheet_sharding', DEFAULT_SHEET_SHARDING)
+        if sharding != 'none':
+            # シャード分割では行をシャードごとに振り分けるため全行を読み込んでから書き込む
+            if write_mode != 'batch':
+                logging.warning(f"書き込みモード '{write_mode}' はシャード分割に対応していないため 'batch' で書き込みます")
+            if row_batches is not None:
+                data_rows = list(itertools.chain.from_iterable(row_batches))
+            start_time = time.perf_counter()
+            shard_details, written_rows = write_sharded_sheets(config, api, header, data_rows, chunk_size, max_chunk_bytes)
+            elapsed = time.perf_counter() - start_time
+            sheet_details += shard_details
+            sheet_details += f"合計 {written_rows} 行のデータを書き込み完了\n"
+            sheet_details += f"書き込み時間: {elapsed:.2f}秒 ({written_rows / elapsed if elapsed > 0 else 0.0:.1f} 行/秒)\n"
+            logging.info(f"合計 {written_rows} 行のデータを {elapsed:.2f}秒 で書き込みました")
+            return True, sheet_details
         
         # スプレッドシートを開く
-        spreadsheet = client.open_by_key(spreadsheet_id)
+        spreadsheet = api.open_spreadsheet(spreadsheet_id)
+        worksheet = api.call('sheets_read', spreadsheet.worksheet, sheet_name)
         
-        try:
-            # ログシートを取得
-            log_worksheet = spreadsheet.worksheet(log_sheet_name)
-        except gspread.WorksheetNotFound:
-            # ログシートが存在しない場合は作成
-            log_worksheet = spreadsheet.add_worksheet(title=log_sheet_name, rows=1000, cols=10)
-            # ヘッダー行を追加
-            header = ["実行ID", "実行日時", "ステータス", "メッセージ", "CSVファイルパス", "処理行数", "Google Docsリンク", "警告"]
-            log_worksheet.append_row(header)
-            logging.info(f"ログシート '{log_sheet_name}' を作成しました")
-        
-        # 現在の日時を取得
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # ログデータを準備
-        csv_file_path = config.get('csv_file_path', '')
-        log_data = [execution_id, current_time, status, message, csv_file_path, row_count, heading_link, warning]
-        
-        # 最終行に追加
-        log_worksheet.append_row(log_data)
-        logging.info(f"実行ログをスプレッドシートに記録しました: {status} (実行ID: {execution_id})")
+        logging.info(f"スプレッドシート '{spreadsheet.title}' のシート '{sheet_name}' にアクセスしました")
+        sheet_details += f"スプレッドシート名: {spreadsheet.title}\n"
+        sheet_details += f"アクセスしたシート: {sheet_name}\n"
         
-        return True
+        if row_batches is not None and write_mode != 'batch':
+            # ストリーミング書き込みはbatchモードのみ対応
+            logging.warning(f"書き込みモード '{write_mode}' はストリーミングに対応していないため全行を読み込んでから書き込みます")
+            data_rows = list(itertools.chain.from_iterable(row_batches))
+            row_batches = None
+        
+        start_time = time.perf_counter()
+        written_rows = len(data_rows) if data_rows is not None else 0
+        if write_mode == 'diff':
+            # 前回との差分のみを反映（シートはクリアしない）
+            sheet_details += sync_rows_diff(config, api, spreadsheet, worksheet, header, data_rows, chunk_size, max_chunk_bytes)
+        else:
+            # 全件書き込みでは差分同期のスナップショットが古くなるため破棄
+            snapshot_path = get_snapshot_path(config)
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            
+            # 前回同じCSVの書き込みが途中で失敗していれば続きから書き込む（rowモードは追記のため対象外）
+            journal_path, journal_key, journal = None, None, None
+            if write_mode != 'row':
+                journal_path, journal_key, journal = prepare_write_journal(
+                    config, header, source_md5, 'streaming' if row_batches is not None else 'batch')
+            resumed_rows = journal['written_rows'] if journal else 0
+            metrics = current_metrics.get()
+            if metrics is not None:
+                metrics.set_value('resumed_rows', resumed_rows)
+            
+            if row_batches is not None or write_mode == 'row':
+                # 行数が事前に分からない・1行ずつ追記する場合は既存のデータをクリアしてから書き込む
+                if not resumed_rows:
+                    api.call('sheets_write', worksheet.clear)
+                    logging.info("既存のデータをクリアしました")
+                    sheet_details += "既存のデータをクリア\n"
+                
+                if row_batches is not None:
+                    stream_details, written_rows = write_rows_streaming(api, worksheet, header, row_batches, chunk_size, max_chunk_bytes,
+                                                                        journal_path, journal_key, journal)
+                    sheet_details += stream_details
+                else:
+                    sheet_details += write_rows_per_row(api, worksheet, header, data_rows)
+            else:
+                # グリッドのサイズ変更と書き込みをbatchUpdateでまとめて行う（クリアは不要）
+                if write_mode != 'batch':
+                    logging.warning(f"不明な書き込みモード '{write_mode}' のため 'batch' で書き込みます")
+                sheet_details += write_rows_batched(api, worksheet, header, data_rows, chunk_size, max_chunk_bytes,
+                                                    journal_path, journal_key, journal)
+        elapsed = time.perf_counter() - start_time
+        rows_per_sec = written_rows / elapsed if elapsed > 0 else 0.0
+        
+        logging.info(f"合計 {written_rows} 行のデータを書き込みました")
+        logging.info(f"書き込み時間: {elapsed:.2f}秒 ({rows_per_sec:.1f} 行/秒)")
+        logging.info("Googleスプレッドシートへの書き込みが完了しました")
+        sheet_details += f"合計 {written_rows} 行のデータを書き込み完了\n"
+        sheet_details += f"書き込み時間: {elapsed:.2f}秒 ({rows_per_sec:.1f} 行/秒)\n"
+        sheet_details += apply_column_formats(api, spreadsheet, worksheet, header, config)
+        
+        return True, sheet_details
         
+    except FileNotFoundError:
+        error_msg = "認証情報ファイルが見つかりません"
+        logging.error(error_msg)
+        return False, sheet_details
     except Exception as e:
-        logging.warning(f"スプレッドシートへのログ記録中にエラーが発生しました: {str(e)}")
-        return False
+        error_msg = f"Googleスプレッドシートへの書き込み中にエラーが発生しました: {str(e)}"
+        logging.error(error_msg)
+        import traceback
+        logging.error(f"詳細なエラー情報: {traceback.format_exc()}")
+        return False, sheet_details
 
-def log_to_google_docs(config, execution_id, status, message="", row_count="", csv_details="", sheet_details="", drive_details=""):
-    """実行ログをGoogle Docsに記録する"""
+def upload_to_google_drive(config, api, snapshot=None):
+    """Google Driveにファイルをアップロードする"""
     try:
-        # 設定から値を取得
-        creds_file = config.get('creds_file', 'creds.json')
-        log_doc_id = config.get('log_doc_id')
+        # 認証済みコンテキストの確認
+        if api is None:
+            logging.warning("Google APIの認証情報が利用できません")
+            return False, ""
         
-        if not log_doc_id:
-            logging.warning("設定ファイルに 'log_doc_id' が設定されていません")
-            return False
+        # Google Driveにファイルをアップロード
+        drive_success, drive_details = upload_files_to_drive(api, config, snapshot)
+        if drive_success:
+            logging.info("Google Driveへのファイルアップロードが完了しました")
+            drive_details += "Google Driveへのファイルアップロードが完了\n"
+        else:
+            logging.warning("Google Driveへのファイルアップロードに失敗しました")
+            drive_details += "Google Driveへのファイルアップロードに失敗\n"
         
-        # 認証情報ファイルの確認
-        if not os.path.exists(creds_file):
-            logging.warning(f"認証情報ファイル '{creds_file}' が見つかりません")
-            return False
+        return drive_success, drive_details
         
-        # 認証情報の読み込み
-        creds = Credentials.from_service_account_file(creds_file, scopes=SCOPES)
+    except Exception as e:
+        error_msg = f"Google Driveへのファイルアップロード中にエラーが発生しました: {str(e)}"
+        logging.warning(error_msg)
+        import traceback
+        logging.warning(f"詳細なエラー情報: {traceback.format_exc()}")
+        drive_details = error_msg + "\n" + f"詳細なエラー情報: {traceback.format_exc()}\n"
+        return False, drive_details
+
+def record_history_header(config, sheet_title):
+    """実行履歴シートのヘッダーが現在のHISTORY_HEADERであることを記録する"""
+    state_path = get_state_path(config, "history_header_state.json")
+    with state_lock:
+        state = load_json_state(state_path) or {}
+        state[f"{config.get('spreadsheet_id')}/{sheet_title}"] = HISTORY_HEADER
+        save_json_state(state_path, state)
+
+def ensure_history_header(config, api, log_worksheet):
+    """既存の実行履歴シートのヘッダーがHISTORY_HEADERより古い場合に1回だけ更新する"""
+    state_path = get_state_path(config, "history_header_state.json")
+    with state_lock:
+        state = load_json_state(state_path) or {}
+    if state.get(f"{config.get('spreadsheet_id')}/{log_worksheet.title}") == HISTORY_HEADER:
+        return
+    try:
+        if log_worksheet.col_count < len(HISTORY_HEADER):
+            api.call('sheets_write', log_worksheet.resize, cols=len(HISTORY_HEADER))
+        api.call('sheets_write', log_worksheet.update, [HISTORY_HEADER], 'A1', value_input_option='RAW')
+        record_history_header(config, log_worksheet.title)
+        logging.info(f"ログシート '{log_worksheet.title}' のヘッダーを更新しました")
+    except Exception as e:
+        logging.warning(f"ログシートのヘッダーの更新中にエラーが発生しました: {str(e)}")
+
+def build_history_row(config, execution_id, status, message="", row_count="", heading_link="", warning="",
+                      total_seconds="", api_calls="", resumed=""):
+    """実行履歴シートに追記する1行を作成する"""
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    csv_file_path = config.get('csv_file_path', '')
+    return [execution_id, current_time, status, message, csv_file_path, row_count, heading_link, warning,
+            total_seconds, api_calls, resumed]
+
+def append_history_rows(config, api, rows):
+    """実行履歴シートに複数行を1回のappend_rowsで追記する（シートが無い場合は作成する）"""
+    import gspread
+    log_sheet_name = config.get('log_sheet_name', '実行履歴')
+    
+    # スプレッドシートを開く（書き込み時に開いたものを再利用）
+    spreadsheet = api.open_spreadsheet(config.get('spreadsheet_id'))
+    
+    try:
+        # ログシートを取得
+        log_worksheet = api.call('sheets_read', spreadsheet.worksheet, log_sheet_name)
+        ensure_history_header(config, api, log_worksheet)
+    except gspread.WorksheetNotFound:
+        # ログシートが存在しない場合は作成
+        log_worksheet = api.call('sheets_write', spreadsheet.add_worksheet, title=log_sheet_name, rows=1000,
+                                 cols=len(HISTORY_HEADER), idempotent=False)
+        # ヘッダー行を追加
+        api.call('sheets_write', log_worksheet.append_row, HISTORY_HEADER, idempotent=False)
+        record_history_header(config, log_sheet_name)
+        logging.info(f"ログシート '{log_sheet_name}' を作成しました")
+    
+    # 最終行に追加
+    api.call('sheets_write', log_worksheet.append_rows, rows, idempotent=False)
+
+def find_history_execution_ids(config, api, execution_ids):
+    """実行履歴シートに既に行がある実行IDの集合を返す（送信済みか分からない行の重複送信を防ぐ）"""
+    import gspread
+    spreadsheet = api.open_spreadsheet(config.get('spreadsheet_id'))
+    try:
+        log_worksheet = api.call('sheets_read', spreadsheet.worksheet, config.get('log_sheet_name', '実行履歴'))
+    except gspread.WorksheetNotFound:
+        return set()
+    recorded = set(api.call('sheets_read', log_worksheet.col_values, HISTORY_HEADER.index("実行ID") + 1))
+    return {execution_id for execution_id in execution_ids if execution_id in recorded}
+
+def log_to_spreadsheet(config, api, execution_id, status, message="", row_count="", heading_link="", warning="",
+                       total_seconds="", api_calls="", resumed=""):
+    """実行ログをスプレッドシートに記録する"""
+    try:
+        # 認証済みコンテキストの確認
+        if api is None:
+            logging.warning("Google APIの認証情報が利用できません")
+            return False
         
-        # Google Docs APIサービスを構築
-        docs_service = build('docs', 'v1', credentials=creds)
+        log_data = build_history_row(config, execution_id, status, message, row_count, heading_link, warning,
+                                     total_seconds, api_calls, resumed)
+        append_history_rows(config, api, [log_data])
+        logging.info(f"実行ログをスプレッドシートに記録しました: {status} (実行ID: {execution_id})")
         
-        # 現在の日時を取得
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return True
         
+    except Exception as e:
+        logging.warning(f"スプレッドシートへのログ記録中にエラーが発生しました: {str(e)}")
+        return False
+
+def build_log_doc_requests(heading_text, log_entry):
+    """見出しの挿入・見出しスタイル・本文の挿入・本文スタイルを1回のbatchUpdate用リクエストにまとめる"""
+    # 見出しの位置（挿入後のインデックス）
+    heading_end_index = len(heading_text) + 1
+    
+    # ログ内容部分（実行ID行は除外）の位置
+    log_start_index = heading_end_index + 1  # 改行の後から開始
+    log_end_index = heading_end_index + len(log_entry)
+    
+    return [
         # 実行IDをH1見出しとして挿入
-        heading_text = f"実行ID: {execution_id}"
-        
-        # まず見出しテキストを挿入
-        requests = [
-            {
-                'insertText': {
-                    'location': {
-                        'index': 1
-                    },
-                    'text': heading_text + '\n'
-                }
+        {
+            'insertText': {
+                'location': {
+                    'index': 1
+                },
+                'text': heading_text + '\n'
             }
-        ]
-        
-        docs_service.documents().batchUpdate(
-            documentId=log_doc_id,
-            body={'requests': requests}
-        ).execute()
-        
-        # 見出しの位置を取得（挿入後のインデックス）
-        heading_end_index = len(heading_text) + 1
-        
-        # 見出し部分だけをH1スタイルに設定
-        requests = [
-            {
-                'updateParagraphStyle': {
-                    'range': {
-                        'startIndex': 1,
-                        'endIndex': heading_end_index
-                    },
-                    'paragraphStyle': {
-                        'namedStyleType': 'HEADING_1'
-                    },
-                    'fields': 'namedStyleType'
-                }
+        },
+        {
+            'updateParagraphStyle': {
+                'range': {
+                    'startIndex': 1,
+                    'endIndex': heading_end_index
+                },
+                'paragraphStyle': {
+                    'namedStyleType': 'HEADING_1'
+                },
+                'fields': 'namedStyleType'
             }
-        ]
-        
-        docs_service.documents().batchUpdate(
-            documentId=log_doc_id,
-            body={'requests': requests}
-        ).execute()
-        
-        # 詳細なログエントリを作成
-        log_entry = f"\n実行日時: {current_time}\n"
-        log_entry += f"ステータス: {status}\n"
-        
-        if message:
-            log_entry += f"メッセージ: {message}\n"
-        
-        if row_count:
-            log_entry += f"処理行数: {row_count}\n"
-        
-        # キャプチャされたログメッセージを追加
-        if captured_logs:
-            log_entry += f"実行ログ:\n"
-            for log_msg in captured_logs:
-                log_entry += f"{log_msg}\n"
-        
-        if csv_details:
-            log_entry += f"CSV詳細:\n{csv_details}\n"
-        
-        if sheet_details:
-            log_entry += f"スプレッドシート詳細:\n{sheet_details}\n"
+        },
+        # 見出しの後にログ内容を挿入（通常のテキストとして）
+        {
+            'insertText': {
+                'location': {
+                    'index': heading_end_index
+                },
+                'text': log_entry
+            }
+        },
+        {
+            'updateParagraphStyle': {
+                'range': {
+                    'startIndex': log_start_index,
+                    'endIndex': log_end_index
+                },
+                'paragraphStyle': {
+                    'namedStyleType': 'NORMAL_TEXT'
+                },
+                'fields': 'namedStyleType'
+            }
+        }
+    ]
+
+def record_log_doc_index(config, api, period, doc_id, created_at):
+    """ローテーションで作成したログドキュメントを一覧シートに記録する"""
+    import gspread
+    try:
+        spreadsheet = api.open_spreadsheet(config.get('spreadsheet_id'))
+        index_sheet_name = config.get('log_doc_index_sheet_name', DEFAULT_LOG_DOC_INDEX_SHEET_NAME)
+        try:
+            index_worksheet = api.call('sheets_read', spreadsheet.worksheet, index_sheet_name)
+        except gspread.WorksheetNotFound:
+            index_worksheet = api.call('sheets_write', spreadsheet.add_worksheet, title=index_sheet_name, rows=100, cols=4, idempotent=False)
+            api.call('sheets_write', index_worksheet.append_row, ["作成日時", "期間", "ドキュメントID", "URL"], idempotent=False)
+            logging.info(f"ログドキュメント一覧シート '{index_sheet_name}' を作成しました")
         
-        if drive_details:
-            log_entry += f"Drive詳細:\n{drive_details}\n"
+        doc_url = f"https://docs.google.com/document/d/{doc_id}/edit"
+        api.call('sheets_write', index_worksheet.append_row, [created_at, period, doc_id, doc_url], idempotent=False)
+        return True
         
-        log_entry += f"{'='*60}\n"
-        log_entry += f"【実行ID: {execution_id} 終了】\n\n"
+    except Exception as e:
+        logging.warning(f"ログドキュメント一覧の記録中にエラーが発生しました: {str(e)}")
+        return False
+
+# ログドキュメントへの書き込みとローテーション状態の更新を直列化するロック
+log_doc_lock = threading.Lock()
+
+def resolve_log_doc(config, api, entry_chars):
+    """ローテーション設定に従って書き込み先のログドキュメントを決定する
+
+    (ドキュメントID, 状態ファイルのパス, 状態) を返す。ローテーションしない場合、パスと状態はNone。
+    状態は設定のlog_doc_idごとに保持するため、状態ファイルには全体の辞書を書き戻すこと。
+    """
+    rotation = config.get('log_doc_rotation', DEFAULT_LOG_DOC_ROTATION)
+    log_doc_id = config.get('log_doc_id')
+    if rotation not in ('monthly', 'size'):
+        return log_doc_id, None, None
+    
+    now = datetime.now()
+    period = now.strftime("%Y-%m")
+    state_path = get_state_path(config, "log_doc_state.json")
+    all_states = load_json_state(state_path) or {}
+    if 'doc_id' in all_states:
+        # 旧形式（ドキュメント1つ分の状態）を設定のlog_doc_idの状態として引き継ぐ
+        all_states = {log_doc_id: all_states}
+    state = all_states.get(log_doc_id)
+    if not state or not state.get('doc_id'):
+        # 初回は設定のドキュメントを現在の期間のドキュメントとして扱う
+        state = {'doc_id': log_doc_id, 'period': period, 'chars': 0}
+    
+    max_chars = int(config.get('log_doc_max_chars', DEFAULT_LOG_DOC_MAX_CHARS))
+    if rotation == 'monthly':
+        need_rotation = state.get('period') != period
+    else:
+        need_rotation = state.get('chars', 0) + entry_chars > max_chars
+    
+    if need_rotation:
+        title_suffix = period if rotation == 'monthly' else now.strftime("%Y%m%d_%H%M%S")
+        file_metadata = {
+            'name': f"実行ログ {title_suffix}",
+            'mimeType': 'application/vnd.google-apps.document'
+        }
+        folder_id = config.get('log_doc_folder_id', config.get('drive_folder_id'))
+        if folder_id:
+            file_metadata['parents'] = [folder_id]
         
-        # 見出しの後にログ内容を挿入（通常のテキストとして）
-        requests = [
-            {
-                'insertText': {
-                    'location': {
-                        'index': heading_end_index
-                    },
-                    'text': log_entry
-                }
-            }
-        ]
+        # 共有ドライブに作成できるようDrive API経由でドキュメントを作成
+        request = api.drive_service().files().create(
+            body=file_metadata,
+            fields='id',
+            supportsAllDrives=True
+        )
+        new_doc = api.call('drive', request.execute, idempotent=False)
+        state = {'doc_id': new_doc['id'], 'period': period, 'chars': 0}
+        logging.info(f"新しいログドキュメントを作成しました: {file_metadata['name']} (ID: {state['doc_id']})")
+        record_log_doc_index(config, api, period, state['doc_id'], now.strftime("%Y-%m-%d %H:%M:%S"))
+    
+    all_states[log_doc_id] = state
+    if need_rotation:
+        save_json_state(state_path, all_states)
+    return state['doc_id'], state_path, all_states
+
+def build_log_doc_entry(execution_id, status, message="", row_count="", log_file_url="", max_issues=DEFAULT_LOG_DOC_MAX_ISSUES):
+    """ログドキュメントに挿入する (見出し, 本文) を作成する
+
+    本文は件数・所要時間・先頭のエラー・警告だけの要約で、CSVの行数によらず一定の大きさに収まる。
+    ログの全文はDriveにアップロードしたログファイル（log_file_url）を参照する。
+    """
+    # 現在の日時を取得
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    # 実行IDをH1見出しとして挿入
+    heading_text = f"実行ID: {execution_id}"
+    
+    # 要約のログエントリを作成
+    log_entry = [f"\n実行日時: {current_time}\n", f"ステータス: {status}\n"]
+    
+    if message:
+        log_entry.append(f"メッセージ: {message}\n")
+    
+    if row_count:
+        log_entry.append(f"処理行数: {row_count}\n")
+    
+    metrics = current_metrics.get()
+    if metrics is not None:
+        data = metrics.to_dict()
+        stage_summary = ", ".join(f"{name}={seconds:.2f}秒" for name, seconds in data['stages'].items())
+        log_entry.append(f"所要時間: {metrics.elapsed():.2f}秒" + (f" ({stage_summary})" if stage_summary else "") + "\n")
+        log_entry.append(f"API呼び出し: {data['api']['calls']}回 (再試行: {data['api']['retries']}回)\n")
+        log_counts = data['logs']
+        log_entry.append(f"ログ: {sum(log_counts.values())}件 (警告: {log_counts.get('WARNING', 0)}件, "
+                         f"エラー: {log_counts.get('ERROR', 0) + log_counts.get('CRITICAL', 0)}件)\n")
+        for label, level in (("エラー", 'ERROR'), ("警告", 'WARNING')):
+            issues = metrics.log_issues[level][:max_issues]
+            if issues:
+                log_entry.append(f"{label}（先頭{len(issues)}件）:\n")
+                for issue in issues:
+                    # 詳細なエラー情報などの長いメッセージは先頭だけを記録する
+                    if len(issue) > LOG_DOC_MESSAGE_MAX_CHARS:
+                        issue = issue[:LOG_DOC_MESSAGE_MAX_CHARS] + "…"
+                    log_entry.append(f"- {issue}\n")
+    
+    if log_file_url:
+        log_entry.append(f"ログファイル: {log_file_url}\n")
+    
+    log_entry.append(f"{'='*60}\n")
+    log_entry.append(f"【実行ID: {execution_id} 終了】\n\n")
+    return heading_text, "".join(log_entry)
+
+def log_doc_heading_link(doc_id, execution_id):
+    """ログドキュメントの実行IDの見出しへのリンクを返す"""
+    return f"https://docs.google.com/document/d/{doc_id}/edit#heading=h.{execution_id}"
+
+def current_log_doc_id(config):
+    """ローテーションせずに現在の書き込み先のログドキュメントIDを返す"""
+    log_doc_id = config.get('log_doc_id')
+    if config.get('log_doc_rotation', DEFAULT_LOG_DOC_ROTATION) not in ('monthly', 'size'):
+        return log_doc_id
+    all_states = load_json_state(get_state_path(config, "log_doc_state.json")) or {}
+    if 'doc_id' in all_states:
+        return all_states['doc_id']
+    return (all_states.get(log_doc_id) or {}).get('doc_id') or log_doc_id
+
+def find_log_doc_headings(config, api, execution_ids):
+    """現在のログドキュメントに見出しがある実行IDを探し、(ドキュメントID, 実行IDの集合) を返す"""
+    log_doc_id = current_log_doc_id(config)
+    request = api.docs_service().documents().get(
+        documentId=log_doc_id, fields='body(content(paragraph(elements(textRun(content)))))')
+    document = api.call('docs', request.execute)
+    texts = set()
+    for element in document.get('body', {}).get('content', []):
+        for run in element.get('paragraph', {}).get('elements', []):
+            texts.add(run.get('textRun', {}).get('content', '').strip())
+    return log_doc_id, {execution_id for execution_id in execution_ids if f"実行ID: {execution_id}" in texts}
+
+def write_log_doc_entries(config, api, entries):
+    """(見出し, 本文) のリストを1回のbatchUpdateでログドキュメントに挿入し、書き込んだドキュメントIDを返す
+
+    各エントリは先頭に挿入するため、リストの最後のエントリがドキュメントの一番上になる。
+    """
+    docs_service = api.docs_service()
+    
+    # 複数ジョブが同じドキュメントに書き込む場合に備え、ドキュメントの決定から状態の更新までを排他する
+    with log_doc_lock:
+        # 書き込み先のドキュメントを決定（必要に応じてローテーション）
+        entry_chars = sum(len(heading_text) + 1 + len(log_entry) for heading_text, log_entry in entries)
+        log_doc_id, state_path, all_states = resolve_log_doc(config, api, entry_chars)
+        
+        # 見出し・本文の挿入とスタイル設定を1回のbatchUpdateで実行
+        requests = []
+        for heading_text, log_entry in entries:
+            requests.extend(build_log_doc_requests(heading_text, log_entry))
+        request = docs_service.documents().batchUpdate(documentId=log_doc_id, body={'requests': requests})
+        # 挿入は冪等ではないため再試行は429の場合のみ
+        api.call('docs', request.execute, idempotent=False)
+        
+        if all_states is not None:
+            state = all_states[config.get('log_doc_id')]
+            state['chars'] = state.get('chars', 0) + entry_chars
+            save_json_state(state_path, all_states)
+    return log_doc_id
+
+def log_to_google_docs(config, api, execution_id, status, message="", row_count="", log_file_url=""):
+    """実行ログをGoogle Docsに記録する"""
+    try:
+        if not config.get('log_doc_id'):
+            logging.warning("設定ファイルに 'log_doc_id' が設定されていません")
+            return False, ""
         
-        docs_service.documents().batchUpdate(
-            documentId=log_doc_id,
-            body={'requests': requests}
-        ).execute()
-        
-        # ログ内容部分だけをNORMAL_TEXTスタイルに設定（実行ID行は除外）
-        log_start_index = heading_end_index + 1  # 改行の後から開始
-        log_end_index = heading_end_index + len(log_entry)
-        
-        requests = [
-            {
-                'updateParagraphStyle': {
-                    'range': {
-                        'startIndex': log_start_index,
-                        'endIndex': log_end_index
-                    },
-                    'paragraphStyle': {
-                        'namedStyleType': 'NORMAL_TEXT'
-                    },
-                    'fields': 'namedStyleType'
-                }
-            }
-        ]
+        # 認証済みコンテキストの確認
+        if api is None:
+            logging.warning("Google APIの認証情報が利用できません")
+            return False, ""
         
-        docs_service.documents().batchUpdate(
-            documentId=log_doc_id,
-            body={'requests': requests}
-        ).execute()
+        entry = build_log_doc_entry(execution_id, status, message, row_count, log_file_url,
+                                    int(config.get('log_doc_max_issues', DEFAULT_LOG_DOC_MAX_ISSUES)))
+        log_doc_id = write_log_doc_entries(config, api, [entry])
         
         # 見出しへのリンクを生成
-        doc_url = f"https://docs.google.com/document/d/{log_doc_id}/edit"
-        heading_link = f"{doc_url}#heading=h.{execution_id}"
+        heading_link = log_doc_heading_link(log_doc_id, execution_id)
         
         logging.info(f"実行ログをGoogle Docsに記録しました: {status} (実行ID: {execution_id})")
         logging.info(f"見出しリンク: {heading_link}")
@@ -575,8 +2893,905 @@ def log_to_google_docs(config, execution_id, status, message="", row_count="", c
         logging.error(f"Google Docsへのログ記録中にエラーが発生しました: {str(e)}")
         return False, ""
 
-def main():
+class LogOutbox:
+    """実行履歴シート・Google Docsへの実行ログの送信待ちキュー（state_dirのSQLite）
+
+    実行中はエントリをローカルに保存するだけで、送信はバックグラウンドのスレッドがまとめて行う。
+    履歴シートの行は1回のappend_rows、ログドキュメントのエントリは1回のbatchUpdateで送信し、
+    送信に失敗したエントリは次回以降の送信で再試行する。
+
+    append_rows・batchUpdateは冪等ではなく、送信が成功してから送信済みにするまでの間にプロセスが
+    終了する（送信待ちのタイムアウトでデーモンスレッドが止まる場合など）と、送信済みか分からないエントリが残る。
+    送信前に試行IDを記録しておき、試行IDのあるエントリは再送信の前に送信先に実行IDがあるかを確認して
+    重複して書き込まないようにする。
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_LOG_OUTBOX_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_requested = False
+        self._flusher = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                execution_id TEXT NOT NULL,
+                config TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                sent_at TEXT,
+                result TEXT,
+                attempt_id TEXT
+            )""")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if 'attempt_id' not in columns:
+            # 試行IDの列が無い古いキューに列を追加
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN attempt_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (kind, sent_at)")
+
+    def enqueue(self, kind, execution_id, config, payload):
+        """エントリ（kind: history/docs）を送信待ちに追加する"""
+        log_config = {key: config[key] for key in LOG_OUTBOX_CONFIG_KEYS if key in config}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (kind, execution_id, config, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, execution_id, json.dumps(log_config, ensure_ascii=False), json.dumps(payload, ensure_ascii=False),
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def pending(self, kind):
+        """未送信で再試行回数が上限に達していないエントリを古い順に返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, execution_id, config, payload, attempt_id FROM outbox "
+                "WHERE kind = ? AND sent_at IS NULL AND attempts < ? ORDER BY id",
+                (kind, self.max_attempts)).fetchall()
+        return [{'id': row[0], 'execution_id': row[1], 'config': json.loads(row[2]), 'payload': json.loads(row[3]),
+                 'attempt_id': row[4]} for row in rows]
+
+    def count_pending(self):
+        """未送信で再試行回数が上限に達していないエントリの数を返す"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL AND attempts < ?",
+                                      (self.max_attempts,)).fetchone()[0]
+
+    def sent_results(self, kind, execution_ids):
+        """送信済みのエントリの結果（実行ID -> 結果）を返す"""
+        if not execution_ids:
+            return {}
+        placeholders = ",".join("?" * len(execution_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT execution_id, result FROM outbox WHERE kind = ? AND sent_at IS NOT NULL AND execution_id IN ({placeholders})",
+                [kind] + list(execution_ids)).fetchall()
+        return dict(rows)
+
+    def mark_in_flight(self, entry_ids):
+        """送信前のエントリに試行IDを記録し、試行IDを返す"""
+        attempt_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.executemany("UPDATE outbox SET attempt_id = ? WHERE id = ?",
+                                   [(attempt_id, entry_id) for entry_id in entry_ids])
+        return attempt_id
+
+    def mark_sent(self, results):
+        """エントリを送信済みにする（results: [(ID, 結果)]）"""
+        sent_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._conn.executemany("UPDATE outbox SET sent_at = ?, result = ?, last_error = NULL WHERE id = ?",
+                                   [(sent_at, result, entry_id) for entry_id, result in results])
+
+    def mark_failed(self, entry_ids, error):
+        """エントリの送信失敗を記録する（再試行回数が上限に達したものは以降送信しない）"""
+        with self._lock:
+            self._conn.executemany("UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                                   [(str(error), entry_id) for entry_id in entry_ids])
+            abandoned = self._conn.execute(
+                f"SELECT COUNT(*) FROM outbox WHERE id IN ({','.join('?' * len(entry_ids))}) AND attempts >= ?",
+                list(entry_ids) + [self.max_attempts]).fetchone()[0]
+        if abandoned:
+            logging.error(f"送信に{self.max_attempts}回失敗した実行ログ{abandoned}件の送信を中止しました（{self.path}）")
+
+    def purge_sent(self, retention_days=LOG_OUTBOX_RETENTION_DAYS):
+        """保存期間を過ぎた送信済みのエントリを削除する"""
+        cutoff = datetime.fromtimestamp(time.time() - retention_days * 24 * 60 * 60).strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE sent_at IS NOT NULL AND sent_at < ?", (cutoff,))
+
+    def flush(self, api):
+        """送信待ちのエントリを送信し、(送信した件数, 失敗した件数) を返す
+
+        履歴シートの行にはログドキュメントの見出しへのリンクを入れるため、Docsのエントリを先に送信し、
+        同じ実行IDのDocsのエントリが送信待ちのままの行は次回に回す。
+        """
+        with self._flush_lock:
+            sent, failed = 0, 0
+            for entries in self._group_entries(self.pending('docs')):
+                config = entries[0]['config']
+                unsent = entries
+                try:
+                    # 前回の送信で書き込み済みのエントリは送信せずに送信済みにする
+                    links = self._delivered_doc_links(config, api, entries)
+                    self.mark_sent(links)
+                    delivered = {entry_id for entry_id, _ in links}
+                    unsent = [entry for entry in entries if entry['id'] not in delivered]
+                    if unsent:
+                        self.mark_in_flight([entry['id'] for entry in unsent])
+                        log_doc_id = write_log_doc_entries(
+                            config, api, [tuple(entry['payload']['entry']) for entry in unsent])
+                        new_links = [(entry['id'], log_doc_heading_link(log_doc_id, entry['execution_id']))
+                                     for entry in unsent]
+                        self.mark_sent(new_links)
+                        links += new_links
+                    run_history = get_run_history(config)
+                    if run_history is not None:
+                        execution_ids = {entry['id']: entry['execution_id'] for entry in entries}
+                        for entry_id, link in links:
+                            run_history.set_heading_link(execution_ids[entry_id], link)
+                    sent += len(entries)
+                except Exception as e:
+                    logging.warning(f"Google Docsへの実行ログ{len(unsent)}件の送信に失敗しました（次回再試行します）: {str(e)}")
+                    self.mark_failed([entry['id'] for entry in unsent], e)
+                    failed += len(unsent)
+                    sent += len(entries) - len(unsent)
+            
+            waiting_docs = {entry['execution_id'] for entry in self.pending('docs')}
+            history = [entry for entry in self.pending('history') if entry['execution_id'] not in waiting_docs]
+            for entries in self._group_entries(history):
+                config = entries[0]['config']
+                links = self.sent_results('docs', [entry['execution_id'] for entry in entries])
+                rows = {}
+                for entry in entries:
+                    row = entry['payload']['row']
+                    if entry['payload'].get('link_from_docs'):
+                        row[HISTORY_HEADER.index("Google Docsリンク")] = links.get(entry['execution_id']) or ""
+                    rows[entry['id']] = row
+                unsent = entries
+                try:
+                    retried = [entry['execution_id'] for entry in entries if entry['attempt_id']]
+                    if retried:
+                        # 前回の送信で追記済みの行は送信せずに送信済みにする
+                        delivered = find_history_execution_ids(config, api, retried)
+                        self.mark_sent([(entry['id'], None) for entry in entries if entry['execution_id'] in delivered])
+                        unsent = [entry for entry in entries if entry['execution_id'] not in delivered]
+                    if unsent:
+                        self.mark_in_flight([entry['id'] for entry in unsent])
+                        append_history_rows(config, api, [rows[entry['id']] for entry in unsent])
+                        self.mark_sent([(entry['id'], None) for entry in unsent])
+                    sent += len(entries)
+                except Exception as e:
+                    logging.warning(f"スプレッドシートへの実行ログ{len(unsent)}件の送信に失敗しました（次回再試行します）: {str(e)}")
+                    self.mark_failed([entry['id'] for entry in unsent], e)
+                    failed += len(unsent)
+                    sent += len(entries) - len(unsent)
+            
+            self.purge_sent()
+            if sent:
+                logging.info(f"送信待ちの実行ログ{sent}件を送信しました")
+            return sent, failed
+
+    @staticmethod
+    def _delivered_doc_links(config, api, entries):
+        """前回送信を試みたエントリのうち、ログドキュメントに見出しがあるものの [(ID, 見出しへのリンク)] を返す"""
+        retried = [entry for entry in entries if entry['attempt_id']]
+        if not retried:
+            return []
+        log_doc_id, delivered = find_log_doc_headings(config, api, [entry['execution_id'] for entry in retried])
+        return [(entry['id'], log_doc_heading_link(log_doc_id, entry['execution_id']))
+                for entry in retried if entry['execution_id'] in delivered]
+
+    @staticmethod
+    def _group_entries(entries):
+        """送信先の設定が同じエントリをLOG_OUTBOX_BATCH_SIZE件ずつにまとめる"""
+        groups = {}
+        for entry in entries:
+            groups.setdefault(json.dumps(entry['config'], sort_keys=True), []).append(entry)
+        for group in groups.values():
+            for start in range(0, len(group), LOG_OUTBOX_BATCH_SIZE):
+                yield group[start:start + LOG_OUTBOX_BATCH_SIZE]
+
+    def flush_in_background(self, api):
+        """バックグラウンドのスレッドで送信する（送信中に呼ばれた場合は送信後にもう一度送信する）"""
+        with self._lock:
+            self._flush_requested = True
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, args=(api,), name='log-outbox', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self, api):
+        while True:
+            with self._lock:
+                if not self._flush_requested:
+                    self._flusher = None
+                    return
+                self._flush_requested = False
+            try:
+                self.flush(api)
+            except Exception as e:
+                logging.error(f"実行ログの送信中にエラーが発生しました: {str(e)}")
+
+    def wait(self, timeout=None):
+        """バックグラウンドの送信が終わるまで待ち、終わった場合はTrueを返す"""
+        with self._lock:
+            flusher = self._flusher
+        if flusher is None:
+            return True
+        flusher.join(timeout)
+        return not flusher.is_alive()
+
+# state_dirごとの送信待ちキュー（SQLiteファイルのパス -> LogOutbox）
+log_outboxes = {}
+log_outboxes_lock = threading.Lock()
+
+def get_log_outbox(config):
+    """設定のstate_dirの送信待ちキューを返す（log_outboxがfalseの場合はNone）"""
+    if not config.get('log_outbox', True):
+        return None
+    path = os.path.abspath(get_state_path(config, LOG_OUTBOX_FILE_NAME))
+    with log_outboxes_lock:
+        if path not in log_outboxes:
+            max_attempts = int(config.get('log_outbox_max_attempts', DEFAULT_LOG_OUTBOX_MAX_ATTEMPTS))
+            log_outboxes[path] = LogOutbox(path, max_attempts)
+        return log_outboxes[path]
+
+def wait_for_log_outboxes(timeout=DEFAULT_LOG_OUTBOX_FLUSH_TIMEOUT):
+    """すべての送信待ちキューのバックグラウンド送信が終わるまで待つ（終了前に呼ぶ）"""
+    deadline = time.monotonic() + timeout
+    with log_outboxes_lock:
+        outboxes = list(log_outboxes.values())
+    for outbox in outboxes:
+        if not outbox.wait(max(0.0, deadline - time.monotonic())):
+            logging.warning(f"実行ログの送信が{timeout}秒以内に終わりませんでした。未送信の分は次回送信します")
+            return False
+        pending = outbox.count_pending()
+        if pending:
+            logging.warning(f"未送信の実行ログが{pending}件あります。次回の実行時に再送信します（{outbox.path}）")
+    return True
+
+class RunHistoryIndex:
+    """実行ごとのメタデータを記録するローカルの実行履歴（state_dirのSQLite）
+
+    status・historyコマンドはGoogle APIを使わずにここから最終実行・最終成功などを返す。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                execution_id TEXT PRIMARY KEY,
+                job TEXT NOT NULL DEFAULT '',
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                status TEXT,
+                success INTEGER,
+                message TEXT,
+                warning TEXT,
+                csv_file_path TEXT,
+                source_md5 TEXT,
+                row_count INTEGER,
+                total_seconds REAL,
+                api_calls INTEGER,
+                resumed_rows INTEGER,
+                stages TEXT,
+                heading_link TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_job_success ON runs (job, success, started_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_source ON runs (source_md5)")
+
+    def record(self, run):
+        """1回分の実行を記録する（同じ実行IDは上書き）"""
+        columns = list(run)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [run[column] for column in columns])
+
+    def set_heading_link(self, execution_id, heading_link):
+        """実行ログの送信後にGoogle Docsの見出しへのリンクを記録する"""
+        with self._lock:
+            self._conn.execute("UPDATE runs SET heading_link = ? WHERE execution_id = ?", (heading_link, execution_id))
+
+    def query(self, where="", params=(), limit=20):
+        """条件に合う実行を新しい順に返す"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT * FROM runs {('WHERE ' + where) if where else ''} ORDER BY started_at DESC, rowid DESC LIMIT ?",
+                list(params) + [limit])
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def jobs(self):
+        """記録されているジョブ名を返す（ジョブを使わない実行は空文字）"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT job FROM runs ORDER BY job")]
+
+# state_dirごとの実行履歴（SQLiteファイルのパス -> RunHistoryIndex）
+run_history_indexes = {}
+run_history_lock = threading.Lock()
+
+def get_run_history(config, create=True):
+    """設定のstate_dirの実行履歴を返す（run_historyがfalse、またはcreate=Falseでファイルが無い場合はNone）"""
+    if not config.get('run_history', True):
+        return None
+    path = os.path.abspath(os.path.join(config.get('state_dir', DEFAULT_STATE_DIR), RUN_HISTORY_FILE_NAME))
+    with run_history_lock:
+        if path not in run_history_indexes:
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            run_history_indexes[path] = RunHistoryIndex(path)
+        return run_history_indexes[path]
+
+def record_run_history(config, metrics, outcome, csv_filename):
+    """1回の同期処理の結果をローカルの実行履歴に記録する"""
+    try:
+        index = get_run_history(config)
+        if index is None:
+            return False
+        outcome = outcome or {}
+        # 書き込みに失敗した実行は読み取った行数ではなく、書き込んだ行数が不明としてNULLを記録する
+        row_count = metrics.values.get('rows_processed') if metrics.success else None
+        index.record({
+            'execution_id': metrics.execution_id,
+            'job': metrics.job_name or '',
+            'started_at': datetime.fromtimestamp(metrics.started_at).strftime("%Y-%m-%d %H:%M:%S"),
+            'finished_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'status': outcome.get('status', "エラー"),
+            'success': int(bool(metrics.success)),
+            'message': outcome.get('history_message', ""),
+            'warning': outcome.get('warning', ""),
+            'csv_file_path': csv_filename,
+            'source_md5': metrics.values.get('source_md5'),
+            'row_count': row_count if isinstance(row_count, int) else None,
+            'total_seconds': metrics.total_seconds,
+            'api_calls': metrics.total_api_calls(),
+            'resumed_rows': metrics.values.get('resumed_rows', 0),
+            'stages': json.dumps(metrics.stages),
+            'heading_link': outcome.get('heading_link') or None
+        })
+        return True
+    except Exception as e:
+        logging.warning(f"ローカルの実行履歴の記録中にエラーが発生しました: {str(e)}")
+        return False
+
+def format_run(run):
+    """実行履歴の1件を1行のテキストにする"""
+    job = f"[{run['job']}] " if run['job'] else ""
+    rows = f"{run['row_count']}行" if run['row_count'] is not None else "-"
+    seconds = f"{run['total_seconds']:.2f}秒" if run['total_seconds'] is not None else "-"
+    api_calls = f"API {run['api_calls']}回" if run['api_calls'] is not None else "API -"
+    resumed = f", {run['resumed_rows'] + 2}行目から再開" if run['resumed_rows'] else ""
+    return f"{run['started_at']}  {run['execution_id']}  {job}{run['status']}  {rows}, {seconds}, {api_calls}{resumed}"
+
+def collect_state_configs(config):
+    """設定とジョブの設定から、state_dirが異なる設定を1つずつ返す"""
+    configs = {}
+    for job_config in [config] + [job_config for _, job_config in build_job_configs(config)]:
+        configs.setdefault(os.path.abspath(job_config.get('state_dir', DEFAULT_STATE_DIR)), job_config)
+    return list(configs.values())
+
+def show_status(config):
+    """ローカルの実行履歴から最終実行・最終成功と未完了の処理を表示する（Google APIは使わない）"""
+    found = False
+    for state_config in collect_state_configs(config):
+        index = get_run_history(state_config, create=False)
+        if index is None:
+            continue
+        found = True
+        for job in index.jobs():
+            latest = index.query("job = ?", [job], limit=1)
+            last_success = index.query("job = ? AND success = 1", [job], limit=1)
+            print(f"ジョブ: {job}" if job else "ジョブ: （なし）")
+            print(f"  最終実行: {format_run(latest[0]) if latest else 'なし'}")
+            print(f"  最終成功: {format_run(last_success[0]) if last_success else 'なし'}")
+        state_dir = state_config.get('state_dir', DEFAULT_STATE_DIR)
+        outbox_path = os.path.join(state_dir, LOG_OUTBOX_FILE_NAME)
+        if os.path.exists(outbox_path):
+            with contextlib.closing(sqlite3.connect(outbox_path)) as conn:
+                pending = conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL AND attempts < ?",
+                    (int(state_config.get('log_outbox_max_attempts', DEFAULT_LOG_OUTBOX_MAX_ATTEMPTS)),)).fetchone()[0]
+            print(f"未送信の実行ログ: {pending}件")
+        journals = load_json_state(os.path.join(state_dir, WRITE_JOURNAL_FILE_NAME)) or {}
+        for key, journal in journals.items():
+            print(f"中断中の書き込み: {key} ({journal.get('written_rows', 0)}行まで書き込み済み, {journal.get('updated_at', '')})")
+    if not found:
+        print("ローカルの実行履歴がありません")
+
+def show_history(config, limit=20, job=None, failed_only=False):
+    """ローカルの実行履歴を新しい順に表示する（Google APIは使わない）"""
+    conditions, params = [], []
+    if job is not None:
+        conditions.append("job = ?")
+        params.append(job)
+    if failed_only:
+        conditions.append("success = 0")
+    runs = []
+    for state_config in collect_state_configs(config):
+        index = get_run_history(state_config, create=False)
+        if index is not None:
+            runs.extend(index.query(" AND ".join(conditions), params, limit))
+    if not runs:
+        print("ローカルの実行履歴がありません")
+        return
+    for run in sorted(runs, key=lambda run: run['started_at'], reverse=True)[:limit]:
+        print(format_run(run))
+
+def run_stage_graph(stages, max_workers=DEFAULT_MAX_PARALLEL_STAGES):
+    """依存関係に従ってステージをスレッドプールで並列実行する
+
+    stagesは {ステージ名: (関数, [依存するステージ名])}。各関数は依存先の結果の辞書を受け取る。
+    依存先がすべて完了したステージから順に開始し、(結果の辞書, 所要時間の辞書) を返す。
+    例外で終了したステージの結果はNoneとして依存するステージに渡される。
+    """
+    results = {}
+    timings = {}
+    pending = dict(stages)
+    running = {}
+    
+    def timed(name, func, dep_results):
+        start_time = time.perf_counter()
+        try:
+            return func(dep_results)
+        finally:
+            timings[name] = time.perf_counter() - start_time
+            metrics = current_metrics.get()
+            if metrics is not None:
+                metrics.record_stage(name, timings[name])
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # 依存先が完了したステージを開始
+            for name, (func, deps) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    dep_results = {dep: results[dep] for dep in deps}
+                    # ジョブ名などのコンテキストをステージのスレッドに引き継ぐ
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, timed, name, func, dep_results)] = name
+                    del pending[name]
+            
+            if not running:
+                if pending:
+                    logging.error(f"依存関係を解決できないステージがあります: {list(pending)}")
+                break
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    logging.info(f"ステージ '{name}' が完了しました ({timings[name]:.2f}秒)")
+                except Exception as e:
+                    results[name] = None
+                    logging.error(f"ステージ '{name}' でエラーが発生しました ({timings.get(name, 0.0):.2f}秒): {str(e)}")
+    
+    return results, timings
+
+def process_csv_to_sheet(csv_filename, config, api, encoding='utf-8', source_md5=None):
+    """CSVファイルを読み取り、Googleスプレッドシートに書き込む（source_md5は書き込みの再開の判定に使う）"""
+    result = {
+        'csv_ok': False,
+        'sheet_success': False,
+        'row_count': 0,
+        'csv_details': "",
+        'sheet_details': ""
+    }
+    
+    # CSVファイルを読み取り
+    streaming = config.get('csv_streaming', False)
+    row_batches = None
+    if should_parse_in_parallel(config, csv_filename):
+        # 大きなファイルはプロセスプールで並列に解析し、解析済みのバッチから順に書き込む
+        streaming = True
+        header, row_batches, csv_stats = open_csv_parallel(csv_filename, config, encoding)
+        data_rows = None
+        result['csv_details'] = format_csv_stream_summary(csv_stats)
+        result['csv_ok'] = bool(header and row_batches is not None)
+    elif streaming:
+        # ストリーミングモードでは行バッチを読み進めながらシートに書き込む
+        batch_size = int(config.get('csv_batch_size', DEFAULT_CSV_BATCH_SIZE))
+        header, row_batches, csv_stats = open_csv_stream(csv_filename, batch_size, encoding)
+        data_rows = None
+        if row_batches is not None:
+            # 型付きの列形式への変換はバッチ単位で行う
+            row_batches = (to_columnar_batch(header, batch, config) for batch in row_batches)
+        result['csv_details'] = format_csv_stream_summary(csv_stats)
+        result['csv_ok'] = bool(header and row_batches is not None)
+    else:
+        header, data_rows, result['csv_details'] = read_csv_data(csv_filename, encoding)
+        result['csv_ok'] = bool(header and data_rows)
+        if result['csv_ok']:
+            data_rows = to_columnar_batch(header, data_rows, config)
+    
+    if not result['csv_ok']:
+        return result
+    
+    # Googleスプレッドシートに書き込み
+    result['sheet_success'], result['sheet_details'] = write_to_google_sheets(header, data_rows, config, api, row_batches, source_md5)
+    
+    if streaming:
+        result['csv_details'] = format_csv_stream_summary(csv_stats)
+        result['row_count'] = csv_stats['row_count']
+        if csv_stats['error']:
+            # 読み取り途中のエラーはCSV読み取りの失敗として扱う
+            result['csv_ok'] = False
+            result['sheet_success'] = False
+    else:
+        result['row_count'] = len(data_rows)
+    
+    return result
+
+def decide_run_outcome(sheet_result, drive_result):
+    """各ステージの結果から実行ステータスと記録するメッセージを決定する"""
+    drive_success, drive_details = drive_result if drive_result else (False, "")
+    row_count = sheet_result['row_count'] if sheet_result else 0
+    outcome = {
+        'csv_details': sheet_result['csv_details'] if sheet_result else "",
+        'sheet_details': "",
+        'drive_details': "",
+        'row_count': "",
+        'warning': ""
+    }
+    
+    if not sheet_result or not sheet_result['csv_ok']:
+        logging.error("CSVファイルの読み取りに失敗しました")
+        outcome.update(status="エラー", docs_message="CSVファイルの読み取りに失敗", history_message="CSVファイルの読み取りに失敗")
+    elif not sheet_result['sheet_success']:
+        logging.error("Googleスプレッドシートへの書き込みに失敗しました")
+        outcome.update(status="エラー", docs_message="Googleスプレッドシートへの書き込みに失敗", history_message="Googleスプレッドシートへの書き込みに失敗",
+                       sheet_details=sheet_result['sheet_details'])
+    elif drive_success:
+        logging.info("すべての処理が正常に完了しました")
+        outcome.update(status="成功", docs_message=f"CSVデータを正常に処理しました（{row_count}行）", history_message=f"CSVデータを正常に処理しました（{row_count}行）",
+                       sheet_details=sheet_result['sheet_details'], drive_details=drive_details, row_count=str(row_count))
+    else:
+        logging.warning("スプレッドシートへの書き込みは成功、Driveアップロードは失敗しました")
+        outcome.update(status="成功", docs_message="CSVデータを正常に処理しました（Driveアップロードは失敗）", history_message="CSVデータを正常に処理しました",
+                       sheet_details=sheet_result['sheet_details'], drive_details=drive_details, row_count=str(row_count), warning="Driveアップロード失敗")
+    return outcome
+
+def run_pipeline(config, api, execution_id, snapshot=None):
+    """CSVの読み取りから実行ログの記録までの同期処理を1回実行し、シートへの書き込みが成功したかを返す
+
+    snapshotに取り込み済みのCSV（ingest_csvの戻り値）を指定した場合は、共有フォルダのCSVを読み直さずに使う。
+    """
+    # 設定からCSVファイルパスを取得
+    csv_filename = config.get('csv_file_path')
+    if not csv_filename:
+        logging.error("設定ファイルに 'csv_file_path' が設定されていません")
+        # エラーログをGoogle Docsに記録
+        log_to_google_docs(config, api, execution_id, "エラー", "CSVファイルパスが設定されていません")
+        return False
+    
+    # ステージとAPI呼び出しの計測値はコンテキスト経由で各ステージのスレッドから記録される
+    job = current_job.get()
+    metrics = RunMetrics(execution_id, job['name'] if job else None)
+    open_run_log(config, metrics)
+    metrics_token = current_metrics.set(metrics)
+    try:
+        return run_pipeline_stages(config, api, execution_id, csv_filename, metrics, snapshot)
+    finally:
+        current_metrics.reset(metrics_token)
+        # アップロードされなかった場合も含め、実行ごとのログファイルは残さない
+        close_run_log(metrics)
+        if metrics.log_path and os.path.exists(metrics.log_path):
+            os.remove(metrics.log_path)
+
+def run_pipeline_stages(config, api, execution_id, csv_filename, metrics, snapshot=None):
+    """run_pipelineの各ステージを実行し、計測値を出力する"""
+    # 共有フォルダのCSVは取り込みステージで1回だけ読み取り、以降はローカルコピーを使う。
+    # シート書き込みとDriveバックアップは互いに独立しているため並列に実行し、
+    # 両方の結果がそろってからGoogle Docs、続いてスプレッドシートに実行ログを記録する
+    def ingest_stage(results):
+        if snapshot is not None:
+            metrics.set_value('csv_bytes', snapshot['size'])
+            return snapshot
+        if not config.get('csv_ingest_spool', True):
+            return None
+        ingested = ingest_csv(config, csv_filename)
+        if ingested is not None:
+            metrics.set_value('csv_bytes', ingested['size'])
+        return ingested
+    
+    def sheet_stage(results):
+        ingested = results['ingest']
+        if ingested is None:
+            encoding = config.get('csv_encoding', DEFAULT_CSV_ENCODING)
+            # 取り込みを行わない場合、書き込みの再開の判定にはMD5の代わりに更新日時とサイズを使う（CSVを読み直さない）
+            signature = get_file_signature(csv_filename)
+            source_id = f"mtime={signature[0]},size={signature[1]}" if signature else None
+            result = process_csv_to_sheet(csv_filename, config, api, 'utf-8' if encoding == 'auto' else encoding, source_id)
+        else:
+            result = process_csv_to_sheet(ingested['path'], config, api, ingested['encoding'], ingested['md5'])
+            result['csv_details'] = (f"取り込み元: {csv_filename} ({ingested['size']} バイト, エンコーディング: {ingested['encoding']}, "
+                                     f"MD5: {ingested['md5']})\n" + result['csv_details'])
+            metrics.set_value('source_md5', ingested['md5'])
+        metrics.set_value('rows_processed', result['row_count'])
+        return result
+    
+    def drive_stage(results):
+        # Google Driveにファイルをアップロード
+        return upload_to_google_drive(config, api, results['ingest'])
+    
+    # 送信待ちキューを使う場合、実行ログはローカルに保存するだけで送信はバックグラウンドで行う
+    outbox = get_log_outbox(config)
+    
+    def docs_stage(results):
+        outcome = decide_run_outcome(results['sheet'], results['drive'])
+        outcome['heading_link'] = ""
+        outcome['docs_queued'] = False
+        # ログの全文と各ステージの詳細はDriveにアップロードし、Google Docsには要約とそのリンクだけを記録する
+        _, log_file_url = upload_run_log_to_drive(config, api, execution_id, [
+            ("CSV詳細", outcome['csv_details']), ("スプレッドシート詳細", outcome['sheet_details']),
+            ("Drive詳細", outcome['drive_details'])])
+        if outbox is not None and config.get('log_doc_id'):
+            entry = build_log_doc_entry(execution_id, outcome['status'], outcome['docs_message'], outcome['row_count'],
+                                        log_file_url, int(config.get('log_doc_max_issues', DEFAULT_LOG_DOC_MAX_ISSUES)))
+            outbox.enqueue('docs', execution_id, config, {'entry': entry})
+            outcome['docs_queued'] = True
+        else:
+            docs_success, outcome['heading_link'] = log_to_google_docs(
+                config, api, execution_id, outcome['status'], outcome['docs_message'], outcome['row_count'], log_file_url)
+        return outcome
+    
+    def history_stage(results):
+        outcome = results['docs']
+        if outcome is None:
+            return False
+        # 前回中断した書き込みの続きから書き込んだ場合は再開した行を記録する
+        resumed_rows = metrics.values.get('resumed_rows', 0)
+        resumed = f"{resumed_rows + 2}行目から再開" if resumed_rows else ""
+        if outbox is not None:
+            # 見出しへのリンクは送信時にDocsのエントリの送信結果から埋める
+            row = build_history_row(config, execution_id, outcome['status'], outcome['history_message'],
+                                    outcome['row_count'], outcome['heading_link'], outcome['warning'],
+                                    f"{metrics.elapsed():.2f}", metrics.total_api_calls(), resumed)
+            outbox.enqueue('history', execution_id, config, {'row': row, 'link_from_docs': outcome['docs_queued']})
+            return True
+        return log_to_spreadsheet(config, api, execution_id, outcome['status'], outcome['history_message'],
+                                  outcome['row_count'], outcome['heading_link'], outcome['warning'],
+                                  f"{metrics.elapsed():.2f}", metrics.total_api_calls(), resumed)
+    
+    stages = {
+        'ingest': (ingest_stage, []),
+        'sheet': (sheet_stage, ['ingest']),
+        'drive': (drive_stage, ['ingest']),
+        'docs': (docs_stage, ['sheet', 'drive']),
+        'history': (history_stage, ['docs'])
+    }
+    max_workers = int(config.get('max_parallel_stages', DEFAULT_MAX_PARALLEL_STAGES))
+    results, timings = run_stage_graph(stages, max_workers)
+    sheet_result = results.get('sheet')
+    success = bool(sheet_result and sheet_result['csv_ok'] and sheet_result['sheet_success'])
+    metrics.finish(timings, success)
+    
+    timing_summary = ", ".join(f"{name}={seconds:.2f}秒" for name, seconds in timings.items())
+    logging.info(f"ステージ別所要時間: {timing_summary} / 全体: {metrics.total_seconds:.2f}秒")
+    run_api = metrics.to_dict()['api']
+    logging.info(f"この実行のAPI呼び出し: {run_api['calls']}回, 再試行: {run_api['retries']}回, "
+                 f"送信: {run_api['bytes_sent']} バイト, 受信: {run_api['bytes_received']} バイト")
+    if api is not None:
+        logging.info(api.limiter.summary())
+    write_run_metrics(config, metrics)
+    record_run_history(config, metrics, results.get('docs'), csv_filename)
+    
+    if outbox is not None and api is not None:
+        # 今回の実行ログと、前回までに送信できなかった実行ログをまとめて送信する
+        outbox.flush_in_background(api)
+    
+    return success
+
+def build_job_configs(config):
+    """設定のjobsを共通設定とマージし、(ジョブ名, 設定) のリストを返す"""
+    base_config = {key: value for key, value in config.items() if key != 'jobs'}
+    job_configs = []
+    for index, job in enumerate(config.get('jobs') or [], start=1):
+        job_config = dict(base_config)
+        job_config.update(job)
+        job_configs.append((job.get('name') or f"job{index}", job_config))
+    return job_configs
+
+def run_job(name, job_config, api):
+    """1つのジョブを実行し、(実行ID, 成功したか) を返す"""
+    current_job.set({'name': name})
+    execution_id = str(uuid.uuid4())[:8]
+    logging.info(f"ジョブを開始します (実行ID: {execution_id}, CSV: {job_config.get('csv_file_path')})")
+    try:
+        success = run_pipeline(job_config, api, execution_id)
+    except Exception as e:
+        logging.error(f"ジョブの実行中にエラーが発生しました: {str(e)}")
+        success = False
+    return execution_id, success
+
+def run_jobs(config, api):
+    """設定のjobsに定義された複数のCSV→シートの同期を並列に実行し、すべて成功したかを返す
+
+    各ジョブは共通設定を上書きした設定でrun_pipelineを実行し、それぞれ実行IDと実行ログを持つ。
+    APIの認証情報とレート制限は全ジョブで共有する。
+    """
+    job_configs = build_job_configs(config)
+    max_workers = max(1, int(config.get('max_parallel_jobs', DEFAULT_MAX_PARALLEL_JOBS)))
+    logging.info(f"{len(job_configs)}件のジョブを最大{max_workers}並列で実行します")
+    
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # ジョブごとに独立したコンテキスト（ジョブ名と書き込み先の実行ごとのログファイル）で実行する
+        futures = [executor.submit(contextvars.copy_context().run, run_job, name, job_config, api)
+                   for name, job_config in job_configs]
+        results = [future.result() for future in futures]
+    
+    succeeded = 0
+    for (name, _), (execution_id, success) in zip(job_configs, results):
+        logging.info(f"ジョブ '{name}': {'成功' if success else '失敗'} (実行ID: {execution_id})")
+        succeeded += success
+    logging.info(f"全ジョブが完了しました: 成功 {succeeded}/{len(job_configs)}件, 所要時間 {time.perf_counter() - start_time:.2f}秒")
+    return succeeded == len(job_configs)
+
+def get_file_signature(file_path):
+    """ファイルの更新日時とサイズを返す（存在しない・パスが不正な場合はNone）"""
+    try:
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except (OSError, TypeError, ValueError):
+        return None
+
+def compute_file_md5(file_path):
+    """ファイルの内容のMD5を計算する"""
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BACKUP_READ_CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def watch_and_sync(config, api, interval, debounce):
+    """CSVファイルを監視し、内容が変わった場合のみ同期処理を実行する
+
+    更新日時とサイズを定期的に確認し、変化があれば書き込みが終わるまで（debounce秒間変化しなくなるまで）
+    待ってから内容のハッシュを比較する。APIクライアントは起動時のものを使い続ける。
+    csv_file_pathが設定されていない場合は監視せずにFalseを返す。
+    """
+    csv_filename = config.get('csv_file_path')
+    if not csv_filename:
+        logging.error("設定ファイルに 'csv_file_path' が設定されていません")
+        return False
+    retry_interval = float(config.get('watch_retry_interval', DEFAULT_WATCH_RETRY_INTERVAL))
+    logging.info(f"CSVファイル '{csv_filename}' の監視を開始します（確認間隔: {interval}秒, 待機: {debounce}秒）")
+    
+    last_signature = None
+    last_synced_md5 = None
+    changed_at = None
+    pending_signature = None
+    retry_at = None
+    
+    while True:
+        signature = get_file_signature(csv_filename)
+        now = time.monotonic()
+        
+        if retry_at is not None and now >= retry_at:
+            # 前回失敗した同期をやり直すため、変更があったものとして扱う
+            last_signature = None
+            retry_at = None
+        
+        if signature is not None and signature != last_signature:
+            if signature != pending_signature:
+                # 書き込み中の可能性があるため、変化が止まるまで待つ
+                pending_signature = signature
+                changed_at = now
+            elif now - changed_at >= debounce:
+                last_signature = signature
+                pending_signature = None
+                # 取り込み（ローカルへのコピー）と同じ読み取りでMD5を計算し、同期ではそのコピーを使う
+                snapshot = None
+                if config.get('csv_ingest_spool', True):
+                    snapshot = ingest_csv(config, csv_filename)
+                    if snapshot is None:
+                        retry_at = time.monotonic() + retry_interval
+                        logging.warning(f"CSVファイルを取り込めなかったため {retry_interval:.0f}秒後に再試行します")
+                        continue
+                    file_md5 = snapshot['md5']
+                else:
+                    file_md5 = compute_file_md5(csv_filename)
+                if file_md5 == last_synced_md5:
+                    logging.info("CSVファイルの更新日時は変わりましたが内容が同じため同期をスキップします")
+                else:
+                    execution_id = str(uuid.uuid4())[:8]
+                    logging.info(f"CSVファイルの変更を検出したため同期を開始します (実行ID: {execution_id})")
+                    if run_pipeline(config, api, execution_id, snapshot):
+                        last_synced_md5 = file_md5
+                    else:
+                        retry_at = time.monotonic() + retry_interval
+                        logging.warning(f"同期に失敗したため {retry_interval:.0f}秒後に再試行します")
+                    logging.info(f"同期が完了しました (実行ID: {execution_id})")
+                continue
+        
+        time.sleep(min(interval, debounce) if pending_signature else interval)
+
+def profile_startup(config_file):
+    """起動処理（設定の読み込み・遅延インポート・ディスカバリードキュメント・認証情報）の所要時間を表示する
+
+    インポートは上から順に計測するため、先に読み込んだモジュールと共通の依存モジュールの時間は
+    先のモジュールに計上される。Google APIへの通信は行わない。
+    """
+    import importlib
+    timings = []
+
+    def measure(label, func):
+        started = time.perf_counter()
+        try:
+            func()
+            result = ""
+        except Exception as e:
+            result = f"エラー: {str(e)}"
+        timings.append((label, time.perf_counter() - started, result))
+
+    config = {}
+
+    def read_config():
+        config.update(load_config(config_file) or {})
+
+    measure(f"設定ファイル {config_file}", read_config)
+    for module_name in STARTUP_PROFILE_MODULES:
+        if module_name in sys.modules:
+            timings.append((f"import {module_name}", 0.0, "読み込み済み"))
+            continue
+        measure(f"import {module_name}", lambda name=module_name: importlib.import_module(name))
+    for api_name, api_version in [('drive', 'v3'), ('docs', 'v1')]:
+        measure(f"ディスカバリードキュメント {api_name} {api_version}",
+                lambda name=api_name, version=api_version: load_discovery_document(name, version, config.get('discovery_dir')))
+    creds_file = config.get('creds_file', 'creds.json')
+    if os.path.exists(creds_file):
+        from google.oauth2.service_account import Credentials
+        measure(f"認証情報 {creds_file}", lambda: Credentials.from_service_account_file(creds_file, scopes=SCOPES))
+
+    print("起動処理の所要時間")
+    for label, seconds, result in timings:
+        print(f"  {seconds * 1000:9.1f} ms  {label}  {result}".rstrip())
+    print(f"  {sum(seconds for _, seconds, _ in timings) * 1000:9.1f} ms  合計")
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析する"""
+    parser = argparse.ArgumentParser(description="CSVファイルを読み取り、Googleスプレッドシートに書き込む")
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'status', 'history'],
+                        help="run: 同期を実行（デフォルト） / status: 最終実行・最終成功を表示 / history: 実行履歴を表示（status・historyはGoogle APIを使わない）")
+    parser.add_argument('--limit', type=int, default=DEFAULT_HISTORY_LIMIT, help=f"historyで表示する件数（デフォルト: {DEFAULT_HISTORY_LIMIT}）")
+    parser.add_argument('--job', help="historyで表示するジョブ名")
+    parser.add_argument('--failed', action='store_true', help="historyで失敗した実行のみ表示する")
+    parser.add_argument('--config', default='config.json', help="設定ファイルのパス（デフォルト: config.json）")
+    parser.add_argument('--watch', action='store_true', help="常駐してCSVファイルの変更時のみ同期する")
+    parser.add_argument('--interval', type=float, help=f"監視モードでの確認間隔（秒、デフォルト: {DEFAULT_WATCH_INTERVAL}）")
+    parser.add_argument('--debounce', type=float, help=f"監視モードで変更後に待機する秒数（デフォルト: {DEFAULT_WATCH_DEBOUNCE}）")
+    parser.add_argument('--profile-startup', action='store_true', help="同期は行わず、起動処理（インポートなど）の所要時間を表示する")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """メイン処理"""
+    args = parse_args(argv)
+    
+    if args.profile_startup:
+        profile_startup(args.config)
+        return
+    
+    if args.command in ('status', 'history'):
+        # ローカルの実行履歴だけを参照する（ログファイルの作成・認証は行わない）
+        config = load_config(args.config)
+        if not config:
+            sys.exit(1)
+        if args.command == 'status':
+            show_status(config)
+        else:
+            show_history(config, args.limit, args.job, args.failed)
+        return
+    
     # 実行IDを生成
     execution_id = str(uuid.uuid4())[:8]  # 8文字の短縮UUID
     
@@ -585,61 +3800,46 @@ def main():
     logging.info(f"CSVファイル読み取り・Googleスプレッドシート書き込みプログラムを開始します (実行ID: {execution_id})")
     
     # 設定ファイルを読み込み
-    config = load_config()
+    config = load_config(args.config)
     if not config:
         logging.error("設定ファイルの読み込みに失敗しました。プログラムを終了します。")
         # エラーログをGoogle Docsに記録
         try:
-            log_to_google_docs(config, execution_id, "エラー", "設定ファイルの読み込みに失敗")
+            log_to_google_docs(config, None, execution_id, "エラー", "設定ファイルの読み込みに失敗")
         except:
             pass
         return
     
-    # 設定からCSVファイルパスを取得
-    csv_filename = config.get('csv_file_path')
-    if not csv_filename:
-        logging.error("設定ファイルに 'csv_file_path' が設定されていません")
-        # エラーログをGoogle Docsに記録
-        log_to_google_docs(config, execution_id, "エラー", "CSVファイルパスが設定されていません")
-        return
+    # 行ごとのログの間隔を設定（ログの全文は実行ごとにstate_dirのログファイルへ書き込む）
+    configure_log_sampling(config)
     
-    # CSVファイルを読み取り
-    header, data_rows, csv_details = read_csv_data(csv_filename)
+    # 認証情報を読み込み、以降のAPI呼び出しで共有する
+    api = create_api_context(config)
     
-    if header and data_rows:
-        # Googleスプレッドシートに書き込み
-        sheet_success, sheet_details = write_to_google_sheets(header, data_rows, config)
-        
-        if sheet_success:
-            # Google Driveにファイルをアップロード
-            drive_success, drive_details = upload_to_google_drive(config)
-            
-            if drive_success:
-                logging.info("すべての処理が正常に完了しました")
-                # 完全成功ログをGoogle Docsに記録
-                docs_success, heading_link = log_to_google_docs(config, execution_id, "成功", f"CSVデータを正常に処理しました（{len(data_rows)}行）", str(len(data_rows)), csv_details, sheet_details, drive_details)
-                # スプレッドシートにもログを記録
-                log_to_spreadsheet(config, execution_id, "成功", f"CSVデータを正常に処理しました（{len(data_rows)}行）", str(len(data_rows)), heading_link, "")
-            else:
-                logging.warning("スプレッドシートへの書き込みは成功、Driveアップロードは失敗しました")
-                # 成功ログをGoogle Docsに記録（警告情報付き）
-                docs_success, heading_link = log_to_google_docs(config, execution_id, "成功", "CSVデータを正常に処理しました（Driveアップロードは失敗）", str(len(data_rows)), csv_details, sheet_details, drive_details)
-                # スプレッドシートにもログを記録（警告情報付き）
-                log_to_spreadsheet(config, execution_id, "成功", "CSVデータを正常に処理しました", str(len(data_rows)), heading_link, "Driveアップロード失敗")
-        else:
-            logging.error("Googleスプレッドシートへの書き込みに失敗しました")
-            # エラーログをGoogle Docsに記録
-            docs_success, heading_link = log_to_google_docs(config, execution_id, "エラー", "Googleスプレッドシートへの書き込みに失敗", "", csv_details, sheet_details, "")
-            # スプレッドシートにもログを記録
-            log_to_spreadsheet(config, execution_id, "エラー", "Googleスプレッドシートへの書き込みに失敗", "", heading_link, "")
-    else:
-        logging.error("CSVファイルの読み取りに失敗しました")
-        # エラーログをGoogle Docsに記録
-        docs_success, heading_link = log_to_google_docs(config, execution_id, "エラー", "CSVファイルの読み取りに失敗", "", csv_details, "", "")
-        # スプレッドシートにもログを記録
-        log_to_spreadsheet(config, execution_id, "エラー", "CSVファイルの読み取りに失敗", "", heading_link, "")
+    if args.watch:
+        if config.get('jobs'):
+            logging.error("監視モードは複数ジョブ（jobs）の設定に対応していません")
+            return
+        interval = args.interval if args.interval is not None else float(config.get('watch_interval', DEFAULT_WATCH_INTERVAL))
+        debounce = args.debounce if args.debounce is not None else float(config.get('watch_debounce', DEFAULT_WATCH_DEBOUNCE))
+        try:
+            watch_and_sync(config, api, interval, debounce)
+        except KeyboardInterrupt:
+            logging.info("監視を終了します")
+        wait_for_log_outboxes(float(config.get('log_outbox_flush_timeout', DEFAULT_LOG_OUTBOX_FLUSH_TIMEOUT)))
+        logging.info(f"処理が完了しました。ログファイル: {log_filename}")
+        return
+    
+    if config.get('jobs'):
+        run_jobs(config, api)
+        wait_for_log_outboxes(float(config.get('log_outbox_flush_timeout', DEFAULT_LOG_OUTBOX_FLUSH_TIMEOUT)))
+        logging.info(f"処理が完了しました。ログファイル: {log_filename}")
+        return
     
+    run_pipeline(config, api, execution_id)
+    # 実行ログの送信はバックグラウンドで行うため、終了前に送信を待つ
+    wait_for_log_outboxes(float(config.get('log_outbox_flush_timeout', DEFAULT_LOG_OUTBOX_FLUSH_TIMEOUT)))
     logging.info(f"処理が完了しました。ログファイル: {log_filename} (実行ID: {execution_id})")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
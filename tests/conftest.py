@@ -0,0 +1,29 @@
+"""main.pyのテスト共通設定（リポジトリ直下のmain.pyとbenchmarksを読み込めるようにする）"""
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+
+@pytest.fixture
+def fake_api(tmp_path):
+    """偽APIサーバーを起動し、そこへ接続するAPIコンテキストを返す（server属性で偽サーバーを参照）"""
+    import fake_google_api
+    import run_benchmarks
+    import main
+
+    server = fake_google_api.start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    creds_path = str(tmp_path / 'creds.json')
+    run_benchmarks.write_fake_credentials(creds_path, base_url)
+    api = main.create_api_context({'creds_file': creds_path, 'state_dir': str(tmp_path / 'state'),
+                                   'api_endpoint_override': base_url,
+                                   'api_rate_limits': run_benchmarks.UNLIMITED_RATE_LIMITS})
+    api.server = server
+    yield api
+    server.shutdown()
+    server.server_close()
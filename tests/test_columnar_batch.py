@@ -0,0 +1,24 @@
+"""型付きの列形式（ColumnarBatch）のテスト"""
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('column_type, values, expected', [
+    ('float', ['1.5', '2', '-0.25'], [1.5, 2.0, -0.25]),
+    ('float', ['1.5', 'nan', 'inf', '-Infinity'], [1.5, 'nan', 'inf', '-Infinity']),
+    ('float', ['1_000.5', '2.5'], ['1_000.5', 2.5]),
+    ('int', ['10', '-3'], [10, -3]),
+    ('int', ['1_000', '20'], ['1_000', 20]),
+])
+def test_numbers_that_sheets_cannot_store_are_kept_as_strings(column_type, values, expected):
+    """非有限値・区切りの_を含む数値は変換せずに元の文字列のまま書き込む"""
+    batch = main.ColumnarBatch(['値'], [[value] for value in values], [column_type])
+
+    assert [row[0] for row in batch] == expected
+
+
+def test_empty_and_ragged_rows_are_kept_as_is():
+    batch = main.ColumnarBatch(['a', 'b'], [['1', ''], ['2'], ['3', '4']], ['int', 'int'])
+
+    assert list(batch) == [[1, ''], ['2'], [3, 4]]
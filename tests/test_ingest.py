@@ -0,0 +1,36 @@
+"""CSVの取り込み（ingest_csv）のテスト"""
+import contextvars
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+
+
+def ingest_as_job(name, config, csv_path):
+    """ジョブのコンテキストでCSVを取り込み、取り込んだ内容の情報を返す"""
+    def run():
+        main.current_job.set({'name': name})
+        return main.ingest_csv(config, csv_path)
+    return contextvars.copy_context().run(run)
+
+
+def test_jobs_sharing_a_csv_use_separate_spools(tmp_path):
+    """同じCSVを並列に取り込む複数のジョブは、互いのローカルコピーを置き換えない"""
+    csv_path = tmp_path / 'shared.csv'
+    content = ("受付No,売上数量\n" + "".join(f"{i},{i * 10}\n" for i in range(5000))).encode('utf-8')
+    csv_path.write_bytes(content)
+    config = {'state_dir': str(tmp_path / 'state'), 'csv_encoding': 'auto'}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        snapshots = list(executor.map(lambda name: ingest_as_job(name, config, str(csv_path)),
+                                      [f"job{i % 2}" for i in range(16)]))
+
+    assert all(snapshot is not None for snapshot in snapshots)
+    assert {snapshot['md5'] for snapshot in snapshots} == {hashlib.md5(content).hexdigest()}
+    spools = {snapshot['path'] for snapshot in snapshots}
+    assert len(spools) == 2
+    for spool in spools:
+        with open(spool, 'rb') as file:
+            assert file.read() == content
+    # 一時ファイルは残らない
+    assert sorted(path.suffix for path in (tmp_path / 'state').iterdir()) == ['.csv', '.csv']
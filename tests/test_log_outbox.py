@@ -0,0 +1,55 @@
+"""実行ログの送信待ちキュー（LogOutbox）のテスト"""
+import pytest
+
+import main
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = main.LogOutbox(str(tmp_path / main.LOG_OUTBOX_FILE_NAME))
+    config = {'state_dir': str(tmp_path), 'log_doc_id': 'doc1', 'run_history': False}
+    outbox.enqueue('docs', 'exec0001', config, {'entry': ['実行ID: exec0001', '本文']})
+    row = ['exec0001'] + [''] * (len(main.HISTORY_HEADER) - 1)
+    outbox.enqueue('history', 'exec0001', config, {'row': row, 'link_from_docs': True})
+    return outbox
+
+
+@pytest.fixture
+def sent_requests(monkeypatch):
+    """送信先への書き込みを記録し、送信先に既にある実行IDを設定できるようにする"""
+    sent = {'docs': [], 'history': [], 'delivered': set()}
+    monkeypatch.setattr(main, 'write_log_doc_entries',
+                        lambda config, api, entries: sent['docs'].extend(entries) or 'doc1')
+    monkeypatch.setattr(main, 'append_history_rows', lambda config, api, rows: sent['history'].extend(rows))
+    monkeypatch.setattr(main, 'find_log_doc_headings',
+                        lambda config, api, execution_ids: ('doc1', sent['delivered'] & set(execution_ids)))
+    monkeypatch.setattr(main, 'find_history_execution_ids',
+                        lambda config, api, execution_ids: sent['delivered'] & set(execution_ids))
+    return sent
+
+
+def test_flush_sends_entries_once(outbox, sent_requests):
+    assert outbox.flush(api=None) == (2, 0)
+    assert outbox.flush(api=None) == (0, 0)
+    assert len(sent_requests['docs']) == 1
+    [row] = sent_requests['history']
+    assert row[main.HISTORY_HEADER.index("Google Docsリンク")] == main.log_doc_heading_link('doc1', 'exec0001')
+
+
+def test_interrupted_entries_already_delivered_are_not_resent(outbox, sent_requests):
+    """送信後に送信済みにする前に中断したエントリは、送信先にあれば再送信しない"""
+    outbox.mark_in_flight([entry['id'] for entry in outbox.pending('docs') + outbox.pending('history')])
+    sent_requests['delivered'].add('exec0001')
+
+    assert outbox.flush(api=None) == (2, 0)
+    assert sent_requests['docs'] == []
+    assert sent_requests['history'] == []
+    assert outbox.count_pending() == 0
+
+
+def test_interrupted_entries_not_delivered_are_resent(outbox, sent_requests):
+    outbox.mark_in_flight([entry['id'] for entry in outbox.pending('docs') + outbox.pending('history')])
+
+    assert outbox.flush(api=None) == (2, 0)
+    assert len(sent_requests['docs']) == 1
+    assert len(sent_requests['history']) == 1
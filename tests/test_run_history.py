@@ -0,0 +1,12 @@
+"""ローカルの実行履歴（RunHistoryIndex）のテスト"""
+import main
+
+
+def test_runs_started_in_the_same_second_are_newest_first(tmp_path):
+    """開始日時が同じ秒の実行は記録した順の逆（新しい順）に返す"""
+    index = main.RunHistoryIndex(str(tmp_path / main.RUN_HISTORY_FILE_NAME))
+    for execution_id in ['b0000001', 'a0000002', 'c0000003']:
+        index.record({'execution_id': execution_id, 'started_at': '2024-05-01 09:00:00', 'success': 1})
+
+    assert [run['execution_id'] for run in index.query()] == ['c0000003', 'a0000002', 'b0000001']
+    assert [run['execution_id'] for run in index.query(limit=1)] == ['c0000003']
@@ -0,0 +1,30 @@
+"""シャード分割（plan_shards / shard_partition_key）のテスト"""
+import pytest
+
+import main
+
+HEADER = ['受付No', '納入年月日', '売上数量']
+ROWS = [
+    ['1', '2024-01-05', '10'],
+    ['2', '2024-01-20', '20'],
+    ['3', '2024-02-03', '30'],
+    ['4', '2024/02/28', '40'],
+    ['5', '', '50'],
+]
+
+
+@pytest.mark.parametrize('typed_columns', [True, False])
+def test_date_column_is_grouped_by_shard_date_format(typed_columns):
+    """typed_columnsの有無によらず、日付列はshard_date_format（月ごと）でまとめる"""
+    config = {'sheet_sharding': 'column', 'shard_column': '納入年月日', 'typed_columns': typed_columns}
+    data_rows = list(main.to_columnar_batch(HEADER, ROWS, config))
+
+    shards = main.plan_shards(HEADER, data_rows, config)
+
+    assert {shard['key']: len(shard['rows']) for shard in shards} == {'': 1, '2024-01': 2, '2024-02': 2}
+
+
+def test_unparseable_date_string_is_used_as_key():
+    """日付として解釈できない文字列はそのままキーにする"""
+    assert main.shard_partition_key(' 未定 ', 'date', '%Y-%m') == '未定'
+    assert main.shard_partition_key('2024-03-01', 'str', '%Y-%m') == '2024-03-01'
@@ -0,0 +1,27 @@
+"""batchモードのシート書き込み（write_rows_batched）のテスト（偽APIサーバーを使用）"""
+import main
+
+HEADER = ['受付No', '品名', '売上数量']
+
+
+def test_grid_keeps_columns_right_of_the_data(fake_api):
+    """グリッドの行数は書き込む行数に合わせるが、列はデータより多くても減らさない"""
+    spreadsheet = fake_api.open_spreadsheet('sheet-test')
+    worksheet = spreadsheet.add_worksheet('data', rows=5, cols=10)
+    rows = [[str(i), f"品目{i}", str(i * 10)] for i in range(50)]
+
+    details = main.write_rows_batched(fake_api, worksheet, HEADER, rows, chunk_size=20, max_chunk_bytes=10 ** 6)
+
+    worksheet = spreadsheet.worksheet('data')
+    assert (worksheet.row_count, worksheet.col_count) == (51, 10)
+    assert "書き込みリクエスト数: 3" in details
+
+
+def test_grid_grows_to_the_data_width(fake_api):
+    spreadsheet = fake_api.open_spreadsheet('sheet-test')
+    worksheet = spreadsheet.add_worksheet('narrow', rows=5, cols=2)
+
+    main.write_rows_batched(fake_api, worksheet, HEADER, [['1', '品目1', '10']], chunk_size=20, max_chunk_bytes=10 ** 6)
+
+    worksheet = spreadsheet.worksheet('narrow')
+    assert (worksheet.row_count, worksheet.col_count) == (2, 3)
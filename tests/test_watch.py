@@ -0,0 +1,14 @@
+"""監視モード（watch_and_sync）のテスト"""
+import logging
+
+import main
+
+
+def test_watch_without_csv_path_returns_immediately(tmp_path, caplog):
+    """csv_file_pathが無い場合は監視せずにエラーを記録してFalseを返す"""
+    config = {'state_dir': str(tmp_path)}
+
+    with caplog.at_level(logging.ERROR):
+        assert main.watch_and_sync(config, None, interval=0.01, debounce=0) is False
+
+    assert "'csv_file_path' が設定されていません" in caplog.text